@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Persistent cache of Gemini analyses ("off" disables it)
+ANALYSIS_CACHE = os.environ.get("ANALYSIS_CACHE", "on").lower()
+ANALYSIS_CACHE_FILE = os.environ.get(
+    "ANALYSIS_CACHE_FILE", os.path.join(BASE_DIR, "analysis_cache.json")
+)
+# Least recently used entries beyond this count are evicted
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", 1000))
+# Entries older than this (seconds) are evicted
+ANALYSIS_CACHE_MAX_AGE = int(os.environ.get("ANALYSIS_CACHE_MAX_AGE", 30 * 86400))
+
+_cache = None
+_lock = threading.Lock()
+_in_flight = {}
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+
+def normalize_script(script_text):
+    """Normalize a script so formatting-only differences share a cache entry."""
+    text = unicodedata.normalize("NFC", script_text or "")
+    return " ".join(text.split())
+
+
+def analysis_cache_key(video_hash, script_text, model_name, prompt_version):
+    """Cache key for an analysis of a video with a script, model and prompt version."""
+    script_hash = hashlib.sha256(normalize_script(script_text).encode("utf-8")).hexdigest()
+    key_data = json.dumps([video_hash, script_hash, model_name, prompt_version])
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(ANALYSIS_CACHE_FILE, "r") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache():
+    try:
+        temp_file = ANALYSIS_CACHE_FILE + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(_cache, f)
+        os.replace(temp_file, ANALYSIS_CACHE_FILE)
+    except OSError as e:
+        print(f"Error saving analysis cache: {e}")
+
+
+def _evict(cache):
+    cutoff = time.time() - ANALYSIS_CACHE_MAX_AGE
+    evicted = [key for key, entry in cache.items() if entry["created_at"] < cutoff]
+    for key in evicted:
+        del cache[key]
+
+    overflow = len(cache) - ANALYSIS_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        oldest = sorted(cache, key=lambda key: cache[key]["last_used"])[:overflow]
+        for key in oldest:
+            del cache[key]
+        evicted.extend(oldest)
+
+    _stats["evictions"] += len(evicted)
+    return evicted
+
+
+def get_cached_analysis(key):
+    """Return the cached analysis for a key, or None."""
+    with _lock:
+        cache = _load_cache()
+        entry = cache.get(key)
+        if entry is None or entry["created_at"] < time.time() - ANALYSIS_CACHE_MAX_AGE:
+            return None
+        entry["last_used"] = time.time()
+        return entry["value"]
+
+
+def store_analysis(key, value):
+    with _lock:
+        cache = _load_cache()
+        now = time.time()
+        cache[key] = {"value": value, "created_at": now, "last_used": now}
+        _evict(cache)
+        _save_cache()
+
+
+def get_or_compute_analysis(key, compute, cacheable=None):
+    """Return (analysis, report), running compute() only on a cache miss.
+
+    Identical requests arriving while one is running wait for its result
+    instead of starting their own inference. The report says whether the
+    result came from the cache or from a coalesced request. A computed
+    result is only stored if cacheable(result) is true (when given).
+    """
+    if ANALYSIS_CACHE == "off":
+        return compute(), {"hit": False, "coalesced": False}
+
+    with _lock:
+        waiting = _in_flight.get(key)
+        if waiting is None:
+            _in_flight[key] = threading.Event()
+
+    if waiting is not None:
+        waiting.wait()
+        value = get_cached_analysis(key)
+        if value is not None:
+            with _lock:
+                _stats["coalesced"] += 1
+            return value, {"hit": True, "coalesced": True}
+        # The request we waited for failed; run our own
+        return get_or_compute_analysis(key, compute, cacheable)
+
+    try:
+        value = get_cached_analysis(key)
+        if value is not None:
+            with _lock:
+                _stats["hits"] += 1
+            print("Using cached analysis")
+            return value, {"hit": True, "coalesced": False}
+
+        with _lock:
+            _stats["misses"] += 1
+        value = compute()
+        if cacheable is None or cacheable(value):
+            store_analysis(key, value)
+        return value, {"hit": False, "coalesced": False}
+    finally:
+        with _lock:
+            _in_flight.pop(key).set()
+
+
+def get_cache_stats():
+    """Hit/miss/coalesced/eviction counters since startup and the current entry count."""
+    with _lock:
+        return dict(_stats, entries=len(_load_cache()))
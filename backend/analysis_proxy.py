@@ -0,0 +1,202 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from renderers import get_ffprobe_path, probe_media, render_filter_complex, run_ffmpeg
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Upload a small analysis proxy to Gemini instead of the original video ("on" or "off")
+ANALYSIS_PROXY = os.environ.get("ANALYSIS_PROXY", "on").lower()
+ANALYSIS_PROXY_DIR = os.environ.get("ANALYSIS_PROXY_DIR", os.path.join(BASE_DIR, "proxies"))
+# The model samples video at about 1 fps, so a small, low frame rate proxy loses nothing
+ANALYSIS_PROXY_HEIGHT = int(os.environ.get("ANALYSIS_PROXY_HEIGHT", 360))
+ANALYSIS_PROXY_FPS = int(os.environ.get("ANALYSIS_PROXY_FPS", 5))
+ANALYSIS_PROXY_CRF = int(os.environ.get("ANALYSIS_PROXY_CRF", 32))
+# Speech-quality audio: mono, 16 kHz
+ANALYSIS_PROXY_AUDIO_BITRATE = os.environ.get("ANALYSIS_PROXY_AUDIO_BITRATE", "32k")
+ANALYSIS_PROXY_TIMEOUT = int(os.environ.get("ANALYSIS_PROXY_TIMEOUT", 1800))
+
+_proxy_locks = {}
+_proxy_locks_lock = threading.Lock()
+
+
+def proxy_tag():
+    """Identifies the proxy settings, so changed settings produce a new proxy."""
+    return f"{ANALYSIS_PROXY_HEIGHT}p{ANALYSIS_PROXY_FPS}-crf{ANALYSIS_PROXY_CRF}"
+
+
+def proxy_path(video_hash):
+    return os.path.join(ANALYSIS_PROXY_DIR, f"{video_hash}-{proxy_tag()}.mp4")
+
+
+def _max_duration_drift():
+    # The fps filter may drop up to one output frame at the end
+    return max(0.25, 1.5 / ANALYSIS_PROXY_FPS)
+
+
+def _proxy_encoder_args():
+    return [
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(ANALYSIS_PROXY_CRF),
+        "-c:a", "aac", "-b:a", ANALYSIS_PROXY_AUDIO_BITRATE, "-ac", "1", "-ar", "16000",
+    ]
+
+
+def _transcode(video_path, output_path, ffmpeg_path, start=None, duration=None):
+    # Without start/duration timestamps are left alone; the fps filter only
+    # drops frames, so time t in the proxy is time t in the source. With them,
+    # input seeking plus re-encoding makes time t in the output start + t
+    trim_args = []
+    if start is not None:
+        trim_args = ["-ss", f"{start:.3f}", "-t", f"{duration:.3f}"]
+    run_ffmpeg(
+        [
+            ffmpeg_path, "-y", "-v", "error",
+            *trim_args[:2],
+            "-i", video_path,
+            *trim_args[2:],
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=-2:'min({ANALYSIS_PROXY_HEIGHT},ih)',fps={ANALYSIS_PROXY_FPS}",
+            *_proxy_encoder_args(),
+            "-movflags", "+faststart",
+            output_path,
+        ],
+        timeout=ANALYSIS_PROXY_TIMEOUT,
+    )
+
+
+def _proxy_lock(video_hash):
+    with _proxy_locks_lock:
+        return _proxy_locks.setdefault(video_hash, threading.Lock())
+
+
+def get_analysis_proxy(video_path, video_hash, ffmpeg_path=None):
+    """Return (path, report) of the video to upload for analysis.
+
+    Produces (or reuses, cached per source hash) a downscaled, low frame rate,
+    low bitrate proxy. Falls back to the source when proxies are disabled,
+    the transcode fails, the proxy isn't smaller, or its duration differs
+    from the source's (which would shift the returned timestamps).
+    """
+    source_bytes = os.path.getsize(video_path)
+    report = {"used": False, "source_bytes": source_bytes}
+    if ANALYSIS_PROXY != "on":
+        return video_path, report
+
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    cached_path = proxy_path(video_hash)
+
+    with _proxy_lock(video_hash):
+        report["cached"] = os.path.exists(cached_path)
+        if not report["cached"]:
+            os.makedirs(ANALYSIS_PROXY_DIR, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix=".mp4", prefix="proxy_", dir=ANALYSIS_PROXY_DIR)
+            os.close(fd)
+            try:
+                print(f"Creating analysis proxy for {video_path}")
+                _transcode(video_path, temp_path, ffmpeg_path)
+
+                ffprobe_path = get_ffprobe_path(ffmpeg_path)
+                source_duration = probe_media(video_path, ffprobe_path)["duration"]
+                proxy_duration = probe_media(temp_path, ffprobe_path)["duration"]
+                if abs(source_duration - proxy_duration) > _max_duration_drift():
+                    raise Exception(
+                        f"proxy duration {proxy_duration}s differs from source duration {source_duration}s"
+                    )
+                os.replace(temp_path, cached_path)
+            except Exception as e:
+                print(f"Analysis proxy not used, uploading the source: {e}")
+                return video_path, report
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    proxy_bytes = os.path.getsize(cached_path)
+    if proxy_bytes >= source_bytes:
+        return video_path, report
+
+    report.update({
+        "used": True,
+        "proxy_bytes": proxy_bytes,
+        "bytes_saved": source_bytes - proxy_bytes,
+    })
+    return cached_path, report
+
+
+def get_analysis_window(source_path, source_key, start, end, ffmpeg_path=None):
+    """Return (window_key, path) of a clip of source_path covering [start, end].
+
+    Clips are encoded with the proxy settings and cached next to the proxies,
+    named after source_key (which starts with the source hash, so
+    remove_proxies() cleans them up too).
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    window_key = f"{source_key}-w{int(start * 1000)}-{int(end * 1000)}"
+    cached_path = os.path.join(ANALYSIS_PROXY_DIR, f"{window_key}.mp4")
+
+    with _proxy_lock(window_key):
+        if not os.path.exists(cached_path):
+            os.makedirs(ANALYSIS_PROXY_DIR, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix=".mp4", prefix="window_", dir=ANALYSIS_PROXY_DIR)
+            os.close(fd)
+            try:
+                _transcode(source_path, temp_path, ffmpeg_path, start, end - start)
+                os.replace(temp_path, cached_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    return window_key, cached_path
+
+
+def get_trimmed_proxy(source_path, source_key, ranges, ffmpeg_path=None):
+    """Return (trimmed_key, path) of source_path with only the given ranges, joined back to back.
+
+    Used to cut dead air out of what is uploaded for analysis. Cached next to
+    the proxies like get_analysis_window().
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    ranges_digest = hashlib.sha256(json.dumps([[round(start, 3), round(end, 3)] for start, end in ranges]).encode("utf-8")).hexdigest()
+    trimmed_key = f"{source_key}-trim-{ranges_digest[:16]}"
+    cached_path = os.path.join(ANALYSIS_PROXY_DIR, f"{trimmed_key}.mp4")
+
+    with _proxy_lock(trimmed_key):
+        if not os.path.exists(cached_path):
+            os.makedirs(ANALYSIS_PROXY_DIR, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix=".mp4", prefix="trim_", dir=ANALYSIS_PROXY_DIR)
+            os.close(fd)
+            try:
+                render_filter_complex(
+                    source_path,
+                    ranges,
+                    temp_path,
+                    ffmpeg_path=ffmpeg_path,
+                    encoder_args=([], _proxy_encoder_args()),
+                    workdir=ANALYSIS_PROXY_DIR,
+                )
+                os.replace(temp_path, cached_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    return trimmed_key, cached_path
+
+
+def remove_proxies(video_hashes):
+    """Delete cached proxies (all settings) of the given source hashes."""
+    try:
+        names = os.listdir(ANALYSIS_PROXY_DIR)
+    except OSError:
+        return
+    prefixes = tuple(f"{video_hash}-" for video_hash in video_hashes)
+    if not prefixes:
+        return
+    for name in names:
+        if name.startswith(prefixes):
+            try:
+                os.remove(os.path.join(ANALYSIS_PROXY_DIR, name))
+            except OSError:
+                pass
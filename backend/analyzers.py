@@ -0,0 +1,131 @@
+import os
+import time
+import random
+import hashlib
+
+from analysis_cache import normalize_script
+from gemini_governor import DEFAULT_PRIORITY
+
+# Segment selection backend: "gemini", or "local" for offline load and throughput tests
+ANALYZER = os.environ.get("ANALYZER", "gemini").lower()
+ANALYZERS = ("gemini", "local")
+
+# Local analyzer: "alternate" keeps the first LOCAL_ANALYZER_KEEP_RATIO of every
+# LOCAL_ANALYZER_SEGMENT_SECONDS, "random" keeps each such period with probability
+# LOCAL_ANALYZER_KEEP_RATIO (seeded by the video and script), "all" keeps the whole
+# video and "none" keeps nothing
+LOCAL_ANALYZER_PATTERN = os.environ.get("LOCAL_ANALYZER_PATTERN", "alternate").lower()
+LOCAL_ANALYZER_SEGMENT_SECONDS = float(os.environ.get("LOCAL_ANALYZER_SEGMENT_SECONDS", "10"))
+LOCAL_ANALYZER_KEEP_RATIO = float(os.environ.get("LOCAL_ANALYZER_KEEP_RATIO", "0.5"))
+# Simulated analysis latency: a fixed part plus a part per minute of video (seconds)
+LOCAL_ANALYZER_LATENCY = float(os.environ.get("LOCAL_ANALYZER_LATENCY", "2"))
+LOCAL_ANALYZER_LATENCY_PER_MINUTE = float(os.environ.get("LOCAL_ANALYZER_LATENCY_PER_MINUTE", "0.5"))
+
+
+class Analyzer:
+    """Chooses the segments of a video to keep for a script.
+
+    analyze() returns (segments_data, reports): segments_data has the shape
+    of the model response ("segments_to_keep" with start_time/end_time/
+    description dicts, and "analysis"), reports holds extra fields for the
+    job result. plan() works out what analyze() will send (or None if there
+    is nothing to plan); analyze() runs that plan and reports the plan it
+    actually ran as "analysis_plan". cache_identity() returns the (model,
+    prompt version) part of the analysis cache key for a plan, or None when
+    results shouldn't be cached.
+    """
+
+    name = None
+
+    def plan(self, video_path, video_hash, video_info):
+        return None
+
+    def cache_identity(self, video_info, plan=None):
+        return None
+
+    def analyze(
+        self,
+        video_path,
+        video_hash,
+        video_info,
+        script_text,
+        update_progress_callback=None,
+        job_id=None,
+        priority=DEFAULT_PRIORITY,
+        plan=None,
+    ):
+        raise NotImplementedError
+
+
+class LocalAnalyzer(Analyzer):
+    """Deterministic stand-in for Gemini: no network, no quota, configurable segments and latency."""
+
+    name = "local"
+
+    def _segments(self, video_duration, seed):
+        period = LOCAL_ANALYZER_SEGMENT_SECONDS
+        if LOCAL_ANALYZER_PATTERN == "none":
+            return []
+        if LOCAL_ANALYZER_PATTERN == "all" or period <= 0:
+            return [(0.0, video_duration)]
+
+        rng = random.Random(seed)
+        segments = []
+        start = 0.0
+        while start < video_duration:
+            if LOCAL_ANALYZER_PATTERN == "random":
+                if rng.random() < LOCAL_ANALYZER_KEEP_RATIO:
+                    segments.append((start, min(video_duration, start + period)))
+            else:
+                segments.append((start, min(video_duration, start + period * LOCAL_ANALYZER_KEEP_RATIO)))
+            start += period
+        return segments
+
+    def analyze(
+        self,
+        video_path,
+        video_hash,
+        video_info,
+        script_text,
+        update_progress_callback=None,
+        job_id=None,
+        priority=DEFAULT_PRIORITY,
+        plan=None,
+    ):
+        video_duration = video_info["duration"]
+        if update_progress_callback:
+            update_progress_callback(job_id, 3, 5, "Analyzing video (local analyzer)")
+
+        latency = LOCAL_ANALYZER_LATENCY + LOCAL_ANALYZER_LATENCY_PER_MINUTE * video_duration / 60
+        time.sleep(latency)
+
+        seed = hashlib.sha256(f"{video_hash}:{normalize_script(script_text)}".encode("utf-8")).hexdigest()
+        segments = self._segments(video_duration, seed)
+
+        if update_progress_callback:
+            update_progress_callback(job_id, 4, 5, "Processing the local analysis")
+
+        return {
+            "segments_to_keep": [
+                {
+                    "start_time": round(start, 3),
+                    "end_time": round(end, 3),
+                    "description": f"Local analyzer ({LOCAL_ANALYZER_PATTERN}) segment {i + 1}",
+                }
+                for i, (start, end) in enumerate(segments)
+            ],
+            "analysis": f"Local analyzer kept {len(segments)} segments using the {LOCAL_ANALYZER_PATTERN} pattern",
+        }, {"analyzer_latency": round(latency, 2)}
+
+
+def get_analyzer(name=None, ffmpeg_path=None):
+    """Return the analyzer selected by name, or by ANALYZER."""
+    name = (name or ANALYZER).lower()
+    if name == "local":
+        return LocalAnalyzer()
+    if name == "gemini":
+        # Imported here so the local analyzer works without the Gemini setup
+        from gemini_analyzer import GeminiAnalyzer
+
+        return GeminiAnalyzer(ffmpeg_path)
+    raise ValueError(f"Unknown analyzer {name!r}, expected one of {list(ANALYZERS)}")
@@ -1,11 +1,22 @@
 import os
 import time
 import uuid
-import json
+import shutil
 import threading
 from flask import Flask, request, jsonify, send_from_directory, render_template
 from werkzeug.utils import secure_filename
 from video_processor import process_video_with_script
+from renderers import RENDER_MODES, DEFAULT_RENDER_MODE, HLS_PLAYLIST_NAME, gop_index_path
+from encoder_profiles import get_cached_profiles, is_calibrating, start_background_calibration, start_recalibration
+from downloads import DOWNLOAD_ACCEL_MODE, file_etag, send_download
+from upload_sessions import UploadError, create_session, discard_session, expired_sessions, finish_session, get_session
+from gemini_files import evict_expired as evict_expired_gemini_files
+from analysis_proxy import remove_proxies
+from analysis_cache import get_cache_stats
+from gemini_governor import DEFAULT_PRIORITY, PRIORITIES, get_governor_stats
+from job_scheduler import JobScheduler, estimate_job_resources, slot_released
+from job_store import JobStore
+from blob_store import adopt_file, blob_exists, is_valid_hash, link_blob, release_blobs, store_stream
 from flask_cors import CORS
 from dotenv import load_dotenv
 import math
@@ -35,6 +46,8 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app = Flask(__name__)
 # Enable CORS for all domains on all routes (for development)
 CORS(app)
+# Let a fronting web server transmit files (see DOWNLOAD_ACCEL_MODE)
+app.use_x_sendfile = DOWNLOAD_ACCEL_MODE == 'x-sendfile'
 
 app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'uploads')
 app.config['PROCESSED_FOLDER'] = os.path.join(BASE_DIR, 'processed')
@@ -48,8 +61,11 @@ if DOCX_SUPPORT:
     app.config['ALLOWED_SCRIPT_EXTENSIONS'].add('docx')
 
 app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 500 * 1024 * 1024))  # Default: 500 MB limit
-app.config['JOBS_DATA_FILE'] = os.path.join(BASE_DIR, 'jobs_data.json')
+app.config['MAX_UPLOAD_SIZE'] = int(os.environ.get('MAX_UPLOAD_SIZE', app.config['MAX_CONTENT_LENGTH']))  # Largest video accepted by resumable uploads
+app.config['JOBS_DB'] = os.environ.get('JOBS_DB', os.path.join(BASE_DIR, 'jobs.db'))  # SQLite job store
+app.config['JOBS_DATA_FILE'] = os.path.join(BASE_DIR, 'jobs_data.json')  # Legacy job file, imported into the store once
 app.config['CLEANUP_INTERVAL'] = int(os.environ.get('CLEANUP_INTERVAL', 3600))  # Default: Clean up every hour
+app.config['PREVIEW_DECISION_TIMEOUT'] = int(os.environ.get('PREVIEW_DECISION_TIMEOUT', 600))  # Seconds the full render of a job with a preview waits for a decision
 
 # Ensure upload and processed directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -59,38 +75,40 @@ os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
 AVG_PROCESSING_FACTOR = float(os.environ.get('AVG_PROCESSING_FACTOR', 1.5))  # Average processing time per second of video
 INITIAL_PROGRESS_STEPS = 4  # Number of fixed steps in the process
 
-# In-memory store for tracking job status
+# Jobs queued or running in this process; finished jobs are read from the job store
 jobs = {}
+# Opened by init_app
+job_store = None
 
-# Load existing jobs data if available
+# Events set when a user approves or rejects a job's preview
+preview_decision_events = {}
+# Guards preview decisions against the full render closing the decision window
+preview_decision_lock = threading.Lock()
+
+# Load unfinished jobs from the job store (importing a legacy jobs_data.json first)
 def load_jobs_data():
-    global jobs
     try:
         if os.path.exists(app.config['JOBS_DATA_FILE']):
-            with open(app.config['JOBS_DATA_FILE'], 'r') as f:
-                jobs = json.load(f)
-                print(f"Loaded {len(jobs)} jobs from persistent storage")
+            imported = job_store.import_json(app.config['JOBS_DATA_FILE'])
+            print(f"Imported {imported} jobs from {app.config['JOBS_DATA_FILE']}")
+        jobs.update(job_store.load_by_status(('queued', 'processing')))
+        print(f"Loaded {len(jobs)} unfinished jobs from persistent storage")
     except Exception as e:
         print(f"Error loading jobs data: {e}")
-        jobs = {}
 
-# Save jobs data to file
-def save_jobs_data():
+# Save one job's row (and any large fields that changed) to the job store
+def save_job(job_id, job=None):
     try:
-        # Create a temporary file and write to it first
-        temp_file = app.config['JOBS_DATA_FILE'] + '.tmp'
-        with open(temp_file, 'w') as f:
-            json.dump(jobs, f)
-        
-        # Then rename it to the actual file (atomic operation)
-        import os
-        os.replace(temp_file, app.config['JOBS_DATA_FILE'])
-        print(f"Saved {len(jobs)} jobs to persistent storage")
+        job_store.save(job_id, jobs[job_id] if job is None else job)
     except Exception as e:
-        print(f"Error saving jobs data: {e}")
+        print(f"Error saving job {job_id}: {e}")
 
-# Initialize jobs data
-load_jobs_data()
+# Return a job queued or running in this process, or read it from the job store
+def get_job(job_id, blobs=True):
+    job = jobs.get(job_id)
+    if job is None:
+        job = job_store.load(job_id, blobs)
+    return job
 
 def allowed_video_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_VIDEO_EXTENSIONS']
@@ -130,21 +148,6 @@ def extract_text_from_docx(docx_path):
         print(f"Error extracting text from DOCX: {e}")
         return f"Error extracting text from DOCX: {str(e)}"
 
-# Calculate estimated time to complete based on video duration
-def estimate_processing_time(video_path):
-    try:
-        from moviepy.editor import VideoFileClip
-        clip = VideoFileClip(video_path)
-        duration = clip.duration
-        clip.close()
-        
-        # Estimate based on video duration and a processing factor
-        estimated_seconds = duration * AVG_PROCESSING_FACTOR
-        return max(30, estimated_seconds)  # Minimum 30 seconds estimate
-    except Exception as e:
-        print(f"Error calculating video duration: {e}")
-        return 180  # Default to 3 minutes if we can't determine
-
 def format_time_remaining(seconds):
     """Format seconds into a human-readable time string."""
     minutes, seconds = divmod(int(seconds), 60)
@@ -158,7 +161,7 @@ def format_time_remaining(seconds):
         return f"{seconds}s"
 
 # Update job progress
-def update_job_progress(job_id, step, total_steps=None, message=None):
+def update_job_progress(job_id, step, total_steps=None, message=None, gemini=None):
     if job_id not in jobs:
         return
         
@@ -190,6 +193,12 @@ def update_job_progress(job_id, step, total_steps=None, message=None):
     if message:
         job['progress']['message'] = message
     
+    # Queue position and wait time while a Gemini call is held back by the governor
+    if gemini:
+        job['progress']['gemini'] = gemini
+    else:
+        job['progress'].pop('gemini', None)
+    
     # Update time estimates
     elapsed_time = time.time() - job['progress']['start_time']
     if current_step > 0 and job['progress']['percent'] > 0:
@@ -199,9 +208,12 @@ def update_job_progress(job_id, step, total_steps=None, message=None):
         job['progress']['estimated_remaining_seconds'] = int(remaining_seconds)
         job['progress']['formatted_remaining_time'] = format_time_remaining(remaining_seconds)
     
-    # Save jobs data for significant changes
+    # Save progress for significant changes (a small update of the job's row)
     if step == 1 or step % 2 == 0 or message != job['progress'].get('message'):
-        save_jobs_data()
+        try:
+            job_store.save_progress(job_id, job['progress'])
+        except Exception as e:
+            print(f"Error saving progress of job {job_id}: {e}")
     
     return job['progress']
 
@@ -212,39 +224,57 @@ def cleanup_old_jobs():
             time.sleep(app.config['CLEANUP_INTERVAL'])
             current_time = time.time()
             expired_jobs = []
+            expired_hashes = []
+            
+            # Find jobs older than 24 hours (indexed on created_at), skipping queued and running ones
+            for job_id, job in job_store.created_before(current_time - 86400).items():
+                if job_id in jobs:
+                    continue
+                expired_jobs.append(job_id)
+                if job.get('video_hash'):
+                    expired_hashes.append(job['video_hash'])
+                
+                # Clean up files
+                try:
+                    if os.path.exists(job['video_path']):
+                        os.remove(job['video_path'])
+                        print(f"Removed input video: {job['video_path']}")
+                    if job.get('output_path') and os.path.exists(job['output_path']):
+                        os.remove(job['output_path'])
+                        print(f"Removed output video: {job['output_path']}")
+                    if os.path.exists(gop_index_path(job['video_path'])):
+                        os.remove(gop_index_path(job['video_path']))
+                    if job.get('preview_path') and os.path.exists(job['preview_path']):
+                        os.remove(job['preview_path'])
+                    if job.get('stream_dir'):
+                        shutil.rmtree(job['stream_dir'], ignore_errors=True)
+                except Exception as e:
+                    print(f"Error cleaning up files for job {job_id}: {e}")
+            
+            # Remove the jobs from the store
+            job_store.delete(expired_jobs)
             
-            # Find jobs older than 24 hours
-            for job_id, job in list(jobs.items()):
-                if current_time - job['timestamp'] > 86400:  # 24 hours
-                    expired_jobs.append(job_id)
-                    
-                    # Clean up files
-                    try:
-                        if os.path.exists(job['video_path']):
-                            os.remove(job['video_path'])
-                            print(f"Removed input video: {job['video_path']}")
-                        if job.get('output_path') and os.path.exists(job['output_path']):
-                            os.remove(job['output_path'])
-                            print(f"Removed output video: {job['output_path']}")
-                    except Exception as e:
-                        print(f"Error cleaning up files for job {job_id}: {e}")
-                    
-                    # Remove job from tracking
-                    del jobs[job_id]
+            # Remove resumable uploads that were abandoned before finalizing
+            for upload_id in list(expired_sessions(app.config['UPLOAD_FOLDER'])):
+                discard_session(upload_id)
+                shutil.rmtree(os.path.join(app.config['UPLOAD_FOLDER'], upload_id), ignore_errors=True)
+                print(f"Removed abandoned upload: {upload_id}")
+            
+            # Drop Gemini uploads whose remote copy has expired
+            evict_expired_gemini_files()
+            
+            # Delete stored videos that no live job references any more
+            removed_blobs = release_blobs(expired_hashes, job_store.referenced_hashes())
+            if removed_blobs:
+                remove_proxies(removed_blobs)
+                print(f"Removed {len(removed_blobs)} unreferenced blobs")
             
             if expired_jobs:
                 print(f"Cleaned up {len(expired_jobs)} expired jobs")
-                # Save changes to disk
-                save_jobs_data()
                 
         except Exception as e:
             print(f"Error in cleanup thread: {e}")
 
-# Start cleanup thread
-cleanup_thread = threading.Thread(target=cleanup_old_jobs)
-cleanup_thread.daemon = True
-cleanup_thread.start()
-
 @app.route('/')
 def index():
     # Return JSON for API info since we now use Next.js for frontend
@@ -255,43 +285,40 @@ def index():
         'frontend_url': 'http://localhost:3000'
     })
 
-@app.route('/api/upload', methods=['POST'])
-def upload_file():
-    # Check if both video and script files were uploaded
-    if 'video' not in request.files:
-        return jsonify({'error': 'No video file uploaded'}), 400
-    
-    video_file = request.files['video']
-    
-    # Check if video filename is valid
-    if video_file.filename == '':
-        return jsonify({'error': 'No video file selected'}), 400
-    
-    # Check if script was provided (either as file or text)
+# Rendering options: "copy" cuts with ffmpeg stream copy, "smart" only re-encodes
+# boundary GOPs, "filter" cuts and encodes in a single ffmpeg filter_complex pass,
+# "chunked" encodes fixed-duration chunks of the edit in parallel, "hls" writes an
+# HLS playlist that can be streamed while the tail is still rendering
+def get_render_options():
+    render_mode = request.form.get('render_mode', DEFAULT_RENDER_MODE).lower()
+    allow_keyframe_snap = request.form.get('allow_keyframe_snap', 'true').lower() == 'true'
+    return render_mode, allow_keyframe_snap
+
+# Validate the script and render options of an upload request; returns an error message or None
+def validate_job_request():
     script_file = request.files.get('script')
     script_text = request.form.get('script_text')
     
     if not script_file and not script_text:
-        return jsonify({'error': 'No script provided (either file or text)'}), 400
-    
-    # Generate a unique job ID
-    job_id = str(uuid.uuid4())
-    
-    # Validate file types
-    if video_file and not allowed_video_file(video_file.filename):
-        return jsonify({'error': f'Video file format not allowed. Allowed formats: {app.config["ALLOWED_VIDEO_EXTENSIONS"]}'}), 400
+        return 'No script provided (either file or text)'
     
     if script_file and not allowed_script_file(script_file.filename):
-        return jsonify({'error': f'Script file format not allowed. Allowed formats: {app.config["ALLOWED_SCRIPT_EXTENSIONS"]}'}), 400
+        return f'Script file format not allowed. Allowed formats: {app.config["ALLOWED_SCRIPT_EXTENSIONS"]}'
     
-    # Create job directories
-    job_dir = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
-    os.makedirs(job_dir, exist_ok=True)
+    render_mode, _ = get_render_options()
+    if render_mode not in RENDER_MODES:
+        return f'Render mode not allowed. Allowed modes: {list(RENDER_MODES)}'
     
-    # Save the video file
-    video_filename = secure_filename(video_file.filename)
-    video_path = os.path.join(job_dir, video_filename)
-    video_file.save(video_path)
+    if request.form.get('priority', DEFAULT_PRIORITY) not in PRIORITIES:
+        return f'Priority not allowed. Allowed priorities: {list(PRIORITIES)}'
+    
+    return None
+
+# Create the job for an uploaded video and start processing it
+def queue_job(job_id, job_dir, video_path, video_hash=None):
+    script_file = request.files.get('script')
+    script_text = request.form.get('script_text')
+    render_mode, allow_keyframe_snap = get_render_options()
     
     # Handle script (either file or text)
     script_path = None
@@ -316,32 +343,176 @@ def upload_file():
             with open(script_path, 'r', encoding='utf-8', errors='ignore') as f:
                 script_text = f.read()
     
+    # Estimate the job's memory, CPU and processing time from the video's duration and resolution
+    resources = estimate_job_resources(video_path, AVG_PROCESSING_FACTOR)
+    
     # Create job data structure
     jobs[job_id] = {
         'status': 'queued',
         'video_path': video_path,
+        'video_hash': video_hash,
         'script_path': script_path,
         'script_text': script_text,
         'created_at': time.time(),
-        'output_path': None
+        'output_path': None,
+        'render_mode': render_mode,
+        'allow_keyframe_snap': allow_keyframe_snap,
+        'priority': request.form.get('priority', DEFAULT_PRIORITY),
+        # Opt-in low-resolution preview that can be rejected before the full render
+        'preview': request.form.get('preview', 'false').lower() == 'true',
+        'resources': resources,
+        'stream_dir': os.path.join(app.config['PROCESSED_FOLDER'], f'{job_id}_hls') if render_mode == 'hls' else None
     }
     
-    # Save updated jobs data to disk
-    save_jobs_data()
-    
-    # Estimate processing time based on video file size/duration
-    estimated_seconds = estimate_processing_time(video_path)
+    # Save the new job to the job store
+    save_job(job_id)
     
-    # Start processing thread
-    threading.Thread(target=process_job, args=(job_id,)).start()
+    # Queue the job; a worker starts it once the memory and CPU budgets allow
+    job_scheduler.submit(job_id, jobs[job_id]['priority'], resources)
     
     return jsonify({
         'status': 'queued',
         'job_id': job_id,
         'message': 'Video uploaded and queued for processing',
-        'estimated_seconds': estimated_seconds
+        'estimated_seconds': resources['expected_seconds'],
+        'queue': job_scheduler.queue_info(job_id)
     })
 
+@app.route('/api/upload', methods=['POST'])
+def upload_file():
+    # Check if both video and script files were uploaded
+    if 'video' not in request.files:
+        return jsonify({'error': 'No video file uploaded'}), 400
+    
+    video_file = request.files['video']
+    
+    # Check if video filename is valid
+    if video_file.filename == '':
+        return jsonify({'error': 'No video file selected'}), 400
+    
+    # Validate file types
+    if video_file and not allowed_video_file(video_file.filename):
+        return jsonify({'error': f'Video file format not allowed. Allowed formats: {app.config["ALLOWED_VIDEO_EXTENSIONS"]}'}), 400
+    
+    error = validate_job_request()
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Generate a unique job ID
+    job_id = str(uuid.uuid4())
+    
+    # Create job directories
+    job_dir = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    
+    # Store the video once in the blob store (hashed while it is copied) and link it into the job
+    video_filename = secure_filename(video_file.filename)
+    video_path = os.path.join(job_dir, video_filename)
+    video_hash = store_stream(video_file.stream, video_path)
+    
+    return queue_job(job_id, job_dir, video_path, video_hash)
+
+# Check whether a video is already stored, so the client can skip sending it
+@app.route('/api/blobs/<sha256>', methods=['GET'])
+def check_blob(sha256):
+    size = request.args.get('size', type=int)
+    exists = blob_exists(sha256.lower(), size)
+    return jsonify({'sha256': sha256.lower(), 'exists': exists}), 200 if exists else 404
+
+# Resumable uploads: create a session, PUT chunks at offsets (in any order, in
+# parallel), check which ranges arrived, then finalize the session into a job
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename', '')))
+    # Optional SHA-256 of the file: if it is already stored, no bytes need to be sent
+    video_hash = str(data.get('sha256') or '').lower() or None
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Upload size is required'}), 400
+    
+    if not filename:
+        return jsonify({'error': 'No video file selected'}), 400
+    if not allowed_video_file(filename):
+        return jsonify({'error': f'Video file format not allowed. Allowed formats: {app.config["ALLOWED_VIDEO_EXTENSIONS"]}'}), 400
+    if size > app.config['MAX_UPLOAD_SIZE']:
+        return jsonify({'error': f'Video file is too large. Maximum size is {app.config["MAX_UPLOAD_SIZE"]} bytes'}), 413
+    if video_hash and not is_valid_hash(video_hash):
+        return jsonify({'error': 'sha256 must be a hex SHA-256 digest'}), 400
+    
+    def link_existing(path):
+        return bool(video_hash) and link_blob(video_hash, path, size)
+    
+    try:
+        session = create_session(
+            app.config['UPLOAD_FOLDER'], filename, size,
+            expected_hash=video_hash, link_existing=link_existing
+        )
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    return jsonify(session.to_dict()), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(upload_id):
+    try:
+        session = get_session(app.config['UPLOAD_FOLDER'], upload_id)
+        if request.method == 'GET':
+            return jsonify(session.to_dict())
+        
+        offset = request.args.get('offset', type=int)
+        if offset is None or request.content_length is None:
+            return jsonify({'error': 'Chunks need an offset parameter and a Content-Length header'}), 400
+        # Read straight from the request stream into the file
+        return jsonify(session.write_chunk(offset, request.content_length, request.stream))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    error = validate_job_request()
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        session = get_session(app.config['UPLOAD_FOLDER'], upload_id)
+        video_hash = session.expected_hash if session.deduplicated else session.content_hash()
+        video_path = finish_session(session)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    
+    if session.expected_hash and video_hash != session.expected_hash:
+        shutil.rmtree(session.upload_dir, ignore_errors=True)
+        return jsonify({'error': 'Uploaded content does not match the announced sha256'}), 422
+    
+    # Move the upload into the blob store (or drop it if that content is already stored)
+    if not session.deduplicated:
+        adopt_file(video_path, video_hash, video_path)
+    
+    return queue_job(upload_id, session.upload_dir, video_path, video_hash)
+
+# Called once the low-resolution preview is rendered; returns False to skip the full render
+def handle_preview_ready(job_id, preview_path):
+    job = jobs[job_id]
+    job['preview_path'] = preview_path
+    job['preview_status'] = 'ready'
+    save_job(job_id)
+    
+    # Give the user a moment to approve or reject the preview before encoding in full;
+    # the job's worker slot and budgets go to other jobs while it waits
+    with preview_decision_lock:
+        event = preview_decision_events.setdefault(job_id, threading.Event())
+        if job.get('preview_decision'):
+            event.set()
+    with slot_released():
+        event.wait(app.config['PREVIEW_DECISION_TIMEOUT'])
+    
+    # Close the decision window: from here on the full render can't be skipped
+    with preview_decision_lock:
+        job['preview_status'] = 'closed'
+        save_job(job_id)
+        return job.get('preview_decision') != 'rejected'
+
 # Function to process a job
 def process_job(job_id):
     job = jobs[job_id]
@@ -349,7 +520,7 @@ def process_job(job_id):
     try:
         # Update job status
         job['status'] = 'processing'
-        save_jobs_data()
+        save_job(job_id)
         
         # Process the video
         result = process_video_with_script(
@@ -357,16 +528,28 @@ def process_job(job_id):
             script_text=job['script_text'],
             script_path=job['script_path'],
             job_id=job_id,
-            update_progress_callback=update_job_progress
+            update_progress_callback=update_job_progress,
+            render_mode=job.get('render_mode', DEFAULT_RENDER_MODE),
+            allow_keyframe_snap=job.get('allow_keyframe_snap', True),
+            preview_callback=handle_preview_ready if job.get('preview') else None,
+            stream_dir=job.get('stream_dir'),
+            video_hash=job.get('video_hash'),
+            priority=job.get('priority', DEFAULT_PRIORITY)
         )
         
         # Check the result - the new processor returns a dict with status
         if result.get('status') == 'error':
             job['status'] = 'failed'
             job['error'] = result.get('message', 'Unknown error occurred')
+        elif result.get('status') == 'rejected':
+            job['status'] = 'rejected'
+            job['segments'] = result.get('segments', [])
+            job['analysis'] = result.get('analysis', '')
         else:
-            job['status'] = 'completed'
             job['output_path'] = result['output_path']
+            # Strong ETag for conditional and ranged downloads
+            job['output_etag'] = file_etag(result['output_path'])
+            job['status'] = 'completed'
             
             # Calculate the video duration before and after editing
             if 'duration' in result:
@@ -383,6 +566,34 @@ def process_job(job_id):
             # Store content analysis if available
             if 'analysis' in result:
                 job['analysis'] = result['analysis']
+            
+            # Store how the output was rendered (including stream copy cut drift)
+            if result.get('render'):
+                job['render'] = result['render']
+            
+            # The output was re-encoded with MoviePy after the HLS render failed: there is no stream
+            if job.get('stream_dir') and job.get('render', {}).get('mode') != 'hls':
+                job['stream_dir'] = None
+            
+            # Store segment normalization stats (merged/duplicate time removed)
+            if 'edit_stats' in result:
+                job['edit_stats'] = result['edit_stats']
+            
+            # Record which encoder profile rendered the output
+            if result.get('encoder_profile'):
+                job['encoder_profile'] = result['encoder_profile']
+            
+            # Record which analyzer selected the segments
+            if result.get('analyzer'):
+                job['analyzer'] = result['analyzer']
+            
+            # Record the bytes and upload time the analysis proxy saved
+            if result.get('analysis_proxy'):
+                job['analysis_proxy'] = result['analysis_proxy']
+            
+            # Record whether the analysis came from the cache
+            if result.get('analysis_cache'):
+                job['analysis_cache'] = result['analysis_cache']
         
         # Update job progress to 100%
         if 'progress' in job:
@@ -391,25 +602,38 @@ def process_job(job_id):
             job['progress']['current_step'] = job['progress']['total_steps']
         
         # Save the updated job data
-        save_jobs_data()
+        save_job(job_id)
         
     except Exception as e:
         print(f"Error processing job {job_id}: {str(e)}")
         job['status'] = 'failed'
         job['error'] = str(e)
-        save_jobs_data()
+        save_job(job_id)
+    finally:
+        preview_decision_events.pop(job_id, None)
+        # Finished jobs are served from the job store from now on
+        jobs.pop(job_id, None)
+
+# Jobs run on a bounded pool of workers with memory and CPU admission control
+job_scheduler = JobScheduler(process_job)
 
 @app.route('/api/status/<job_id>', methods=['GET'])
 def check_status(job_id):
-    if job_id not in jobs:
+    job = get_job(job_id, blobs=False)
+    if job is None:
         return jsonify({'error': 'Job not found'}), 404
     
-    job = jobs[job_id]
     response = {
         'job_id': job_id,
         'status': job['status'],
     }
     
+    # Position in the job queue and when the job is expected to start
+    if job['status'] == 'queued':
+        queue = job_scheduler.queue_info(job_id)
+        if queue:
+            response['queue'] = queue
+    
     # Add progress information if available
     if 'progress' in job:
         response['progress'] = job['progress']
@@ -424,58 +648,193 @@ def check_status(job_id):
             else:
                 response['progress']['formatted_remaining_time'] = f"{remaining_seconds}s"
     
+    if job.get('preview_path'):
+        response['preview_url'] = f'/api/preview/{job_id}'
+        response['preview_decision'] = job.get('preview_decision')
+    
+    # HLS output can be watched as soon as the first segments are written
+    if job.get('stream_dir') and os.path.exists(os.path.join(job['stream_dir'], HLS_PLAYLIST_NAME)):
+        response['stream_url'] = f'/api/stream/{job_id}/{HLS_PLAYLIST_NAME}'
+    
     if job['status'] == 'completed':
         response['download_url'] = f'/api/download/{job_id}'
         response['segments_count'] = job.get('segments_count', 0)
+        if 'render' in job:
+            response['render'] = job['render']
     elif job['status'] == 'failed':
         response['error'] = job.get('error', 'Unknown error')
+    elif job['status'] == 'rejected':
+        response['error'] = 'Full render skipped because the preview was rejected'
     
     return jsonify(response)
 
 @app.route('/api/download/<job_id>', methods=['GET'])
 def download_video(job_id):
-    if job_id not in jobs or jobs[job_id]['status'] != 'completed':
+    job = get_job(job_id, blobs=False)
+    if job is None or job['status'] != 'completed':
         return jsonify({'error': 'Processed video not available'}), 404
     
-    job = jobs[job_id]
-    directory = os.path.dirname(job['output_path'])
-    filename = os.path.basename(job['output_path'])
-    return send_from_directory(directory, filename, as_attachment=True)
+    if not os.path.exists(job['output_path']):
+        return jsonify({'error': 'Processed video not available'}), 404
+    
+    # Jobs completed before ETags were recorded get one on first download
+    if not job.get('output_etag'):
+        job['output_etag'] = file_etag(job['output_path'])
+        save_job(job_id, job)
+    
+    return send_download(job['output_path'], etag=job['output_etag'])
+
+# Low-resolution preview of the edit; POST {"decision": "approve"|"reject"} decides on the full render
+@app.route('/api/preview/<job_id>', methods=['GET', 'POST'])
+def preview_video(job_id):
+    job = get_job(job_id, blobs=False)
+    if job is None or not job.get('preview_path'):
+        return jsonify({'error': 'Preview not available'}), 404
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        decision = str(data.get('decision', '')).lower()
+        if decision not in ('approve', 'reject'):
+            return jsonify({'error': "Decision must be 'approve' or 'reject'"}), 400
+        with preview_decision_lock:
+            if job['status'] not in ('queued', 'processing'):
+                return jsonify({'error': f"Job is already {job['status']}"}), 409
+            if job.get('preview_status') != 'ready':
+                return jsonify({'error': 'The full render has already started and can no longer be skipped'}), 409
+            
+            job['preview_decision'] = 'approved' if decision == 'approve' else 'rejected'
+            save_job(job_id, job)
+            event = preview_decision_events.get(job_id)
+            if event:
+                event.set()
+        return jsonify({'job_id': job_id, 'preview_decision': job['preview_decision']})
+    
+    directory = os.path.dirname(job['preview_path'])
+    filename = os.path.basename(job['preview_path'])
+    return send_from_directory(directory, filename)
+
+# HLS playlist and fragmented MP4 segments, available while the job is still rendering
+@app.route('/api/stream/<job_id>/', defaults={'filename': HLS_PLAYLIST_NAME}, methods=['GET'])
+@app.route('/api/stream/<job_id>/<path:filename>', methods=['GET'])
+def stream_video(job_id, filename):
+    job = get_job(job_id, blobs=False)
+    if job is None or not job.get('stream_dir'):
+        return jsonify({'error': 'Stream not available'}), 404
+    
+    stream_dir = job['stream_dir']
+    if not os.path.exists(os.path.join(stream_dir, HLS_PLAYLIST_NAME)):
+        return jsonify({'error': 'Stream not started yet'}), 404
+    
+    if filename.endswith('.m3u8'):
+        # The playlist grows while rendering, so clients must always refetch it
+        response = send_from_directory(stream_dir, filename, mimetype='application/vnd.apple.mpegurl', max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    # Segments never change once written
+    return send_from_directory(stream_dir, filename, mimetype='video/mp4', max_age=86400)
+
+# Encoder profiles selected by calibration; POST re-runs the calibration in the
+# background (it takes minutes) and returns the current profiles right away
+@app.route('/api/encoder-profiles', methods=['GET', 'POST'])
+def encoder_profiles():
+    if request.method == 'POST':
+        start_recalibration()
+        return jsonify({'profiles': get_cached_profiles(), 'calibrating': True}), 202
+    
+    return jsonify({'profiles': get_cached_profiles(), 'calibrating': is_calibrating()})
+
+# Analysis cache counters (hits, misses, coalesced requests, evictions)
+@app.route('/api/analysis-cache', methods=['GET'])
+def analysis_cache_stats():
+    return jsonify(get_cache_stats())
+
+# Rate limiter, inference queue and circuit breaker state of the Gemini governor
+@app.route('/api/gemini-governor', methods=['GET'])
+def gemini_governor_stats():
+    return jsonify(get_governor_stats())
+
+# Job scheduler workers, budgets and queue length
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_stats():
+    return jsonify(job_scheduler.get_stats())
 
 # Clean up old jobs and files via an API endpoint (still available for manual triggering)
 @app.route('/api/cleanup', methods=['POST'])
 def cleanup_old_jobs_endpoint():
     current_time = time.time()
     expired_jobs = []
+    expired_hashes = []
+    
+    # Find jobs older than 24 hours (indexed on created_at), skipping queued and running ones
+    for job_id, job in job_store.created_before(current_time - 86400).items():
+        if job_id in jobs:
+            continue
+        expired_jobs.append(job_id)
+        if job.get('video_hash'):
+            expired_hashes.append(job['video_hash'])
+        
+        # Clean up files
+        try:
+            if os.path.exists(job['video_path']):
+                os.remove(job['video_path'])
+                print(f"Removed input video: {job['video_path']}")
+            if job.get('output_path') and os.path.exists(job['output_path']):
+                os.remove(job['output_path'])
+                print(f"Removed output video: {job['output_path']}")
+            if os.path.exists(gop_index_path(job['video_path'])):
+                os.remove(gop_index_path(job['video_path']))
+            if job.get('preview_path') and os.path.exists(job['preview_path']):
+                os.remove(job['preview_path'])
+            if job.get('stream_dir'):
+                shutil.rmtree(job['stream_dir'], ignore_errors=True)
+        except Exception as e:
+            print(f"Error cleaning up files for job {job_id}: {e}")
     
-    # Find jobs older than 24 hours
-    for job_id, job in list(jobs.items()):
-        if current_time - job['timestamp'] > 86400:  # 24 hours
-            expired_jobs.append(job_id)
-            
-            # Clean up files
-            try:
-                if os.path.exists(job['video_path']):
-                    os.remove(job['video_path'])
-                    print(f"Removed input video: {job['video_path']}")
-                if job.get('output_path') and os.path.exists(job['output_path']):
-                    os.remove(job['output_path'])
-                    print(f"Removed output video: {job['output_path']}")
-            except Exception as e:
-                print(f"Error cleaning up files for job {job_id}: {e}")
-            
-            # Remove job from tracking
-            del jobs[job_id]
+    # Remove the jobs from the store
+    job_store.delete(expired_jobs)
     
-    # Save changes to disk
-    save_jobs_data()
+    # Delete stored videos that no live job references any more
+    removed_blobs = release_blobs(expired_hashes, job_store.referenced_hashes())
+    remove_proxies(removed_blobs)
     
     return jsonify({
         'message': f'Cleaned up {len(expired_jobs)} expired jobs',
         'expired_jobs': expired_jobs
     })
 
+# Open the job store and start the background work. Only called when the server
+# starts, not on import: segment encode workers are spawned processes that
+# re-import this script (as __mp_main__) and must not requeue or run jobs
+def init_app():
+    global job_store
+    job_store = JobStore(app.config['JOBS_DB'])
+    
+    # Initialize jobs data
+    load_jobs_data()
+    
+    # Start cleanup thread
+    cleanup_thread = threading.Thread(target=cleanup_old_jobs)
+    cleanup_thread.daemon = True
+    cleanup_thread.start()
+    
+    # Calibrate encoder profiles in the background if ENCODER_CALIBRATION=startup
+    start_background_calibration()
+    
+    # Requeue jobs that were waiting, or interrupted mid-run, when the server stopped
+    # (load_jobs_data loaded exactly those, oldest first)
+    for job_id, job in list(jobs.items()):
+        if job['status'] != 'queued':
+            job['status'] = 'queued'
+            save_job(job_id)
+        job_scheduler.submit(job_id, job.get('priority', DEFAULT_PRIORITY), job.get('resources'))
+    if jobs:
+        print(f"Requeued {len(jobs)} unfinished jobs")
+    
+    job_scheduler.start()
+
 if __name__ == '__main__':
+    init_app()
     print("====================================================")
     print("Auto Video Editor API Server")
     print("====================================================")
@@ -0,0 +1,135 @@
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Content-addressed store holding one copy of every uploaded video
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", os.path.join(BASE_DIR, "blobs"))
+
+COPY_BUFFER_SIZE = 1024 * 1024
+_SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+_lock = threading.Lock()
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's contents, i.e. its blob hash."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_valid_hash(blob_hash):
+    return bool(blob_hash) and bool(_SHA256_PATTERN.match(blob_hash))
+
+
+def blob_path(blob_hash):
+    """Path of the blob for a SHA-256 hex digest (sharded by its first two characters)."""
+    if not is_valid_hash(blob_hash):
+        raise ValueError(f"Invalid blob hash: {blob_hash}")
+    return os.path.join(BLOB_STORE_DIR, blob_hash[:2], blob_hash)
+
+
+def blob_exists(blob_hash, size=None):
+    """Whether the blob is stored (and has the expected size, when given)."""
+    if not is_valid_hash(blob_hash):
+        return False
+    try:
+        stored_size = os.path.getsize(blob_path(blob_hash))
+    except OSError:
+        return False
+    return size is None or stored_size == size
+
+
+def _link(source, target):
+    # Hard links share the data and keep it alive while any job still uses it
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        # Never symlink: release_blobs could delete the blob under it. A private
+        # copy (e.g. across filesystems) costs space but can't dangle
+        shutil.copyfile(source, target)
+
+
+def link_blob(blob_hash, target_path, size=None):
+    """Make target_path (inside a job directory) refer to a stored blob.
+
+    The existence check and the link happen under the store lock, so
+    release_blobs can't delete the blob in between. Returns False (and
+    links nothing) when the blob isn't stored or has another size.
+    """
+    with _lock:
+        if not blob_exists(blob_hash, size):
+            return False
+        _link(blob_path(blob_hash), target_path)
+    return True
+
+
+def store_stream(stream, target_path):
+    """Copy a stream into the store, hashing it on the way, and link it to target_path.
+
+    Returns the SHA-256 hex digest. If the content is already stored the new
+    copy is discarded.
+    """
+    os.makedirs(BLOB_STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(prefix="incoming_", dir=BLOB_STORE_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b""):
+                digest.update(block)
+                f.write(block)
+        return adopt_file(temp_path, digest.hexdigest(), target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def adopt_file(path, blob_hash, target_path=None):
+    """Move an already hashed file into the store and link it to target_path.
+
+    When the blob already exists the file is simply removed (deduplicated).
+    Returns the hash.
+    """
+    destination = blob_path(blob_hash)
+    with _lock:
+        if os.path.exists(destination):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.move(path, destination)
+        if target_path:
+            _link(destination, target_path)
+    return blob_hash
+
+
+def release_blobs(blob_hashes, referenced_hashes):
+    """Delete blobs that are no longer referenced by any live job.
+
+    blob_hashes are the candidates (hashes of removed jobs) and
+    referenced_hashes the hashes still used by live jobs. A blob that is
+    still hard-linked from some job directory is kept as well.
+    Returns the hashes that were deleted.
+    """
+    removed = []
+    with _lock:
+        for blob_hash in set(blob_hashes) - set(referenced_hashes):
+            if not is_valid_hash(blob_hash):
+                continue
+            path = blob_path(blob_hash)
+            try:
+                if os.stat(path).st_nlink > 1:
+                    continue
+                os.remove(path)
+                removed.append(blob_hash)
+            except OSError:
+                continue
+    return removed
@@ -0,0 +1,77 @@
+import os
+from urllib.parse import quote
+
+from flask import Response, send_file
+
+from blob_store import file_sha256
+
+# "off" streams files from Python (zero-copy via wsgi.file_wrapper where the
+# server supports it), "x-sendfile" hands them to Apache/lighttpd, and
+# "x-accel-redirect" hands them to an nginx internal location
+DOWNLOAD_ACCEL_MODE = os.environ.get("DOWNLOAD_ACCEL_MODE", "off").lower()
+# nginx internal location that maps to DOWNLOAD_ACCEL_ROOT
+DOWNLOAD_ACCEL_PREFIX = os.environ.get("DOWNLOAD_ACCEL_PREFIX", "/protected/")
+# Directory the nginx internal location serves; defaults to the backend directory
+DOWNLOAD_ACCEL_ROOT = os.environ.get(
+    "DOWNLOAD_ACCEL_ROOT", os.path.dirname(os.path.abspath(__file__))
+)
+# Seconds clients may cache a download before revalidating it with its ETag
+DOWNLOAD_MAX_AGE = int(os.environ.get("DOWNLOAD_MAX_AGE", 3600))
+
+
+def file_etag(path):
+    """Strong ETag value for a file, derived from its content hash."""
+    return file_sha256(path)
+
+
+def _content_disposition(download_name):
+    try:
+        download_name.encode("ascii")
+        return f'attachment; filename="{download_name}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(download_name)}"
+
+
+def _accel_redirect_response(path, download_name, etag):
+    relative_path = os.path.relpath(os.path.abspath(path), os.path.abspath(DOWNLOAD_ACCEL_ROOT))
+    if relative_path.startswith(os.pardir):
+        raise ValueError(f"{path} is outside DOWNLOAD_ACCEL_ROOT")
+
+    # nginx serves the bytes (including Range and If-Range) from the internal location
+    response = Response(mimetype="video/mp4")
+    response.headers["X-Accel-Redirect"] = DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + quote(
+        relative_path.replace(os.sep, "/")
+    )
+    response.headers["Content-Disposition"] = _content_disposition(download_name)
+    response.headers["Accept-Ranges"] = "bytes"
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+def send_download(path, download_name=None, etag=None):
+    """Send a finished output as an attachment.
+
+    Supports Range/If-Range and If-None-Match against the strong ETag, so
+    players can seek and interrupted downloads can resume. Depending on
+    DOWNLOAD_ACCEL_MODE the transfer is handed off to the fronting web server
+    instead of being streamed by the worker.
+    """
+    download_name = download_name or os.path.basename(path)
+
+    if DOWNLOAD_ACCEL_MODE == "x-accel-redirect":
+        return _accel_redirect_response(path, download_name, etag)
+
+    # With app.use_x_sendfile set (DOWNLOAD_ACCEL_MODE=x-sendfile) Flask only emits
+    # the X-Sendfile header; otherwise the file object goes to wsgi.file_wrapper,
+    # which servers such as gunicorn transmit with sendfile()
+    response = send_file(
+        path,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=etag if etag else True,
+        max_age=DOWNLOAD_MAX_AGE,
+    )
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
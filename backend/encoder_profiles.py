@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import shutil
+import platform
+import tempfile
+import threading
+import subprocess
+from functools import lru_cache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# "startup" calibrates in the background when the server starts, "on_demand"
+# calibrates a resolution class in the background the first time it is needed
+# (jobs use DEFAULT_PROFILE until it is done), "off" never calibrates
+ENCODER_CALIBRATION = os.environ.get("ENCODER_CALIBRATION", "on_demand").lower()
+ENCODER_PROFILE_CACHE = os.environ.get(
+    "ENCODER_PROFILE_CACHE", os.path.join(BASE_DIR, "encoder_profiles.json")
+)
+# Seconds of synthetic video encoded per candidate
+CALIBRATION_SECONDS = float(os.environ.get("ENCODER_CALIBRATION_SECONDS", "3"))
+CALIBRATION_PRESETS = os.environ.get(
+    "ENCODER_CALIBRATION_PRESETS", "ultrafast,veryfast,faster,medium"
+).split(",")
+CALIBRATION_CRFS = [int(crf) for crf in os.environ.get("ENCODER_CALIBRATION_CRFS", "20,23").split(",")]
+# Quality target: highest CRF (lowest quality) a profile may use
+ENCODER_MAX_CRF = int(os.environ.get("ENCODER_MAX_CRF", 23))
+
+# Resolution classes: (max height, calibration size, size target in kbit/s)
+RESOLUTION_CLASSES = {
+    "sd": (480, "854x480", int(os.environ.get("ENCODER_MAX_KBPS_SD", 2500))),
+    "hd": (720, "1280x720", int(os.environ.get("ENCODER_MAX_KBPS_HD", 5000))),
+    "fhd": (1080, "1920x1080", int(os.environ.get("ENCODER_MAX_KBPS_FHD", 8000))),
+    "uhd": (100000, "3840x2160", int(os.environ.get("ENCODER_MAX_KBPS_UHD", 35000))),
+}
+
+# Used until a resolution class has been calibrated (libx264 defaults)
+DEFAULT_PROFILE = {"name": "default", "preset": "medium", "crf": 23, "threads": 0}
+
+_cache = None
+_cache_lock = threading.Lock()
+# One calibration per resolution class at a time; other classes aren't held up
+_class_locks = {}
+_class_locks_lock = threading.Lock()
+# Classes with a background calibration running, and the forced recalibration thread
+_calibrating = set()
+_recalibration = None
+
+
+def resolution_class(width, height):
+    """Return the resolution class name for a frame size."""
+    short_side = min(width or 0, height or 0) or max(width or 0, height or 0)
+    for name, (max_height, _, _) in RESOLUTION_CLASSES.items():
+        if short_side <= max_height:
+            return name
+    return "uhd"
+
+
+def _ffmpeg_path():
+    return shutil.which("ffmpeg") or "ffmpeg"
+
+
+@lru_cache(maxsize=None)
+def get_host_key(ffmpeg_path=None):
+    """Identify the host CPU and ffmpeg build that calibration results apply to."""
+    cpu_model = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.lower().startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+
+    try:
+        version = subprocess.check_output(
+            [ffmpeg_path or _ffmpeg_path(), "-version"],
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        ).splitlines()[0]
+    except (subprocess.CalledProcessError, OSError, IndexError):
+        version = "unknown"
+
+    return f"{cpu_model} x{os.cpu_count()} | {version}"
+
+
+def _load_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                with open(ENCODER_PROFILE_CACHE, "r") as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError):
+                _cache = {}
+        return _cache
+
+
+def _save_cache():
+    with _cache_lock:
+        try:
+            temp_file = ENCODER_PROFILE_CACHE + ".tmp"
+            with open(temp_file, "w") as f:
+                json.dump(_cache, f, indent=2)
+            os.replace(temp_file, ENCODER_PROFILE_CACHE)
+        except OSError as e:
+            print(f"Error saving encoder profiles: {e}")
+
+
+def _class_lock(class_name):
+    with _class_locks_lock:
+        return _class_locks.setdefault(class_name, threading.Lock())
+
+
+def _host_entry(host_key):
+    cache = _load_cache()
+    with _cache_lock:
+        return cache.setdefault(host_key, {"profiles": {}, "results": {}})
+
+
+def _candidates():
+    # Thread counts aren't calibrated: renders take them from ENCODER_THREAD_BUDGET
+    for preset in CALIBRATION_PRESETS:
+        for crf in CALIBRATION_CRFS:
+            yield {
+                "name": f"{preset.strip()}-crf{crf}",
+                "preset": preset.strip(),
+                "crf": crf,
+                "threads": 0,
+            }
+
+
+def benchmark_profile(profile, size, ffmpeg_path=None, seconds=None):
+    """Encode a synthetic clip with a profile and return its fps and bitrate."""
+    seconds = seconds or CALIBRATION_SECONDS
+    frame_rate = 30
+    fd, output_path = tempfile.mkstemp(suffix=".mp4", prefix="calibrate_")
+    os.close(fd)
+
+    args = [
+        ffmpeg_path or _ffmpeg_path(), "-y", "-v", "error",
+        "-f", "lavfi",
+        "-i", f"testsrc2=size={size}:rate={frame_rate}:duration={seconds}",
+        # Light temporal noise so the source isn't unrealistically compressible
+        "-vf", "noise=alls=6:allf=t",
+        "-c:v", "libx264",
+        "-preset", profile["preset"],
+        "-crf", str(profile["crf"]),
+        "-threads", str(profile["threads"]),
+        "-an", output_path,
+    ]
+
+    try:
+        started = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300)
+        elapsed = time.perf_counter() - started
+        size_bytes = os.path.getsize(output_path)
+    finally:
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+
+    return {
+        "fps": round(seconds * frame_rate / elapsed, 2),
+        "kbps": round(size_bytes * 8 / 1000 / seconds, 1),
+    }
+
+
+def calibrate(classes=None, ffmpeg_path=None, force=False):
+    """Benchmark candidate profiles and store the fastest one per resolution class.
+
+    A profile qualifies when its CRF is within ENCODER_MAX_CRF and its bitrate
+    is within the class's size target. Results are cached on disk under the
+    host key so they are reused until the CPU or ffmpeg build changes;
+    force re-runs classes that were already calibrated.
+    """
+    classes = classes or list(RESOLUTION_CLASSES)
+    host_key = get_host_key(ffmpeg_path)
+    entry = _host_entry(host_key)
+
+    for class_name in classes:
+        with _class_lock(class_name):
+            if class_name in entry["profiles"] and not force:
+                continue
+
+            _, size, max_kbps = RESOLUTION_CLASSES[class_name]
+            print(f"Calibrating encoder profiles for {class_name} ({size})...")
+
+            results = []
+            for profile in _candidates():
+                try:
+                    measured = benchmark_profile(profile, size, ffmpeg_path)
+                except FileNotFoundError:
+                    # ffmpeg itself is missing; no candidate can succeed
+                    raise
+                except Exception as e:
+                    print(f"Calibration of {profile['name']} failed: {e}")
+                    continue
+                results.append(dict(profile, **measured))
+
+            eligible = [
+                r for r in results if r["crf"] <= ENCODER_MAX_CRF and r["kbps"] <= max_kbps
+            ]
+            # Fall back to the smallest output if nothing meets the size target
+            if eligible:
+                best = max(eligible, key=lambda r: r["fps"])
+            elif results:
+                best = min(results, key=lambda r: r["kbps"])
+            else:
+                continue
+
+            with _cache_lock:
+                entry["results"][class_name] = results
+                entry["profiles"][class_name] = dict(best, calibrated_at=time.time())
+            print(f"Selected encoder profile for {class_name}: {best['name']} ({best['fps']} fps, {best['kbps']} kbps)")
+            _save_cache()
+
+    with _cache_lock:
+        return dict(entry["profiles"])
+
+
+def start_background_calibration():
+    """Calibrate all resolution classes in a background thread (ENCODER_CALIBRATION=startup)."""
+    if ENCODER_CALIBRATION != "startup":
+        return None
+    thread = threading.Thread(target=calibrate)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _calibrate_in_background(class_name):
+    with _class_locks_lock:
+        if class_name in _calibrating:
+            return
+        _calibrating.add(class_name)
+
+    def run():
+        try:
+            calibrate([class_name])
+        except Exception as e:
+            print(f"Encoder calibration of {class_name} failed: {e}")
+        finally:
+            with _class_locks_lock:
+                _calibrating.discard(class_name)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+
+def start_recalibration():
+    """Re-calibrate every class (force=True) in a background thread.
+
+    Returns False if a recalibration is already running.
+    """
+    global _recalibration
+
+    def run():
+        try:
+            calibrate(force=True)
+        except Exception as e:
+            print(f"Encoder recalibration failed: {e}")
+
+    with _class_locks_lock:
+        if _recalibration is not None and _recalibration.is_alive():
+            return False
+        _recalibration = threading.Thread(target=run)
+        _recalibration.daemon = True
+        _recalibration.start()
+        return True
+
+
+def is_calibrating():
+    """Whether any calibration is running in the background."""
+    with _class_locks_lock:
+        return bool(_calibrating) or (_recalibration is not None and _recalibration.is_alive())
+
+
+def get_cached_profiles():
+    """Return the calibrated profiles for this host, if any."""
+    return _load_cache().get(get_host_key(), {}).get("profiles", {})
+
+
+def get_encoder_profile(width, height):
+    """Return the encoder profile to use for a video of the given size."""
+    class_name = resolution_class(width, height)
+    profiles = get_cached_profiles()
+
+    if class_name not in profiles and ENCODER_CALIBRATION == "on_demand":
+        # Don't hold the job up: it uses the default profile while the class calibrates
+        _calibrate_in_background(class_name)
+
+    profile = profiles.get(class_name, DEFAULT_PROFILE)
+    return {
+        "name": profile["name"],
+        "preset": profile["preset"],
+        "crf": profile["crf"],
+        "threads": profile["threads"],
+        "resolution_class": class_name,
+    }
+
+
+def moviepy_encoder_kwargs(profile):
+    """Keyword arguments for MoviePy's write_videofile for a profile."""
+    return {
+        "preset": profile["preset"],
+        "threads": profile.get("threads") or None,
+        "ffmpeg_params": ["-crf", str(profile["crf"])],
+    }
@@ -0,0 +1,453 @@
+import os
+import json
+import time
+import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+from analyzers import Analyzer
+from gemini_files import forget_file, get_or_upload_file, record_file_state
+from gemini_poller import IngestTimeout, wait_until_processed
+from gemini_governor import DEFAULT_PRIORITY, governed_call
+from job_scheduler import slot_released
+from analysis_proxy import get_analysis_proxy, get_analysis_window, get_trimmed_proxy, proxy_tag
+from silence_map import (
+    SILENCE_TRIM,
+    build_remap,
+    dead_air_cuts,
+    get_silence_map,
+    remap_segments,
+)
+from take_detection import TAKE_PREFILTER, get_take_map
+from segment_utils import keep_ranges
+from windowed_analysis import (
+    ANALYSIS_WINDOW_OVERLAP,
+    ANALYSIS_WINDOW_RETRIES,
+    ANALYSIS_WINDOW_WORKERS,
+    plan_analysis_windows,
+    reconcile_window_segments,
+    window_seconds,
+)
+
+# Initialize Gemini API
+try:
+    print("Initializing Gemini API:")
+    gemini_api_key = os.environ.get("GEMINI_API_KEY", "")
+    print(f"  API Key: {'<set>' if gemini_api_key else '<not set>'}")
+
+    if gemini_api_key:
+        genai.configure(api_key=gemini_api_key)
+        print("Successfully initialized Gemini API")
+    else:
+        print("WARNING: Gemini API key not set, video processing with Gemini will not work")
+except Exception as e:
+    print(f"Error initializing Gemini API: {e}")
+
+
+# Model used for the analysis; part of the analysis cache key
+ANALYSIS_MODEL = "models/gemini-1.5-pro-latest"
+# Bump whenever the prompt changes so cached analyses from the old prompt aren't reused
+ANALYSIS_PROMPT_VERSION = 1
+
+
+def build_analysis_prompt(video_duration, width, height, fps, script_text, window=None):
+    """Build the prompt asking Gemini for the segments that match a script.
+
+    window is an optional (index, count, start, end) describing which part
+    of a longer video the uploaded clip is; video_duration is then the
+    clip's duration.
+    """
+    window_info = ""
+    if window:
+        index, count, window_start, window_end = window
+        window_info = f"""
+        # CLIP INFORMATION
+        This clip is part {index + 1} of {count} of a longer video and covers {window_start:.1f}s to {window_end:.1f}s of it.
+        Neighbouring parts overlap slightly. Give all timestamps relative to the start of THIS clip (0 to {video_duration:.1f}).
+        Only this part is shown to you, so apply the repetition rule within this clip.
+"""
+    return f"""
+        You are an expert video editor AI. I have a video that needs to be edited according to a script.
+
+        # VIDEO INFORMATION
+        Duration: {video_duration} seconds
+        Resolution: {width}x{height}
+        FPS: {fps}
+{window_info}
+        # SCRIPT TO FOLLOW
+        {script_text or "No specific script provided. Please identify the most interesting, informative, or engaging segments of this video."}
+
+        # YOUR TASK
+        1. Analyze the video I'm providing
+        2. Find the parts of the video that match my script
+        3. Return PRECISE timestamps for the segments to keep
+        
+        # IMPORTANT INSTRUCTIONS
+        - Be VERY precise with timestamps
+        - I need exact start and end times in seconds
+        - Only include segments that clearly match the script
+        - Segments should have logical start/end points
+        - If uncertain, provide more context by extending segments
+        - STRICT REPETITION RULE: If two segments contain similar or identical content (like someone saying the same thing twice), you MUST select only one of them - preferably the clearest, best-performed version
+        - CRITICAL: Never include multiple segments where the same information is repeated, even if phrased slightly differently
+        - DO NOT include both "Hello, I'm John" and "My name is John" - these express the same information
+        - Choose quality over quantity: One good segment is better than multiple repetitive ones
+
+        # RESPONSE FORMAT
+        Return ONLY a valid JSON object with this structure:
+        {{
+            "segments_to_keep": [
+                {{
+                    "start_time": start_time_in_seconds,
+                    "end_time": end_time_in_seconds,
+                    "description": "Explanation of why this segment matches the script"
+                }}
+            ],
+            "analysis": "Your analysis of how well the video matches the script"
+        }}
+        """
+
+
+def gemini_wait_reporter(update_progress_callback, job_id, step, action):
+    """Return an on_wait callback showing a held-back Gemini call in the job's progress."""
+    if not update_progress_callback:
+        return None
+
+    def on_wait(info):
+        if info["reason"] == "queued":
+            detail = f"position {info['queue_position']} of {info['queue_depth']} in the Gemini queue"
+        else:
+            detail = f"Gemini {info['reason']}"
+        update_progress_callback(
+            job_id, step, 5, f"{action} ({detail}, waited {info['waited_seconds']:.0f}s)", gemini=info
+        )
+
+    return on_wait
+
+
+def upload_for_analysis(
+    upload_path, upload_key, display_name, proxy_report=None, priority=DEFAULT_PRIORITY, on_wait=None
+):
+    """Upload a video to Gemini (or reuse its live copy) and wait until it is processed."""
+    # Reuse the uploaded copy of this content if there is one (looked up by content hash)
+    upload_started = time.perf_counter()
+    video_file, uploaded = get_or_upload_file(
+        upload_path, upload_key, display_name=display_name, priority=priority, on_wait=on_wait
+    )
+    if uploaded and proxy_report is not None:
+        upload_seconds = time.perf_counter() - upload_started
+        proxy_report["upload_seconds"] = round(upload_seconds, 1)
+        if proxy_report["used"]:
+            # Time the skipped bytes would have taken at the measured upload rate
+            proxy_report["upload_seconds_saved"] = round(
+                upload_seconds * proxy_report["bytes_saved"] / proxy_report["proxy_bytes"], 1
+            )
+
+    # The shared poller checks the file's state until Gemini has ingested it; the
+    # wait uses nothing local, so the job's worker slot goes to other jobs meanwhile
+    print("Waiting for video processing to complete...")
+    try:
+        with slot_released():
+            video_file = wait_until_processed(video_file).result()
+    except IngestTimeout:
+        forget_file(upload_key)
+        raise
+
+    if video_file.state.name == "FAILED":
+        forget_file(upload_key)
+        raise ValueError(f"Video processing failed: {video_file.state.name}")
+    record_file_state(upload_key, video_file)
+
+    print(f"Video processing complete. State: {video_file.state.name}")
+    return video_file
+
+
+def request_segments(video_file, prompt, priority=DEFAULT_PRIORITY, on_wait=None):
+    """Ask Gemini for the segments of an uploaded video and parse the JSON response."""
+    print("Making LLM inference request...")
+    model = genai.GenerativeModel(model_name=ANALYSIS_MODEL)
+    # Inferences are rate limited, queued by priority and retried on 429/5xx by the governor
+    response = governed_call(
+        lambda: model.generate_content([video_file, prompt], request_options={"timeout": 600}),
+        kind="inference",
+        priority=priority,
+        on_wait=on_wait,
+    )
+
+    # Parse the response to get the segments to keep
+    response_text = response.text
+    print(f"Response from Gemini (first 200 chars): {response_text[:200]}...")
+
+    # Extract JSON from the response (in case there's any text before or after)
+    json_match = re.search(r"({[\s\S]*})", response_text)
+    if json_match:
+        json_str = json_match.group(1)
+        try:
+            segments_data = json.loads(json_str)
+            print(
+                f"Successfully parsed JSON with keys: {list(segments_data.keys())}"
+            )
+        except json.JSONDecodeError as e:
+            print(f"JSON parse error: {e}")
+            # Try to fix common JSON formatting issues
+            json_str = json_str.replace(
+                "'", '"'
+            )  # Replace single quotes with double quotes
+            try:
+                segments_data = json.loads(json_str)
+                print("Successfully parsed JSON after fixing quotes")
+            except:
+                raise ValueError(
+                    f"Could not parse JSON from Gemini response: {json_str[:200]}..."
+                )
+    else:
+        # Fallback if no valid JSON found
+        raise ValueError("Could not extract valid JSON from Gemini response")
+
+    return segments_data
+
+
+def prepare_analysis_source(video_path, video_hash, ffmpeg_path=None):
+    """Return (path, key, proxy_report) of the analysis proxy, or of the source when no proxy is used."""
+    upload_path, proxy_report = get_analysis_proxy(video_path, video_hash, ffmpeg_path)
+    upload_key = f"{video_hash}-{proxy_tag()}" if proxy_report["used"] else video_hash
+    return upload_path, upload_key, proxy_report
+
+
+def trim_analysis_source(source, trim_ranges, video_duration, ffmpeg_path=None):
+    """Cut an analysis source down to trim_ranges; returns (source, remap) or (source, None) if it fails."""
+    source_path, source_key, proxy_report = source
+    try:
+        trimmed_key, trimmed_path = get_trimmed_proxy(source_path, source_key, trim_ranges, ffmpeg_path)
+    except Exception as e:
+        print(f"Dead air not trimmed, uploading the untrimmed video: {e}")
+        return source, None
+
+    remap = build_remap(trim_ranges)
+    trimmed_bytes = os.path.getsize(trimmed_path)
+    proxy_report = dict(
+        proxy_report,
+        used=True,
+        proxy_bytes=trimmed_bytes,
+        bytes_saved=proxy_report["source_bytes"] - trimmed_bytes,
+        trimmed_seconds=round(
+            video_duration - sum(end - start for start, end in trim_ranges), 1
+        ),
+    )
+    return (trimmed_path, trimmed_key, proxy_report), remap
+
+
+def analyze_video_with_gemini(
+    video_path,
+    video_hash,
+    prompt,
+    update_progress_callback=None,
+    job_id=None,
+    priority=DEFAULT_PRIORITY,
+    ffmpeg_path=None,
+    source=None,
+):
+    """Upload the video (or its analysis proxy) to Gemini and ask for the segments to keep.
+
+    source is an optional (path, key, proxy_report) of the file to upload,
+    as returned by prepare_analysis_source(). Returns (segments_data,
+    proxy_report) where segments_data is the parsed JSON response.
+    """
+    if update_progress_callback:
+        update_progress_callback(job_id, 2, 5, "Uploading video to Gemini")
+
+    # Upload a small analysis proxy instead of the original when possible
+    upload_path, upload_key, proxy_report = source or prepare_analysis_source(
+        video_path, video_hash, ffmpeg_path
+    )
+    video_file = upload_for_analysis(
+        upload_path,
+        upload_key,
+        os.path.basename(video_path),
+        proxy_report,
+        priority,
+        gemini_wait_reporter(update_progress_callback, job_id, 2, "Uploading video to Gemini"),
+    )
+
+    if update_progress_callback:
+        update_progress_callback(job_id, 3, 5, "Analyzing video with Gemini AI")
+
+    # Call Gemini API with the whole video file
+    segments_data = request_segments(
+        video_file,
+        prompt,
+        priority,
+        gemini_wait_reporter(update_progress_callback, job_id, 3, "Analyzing video with Gemini AI"),
+    )
+
+    if update_progress_callback:
+        update_progress_callback(job_id, 4, 5, "Processing Gemini's analysis")
+
+    return segments_data, proxy_report
+
+
+def analyze_video_in_windows(
+    video_path,
+    video_hash,
+    windows,
+    video_info,
+    script_text,
+    update_progress_callback=None,
+    job_id=None,
+    priority=DEFAULT_PRIORITY,
+    ffmpeg_path=None,
+    source=None,
+):
+    """Analyse a long video as overlapping windows in parallel.
+
+    Each window is cut from the analysis proxy, uploaded and analysed on its
+    own, with the script sent once per window. A failed window is retried
+    on its own instead of restarting the whole analysis. Returns
+    (segments_data, proxy_report) like analyze_video_with_gemini, with
+    timestamps on the full video's timeline.
+    """
+    if update_progress_callback:
+        update_progress_callback(
+            job_id, 2, 5, f"Uploading video to Gemini in {len(windows)} parts"
+        )
+
+    source_path, source_key, proxy_report = source or prepare_analysis_source(
+        video_path, video_hash, ffmpeg_path
+    )
+    width, height, fps = video_info
+    completed = []
+    on_wait = gemini_wait_reporter(update_progress_callback, job_id, 3, "Analyzing video with Gemini AI")
+
+    def analyze_window(index):
+        start, end = windows[index]
+        prompt = build_analysis_prompt(
+            round(end - start, 3), width, height, fps, script_text,
+            window=(index, len(windows), start, end),
+        )
+        for attempt in range(ANALYSIS_WINDOW_RETRIES + 1):
+            try:
+                window_key, window_path = get_analysis_window(
+                    source_path, source_key, start, end, ffmpeg_path
+                )
+                video_file = upload_for_analysis(
+                    window_path,
+                    window_key,
+                    f"{os.path.basename(video_path)}-part{index + 1}",
+                    priority=priority,
+                    on_wait=on_wait,
+                )
+                segments_data = request_segments(video_file, prompt, priority, on_wait)
+            except Exception as e:
+                if attempt == ANALYSIS_WINDOW_RETRIES:
+                    raise Exception(f"analysis of part {index + 1} ({start:.0f}s-{end:.0f}s) failed: {e}")
+                print(f"Analysis of part {index + 1} failed ({e}), retrying")
+                time.sleep(2 ** attempt)
+                continue
+
+            completed.append(index)
+            if update_progress_callback:
+                update_progress_callback(
+                    job_id, 3, 5,
+                    f"Analyzing video with Gemini AI ({len(completed)}/{len(windows)} parts)",
+                )
+            return segments_data
+
+    with ThreadPoolExecutor(max_workers=ANALYSIS_WINDOW_WORKERS) as pool:
+        window_results = list(pool.map(analyze_window, range(len(windows))))
+
+    if update_progress_callback:
+        update_progress_callback(job_id, 4, 5, "Processing Gemini's analysis")
+
+    segments_data = reconcile_window_segments(windows, window_results, windows[-1][1])
+    proxy_report["windows"] = len(windows)
+    return segments_data, proxy_report
+
+
+def _analysis_plan(video_duration, trim_ranges):
+    duration = sum(end - start for start, end in trim_ranges) if trim_ranges else video_duration
+    return {"trim_ranges": trim_ranges, "duration": duration, "windows": plan_analysis_windows(duration)}
+
+
+class GeminiAnalyzer(Analyzer):
+    """Selects segments with Gemini; long videos are analysed as overlapping windows."""
+
+    name = "gemini"
+
+    def __init__(self, ffmpeg_path=None):
+        self.ffmpeg_path = ffmpeg_path
+
+    def plan(self, video_path, video_hash, video_info):
+        # Long dead air and rejected repeated takes are optionally cut out of
+        # what is uploaded; the silence and take maps are cached per video
+        cuts = []
+        if SILENCE_TRIM == "on":
+            silence_map = get_silence_map(video_path, video_hash, self.ffmpeg_path)
+            cuts.extend(dead_air_cuts(silence_map, video_info["duration"]))
+        if TAKE_PREFILTER == "on":
+            take_map = get_take_map(video_path, video_hash, self.ffmpeg_path)
+            cuts.extend(take_map["rejected"] if take_map else [])
+        trim_ranges = keep_ranges(cuts, video_info["duration"]) if cuts else None
+        return _analysis_plan(video_info["duration"], trim_ranges)
+
+    def cache_identity(self, video_info, plan=None):
+        # Trimmed and windowed analyses differ from whole-video ones, so they get
+        # their own cache entries: the trim by the exact ranges kept, the windows
+        # by their layout, both as planned for this video
+        plan = plan or _analysis_plan(video_info["duration"], None)
+        variant = ""
+        if plan["trim_ranges"]:
+            digest = hashlib.sha1(json.dumps(plan["trim_ranges"]).encode("utf-8")).hexdigest()
+            variant += f"-trim-{digest[:16]}"
+        if len(plan["windows"]) > 1:
+            variant += f"-windows-{window_seconds():.0f}-{ANALYSIS_WINDOW_OVERLAP:.0f}"
+        return ANALYSIS_MODEL, f"{ANALYSIS_PROMPT_VERSION}{variant}" if variant else ANALYSIS_PROMPT_VERSION
+
+    def analyze(
+        self,
+        video_path,
+        video_hash,
+        video_info,
+        script_text,
+        update_progress_callback=None,
+        job_id=None,
+        priority=DEFAULT_PRIORITY,
+        plan=None,
+    ):
+        width, height, fps = video_info["width"], video_info["height"], video_info["fps"]
+        plan = plan or self.plan(video_path, video_hash, video_info)
+        source = prepare_analysis_source(video_path, video_hash, self.ffmpeg_path)
+
+        remap = None
+        if plan["trim_ranges"]:
+            source, remap = trim_analysis_source(
+                source, plan["trim_ranges"], video_info["duration"], self.ffmpeg_path
+            )
+            if remap:
+                print(f"Uploading {plan['duration']:.1f}s of {video_info['duration']:.1f}s with dead air and repeated takes cut")
+            else:
+                # The whole video is uploaded after all; the windows follow suit
+                plan = _analysis_plan(video_info["duration"], None)
+        analysis_duration = plan["duration"]
+
+        windows = plan["windows"]
+        if len(windows) > 1:
+            print(f"Analysing video in {len(windows)} overlapping windows")
+            segments_data, proxy_report = analyze_video_in_windows(
+                video_path, video_hash, windows, (width, height, fps), script_text,
+                update_progress_callback, job_id, priority, self.ffmpeg_path, source,
+            )
+        else:
+            prompt = build_analysis_prompt(analysis_duration, width, height, fps, script_text)
+            segments_data, proxy_report = analyze_video_with_gemini(
+                video_path, video_hash, prompt, update_progress_callback, job_id, priority,
+                self.ffmpeg_path, source,
+            )
+
+        if remap:
+            segments_data = dict(
+                segments_data,
+                segments_to_keep=remap_segments(segments_data.get("segments_to_keep", []), remap),
+            )
+        return segments_data, {"analysis_proxy": proxy_report, "analysis_plan": plan}
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import google.generativeai as genai
+from google.api_core.exceptions import NotFound, PermissionDenied
+
+from blob_store import file_sha256
+from gemini_governor import DEFAULT_PRIORITY, governed_call
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Local index of videos uploaded to the Gemini Files API, keyed by content hash
+GEMINI_FILE_INDEX = os.environ.get(
+    "GEMINI_FILE_INDEX", os.path.join(BASE_DIR, "gemini_files.json")
+)
+# Seconds an uploaded file stays usable when the API doesn't report an expiry
+# (the Files API deletes files after 48 hours)
+GEMINI_FILE_TTL = int(os.environ.get("GEMINI_FILE_TTL", 47 * 3600))
+# Entries this close to expiring are treated as expired, so a file can't lapse mid-job
+GEMINI_FILE_EXPIRY_MARGIN = int(os.environ.get("GEMINI_FILE_EXPIRY_MARGIN", 3600))
+
+_index = None
+_index_lock = threading.Lock()
+# Per-hash upload locks and how many callers hold or wait on each
+_upload_locks = {}
+
+
+def _load_index():
+    global _index
+    if _index is None:
+        try:
+            with open(GEMINI_FILE_INDEX, "r") as f:
+                _index = json.load(f)
+        except (OSError, ValueError):
+            _index = {}
+    return _index
+
+
+def _save_index():
+    try:
+        temp_file = GEMINI_FILE_INDEX + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(_index, f, indent=2)
+        os.replace(temp_file, GEMINI_FILE_INDEX)
+    except OSError as e:
+        print(f"Error saving Gemini file index: {e}")
+
+
+def _expires_at(remote_file):
+    expiration_time = getattr(remote_file, "expiration_time", None)
+    if isinstance(expiration_time, datetime):
+        return expiration_time.timestamp()
+    return time.time() + GEMINI_FILE_TTL
+
+
+def evict_expired():
+    """Drop index entries whose remote file has expired (or is about to)."""
+    with _index_lock:
+        index = _load_index()
+        cutoff = time.time() + GEMINI_FILE_EXPIRY_MARGIN
+        expired = [video_hash for video_hash, entry in index.items() if entry["expires_at"] <= cutoff]
+        for video_hash in expired:
+            del index[video_hash]
+        if expired:
+            _save_index()
+        return expired
+
+
+def lookup(video_hash):
+    """Return the live index entry for a content hash, or None."""
+    evict_expired()
+    with _index_lock:
+        entry = _load_index().get(video_hash)
+        return dict(entry) if entry else None
+
+
+def record_file_state(video_hash, remote_file):
+    """Store or refresh the index entry for an uploaded file."""
+    with _index_lock:
+        index = _load_index()
+        previous = index.get(video_hash, {})
+        index[video_hash] = {
+            "name": remote_file.name,
+            "uri": remote_file.uri,
+            "display_name": remote_file.display_name,
+            "state": remote_file.state.name,
+            "uploaded_at": previous.get("uploaded_at", time.time()),
+            "expires_at": _expires_at(remote_file),
+        }
+        _save_index()
+
+
+def forget_file(video_hash):
+    with _index_lock:
+        if _load_index().pop(video_hash, None) is not None:
+            _save_index()
+
+
+@contextmanager
+def _upload_lock(video_hash):
+    with _index_lock:
+        entry = _upload_locks.setdefault(video_hash, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _index_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _upload_locks[video_hash]
+
+
+def get_or_upload_file(
+    video_path, video_hash=None, display_name=None, priority=DEFAULT_PRIORITY, on_wait=None
+):
+    """Return (file, uploaded) for a video, uploading it only if no live copy exists.
+
+    The local index is consulted before any remote call, so a known video
+    costs a single get_file. Concurrent calls for the same content wait for
+    one upload instead of each uploading their own copy. Both calls go
+    through the Gemini governor with the given priority and on_wait.
+    """
+    video_hash = video_hash or file_sha256(video_path)
+
+    with _upload_lock(video_hash):
+        entry = lookup(video_hash)
+        if entry and entry["state"] != "FAILED":
+            try:
+                remote_file = governed_call(
+                    lambda: genai.get_file(entry["name"]), priority=priority, on_wait=on_wait
+                )
+                print(f"Found previously uploaded video: {remote_file.display_name}")
+                print(f"File URI: {remote_file.uri}")
+                record_file_state(video_hash, remote_file)
+                return remote_file, False
+            except (NotFound, PermissionDenied) as e:
+                # Deleted or expired on the server side; upload again.
+                # Anything else (e.g. an outage) says nothing about the file and is raised
+                print(f"Indexed Gemini file {entry['name']} unavailable ({e}), uploading again")
+                forget_file(video_hash)
+
+        display_name = f"{display_name or os.path.basename(video_path)}-{video_hash[:12]}"
+        print(f"Uploading video: {video_path}")
+        remote_file = governed_call(
+            lambda: genai.upload_file(path=video_path, display_name=display_name, resumable=True),
+            kind="upload",
+            priority=priority,
+            upload_bytes=os.path.getsize(video_path),
+            on_wait=on_wait,
+        )
+        print(f"Completed upload: {remote_file.uri}")
+        record_file_state(video_hash, remote_file)
+        return remote_file, True
@@ -0,0 +1,320 @@
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+
+# Request rate across all Gemini calls (requests per minute) and its burst size
+GEMINI_REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_REQUEST_BURST = int(os.environ.get("GEMINI_REQUEST_BURST", 10))
+# Upload start pacing (bytes per second, 0 = off): each upload reserves its whole
+# size before it starts, so starts are spaced to keep the average upload rate
+# under this. It doesn't throttle an upload while it runs.
+GEMINI_UPLOAD_PACING_BYTES_PER_SECOND = int(os.environ.get("GEMINI_UPLOAD_PACING_BYTES_PER_SECOND", 0))
+# generate_content calls running at the same time; the rest queue by priority
+GEMINI_MAX_CONCURRENT_INFERENCES = int(os.environ.get("GEMINI_MAX_CONCURRENT_INFERENCES", 2))
+# Retries of a call failing with 429/5xx, and the backoff base and cap (seconds)
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 5))
+GEMINI_RETRY_BASE_DELAY = float(os.environ.get("GEMINI_RETRY_BASE_DELAY", "2"))
+GEMINI_RETRY_MAX_DELAY = float(os.environ.get("GEMINI_RETRY_MAX_DELAY", "60"))
+# Consecutive retryable failures that open the circuit, and how long it stays open
+GEMINI_BREAKER_THRESHOLD = int(os.environ.get("GEMINI_BREAKER_THRESHOLD", 5))
+GEMINI_BREAKER_COOLDOWN = int(os.environ.get("GEMINI_BREAKER_COOLDOWN", 60))
+
+# Job priorities, most urgent first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = "normal"
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Seconds between on_wait reports while a call is queued
+WAIT_REPORT_INTERVAL = 2
+
+
+class GeminiUnavailable(Exception):
+    pass
+
+
+def is_retryable(error):
+    """Whether a failed call is worth retrying: 429 and 5xx responses and network errors."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # google.api_core errors carry the HTTP status as .code
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS_CODES
+
+
+class TokenBucket:
+    """Token bucket where callers reserve tokens and are told how long to wait.
+
+    Reservations may exceed the capacity (e.g. one large upload); the bucket
+    then goes into debt and later callers wait for it to refill.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take amount tokens and return the seconds to wait before using them."""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+class CircuitBreaker:
+    """Fails calls fast while the API looks down.
+
+    Opens after GEMINI_BREAKER_THRESHOLD consecutive retryable failures.
+    After the cooldown a single trial call is let through; its success
+    closes the circuit and its failure opens it again.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """True if a call may go ahead, "trial" if it is the half-open trial, else False."""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return "trial"
+            return False
+
+    def abandon_trial(self):
+        """End the half-open trial without an outcome; the next call becomes the trial."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class PrioritySlots:
+    """A fixed number of slots handed out by (priority, arrival) order."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiters = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def acquire(self, priority, on_wait=None):
+        """Block until a slot is free; on_wait(position, depth) is called while queued.
+
+        on_wait runs outside the lock, since it may be slow (e.g. saving job
+        progress) and must not hold up the other waiters.
+        """
+        entry = (priority, next(self.counter))
+        with self.condition:
+            heapq.heappush(self.waiters, entry)
+        try:
+            while True:
+                with self.condition:
+                    if self.active < self.limit and self.waiters[0] == entry:
+                        heapq.heappop(self.waiters)
+                        self.active += 1
+                        return
+                    position, depth = sorted(self.waiters).index(entry) + 1, len(self.waiters)
+                if on_wait:
+                    on_wait(position, depth)
+                with self.condition:
+                    if self.active >= self.limit or self.waiters[0] != entry:
+                        self.condition.wait(WAIT_REPORT_INTERVAL)
+        except BaseException:
+            with self.condition:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()
+            raise
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def depth(self):
+        with self.condition:
+            return len(self.waiters)
+
+
+class GeminiGovernor:
+    """Single gate for all Gemini traffic.
+
+    Every call passes the circuit breaker and the request rate limit;
+    uploads are also paced by size and inferences wait for one of a
+    fixed number of slots, in priority order. Calls failing with 429/5xx
+    are retried with exponential backoff and full jitter.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(GEMINI_REQUESTS_PER_MINUTE / 60, GEMINI_REQUEST_BURST)
+        self.upload_pacing = TokenBucket(
+            GEMINI_UPLOAD_PACING_BYTES_PER_SECOND, GEMINI_UPLOAD_PACING_BYTES_PER_SECOND * 10
+        )
+        self.inference_slots = PrioritySlots(GEMINI_MAX_CONCURRENT_INFERENCES)
+        self.breaker = CircuitBreaker(GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_COOLDOWN)
+        self.lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _record_wait(self, seconds):
+        with self.lock:
+            self.stats["waits"] += 1
+            self.stats["wait_seconds_total"] += seconds
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], seconds)
+
+    def call(
+        self, fn, kind="request", priority=DEFAULT_PRIORITY, upload_bytes=0, on_wait=None, max_retries=None
+    ):
+        """Run fn() under the limits for its kind ("request", "upload" or "inference").
+
+        on_wait(info) is called with the queue position, depth and time
+        waited so far whenever the call is held back, so jobs can show it.
+        Raises GeminiUnavailable while the circuit is open.
+        """
+        priority_rank = PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY])
+        if max_retries is None:
+            max_retries = GEMINI_MAX_RETRIES
+        started = time.monotonic()
+
+        def report(reason, position=None, depth=None):
+            if on_wait:
+                on_wait({
+                    "reason": reason,
+                    "queue_position": position,
+                    "queue_depth": self.inference_slots.depth() if depth is None else depth,
+                    "waited_seconds": round(time.monotonic() - started, 1),
+                })
+
+        for attempt in range(max_retries + 1):
+            attempt_started = time.monotonic()
+            allowed = self.breaker.allow()
+            if not allowed:
+                with self.lock:
+                    self.stats["rejected"] += 1
+                raise GeminiUnavailable("Gemini API unavailable (circuit open), try again later")
+
+            outcome_recorded = False
+            try:
+                # Wait out the rate limit before taking a slot, so a call that is
+                # only rate limited doesn't hold a slot a more urgent call could use
+                delay = self.requests.reserve(1)
+                if kind == "upload" and upload_bytes:
+                    delay = max(delay, self.upload_pacing.reserve(upload_bytes))
+                if delay > 0:
+                    report("rate limited")
+                    time.sleep(delay)
+                if kind == "inference":
+                    self.inference_slots.acquire(
+                        priority_rank, lambda position, depth: report("queued", position, depth)
+                    )
+                try:
+                    self._record_wait(time.monotonic() - attempt_started)
+
+                    with self.lock:
+                        self.stats["calls"] += 1
+                    try:
+                        result = fn()
+                    except Exception as e:
+                        if not is_retryable(e):
+                            # A bad request says nothing about the API's health: it
+                            # neither counts as a success nor as a failure (a trial
+                            # it was is given up in the finally below)
+                            raise
+                        self.breaker.record_failure()
+                        outcome_recorded = True
+                        with self.lock:
+                            self.stats["failures"] += 1
+                        if attempt == max_retries:
+                            raise
+                        print(f"Gemini {kind} failed ({e}), retrying (attempt {attempt + 1})")
+                    else:
+                        self.breaker.record_success()
+                        outcome_recorded = True
+                        return result
+                finally:
+                    if kind == "inference":
+                        self.inference_slots.release()
+            finally:
+                # A trial that ended without an outcome (a bad request, or on_wait
+                # raised) mustn't keep the circuit stuck
+                if allowed == "trial" and not outcome_recorded:
+                    self.breaker.abandon_trial()
+
+            # Back off outside the inference slot so other calls can use it
+            with self.lock:
+                self.stats["retries"] += 1
+            report("retrying")
+            time.sleep(random.uniform(0, min(GEMINI_RETRY_MAX_DELAY, GEMINI_RETRY_BASE_DELAY * 2 ** attempt)))
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        waits = stats.pop("waits")
+        stats.update({
+            "wait_seconds_average": round(stats["wait_seconds_total"] / waits, 2) if waits else 0.0,
+            "wait_seconds_total": round(stats["wait_seconds_total"], 1),
+            "wait_seconds_max": round(stats["wait_seconds_max"], 1),
+            "queue_depth": self.inference_slots.depth(),
+            "inferences_running": self.inference_slots.active,
+            "circuit": self.breaker.state,
+        })
+        return stats
+
+
+_governor = GeminiGovernor()
+
+
+def governed_call(
+    fn, kind="request", priority=DEFAULT_PRIORITY, upload_bytes=0, on_wait=None, max_retries=None
+):
+    """Run a Gemini call through the shared governor."""
+    return _governor.call(fn, kind, priority, upload_bytes, on_wait, max_retries)
+
+
+def get_governor_stats():
+    return _governor.get_stats()
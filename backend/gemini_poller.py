@@ -0,0 +1,164 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import Future
+
+import google.generativeai as genai
+
+from gemini_governor import governed_call
+
+# Delay before the first state check of a newly registered file, and the cap
+# the delay doubles up to while the file is still processing
+GEMINI_POLL_INITIAL_DELAY = float(os.environ.get("GEMINI_POLL_INITIAL_DELAY", "2"))
+GEMINI_POLL_MAX_DELAY = float(os.environ.get("GEMINI_POLL_MAX_DELAY", "30"))
+# Random spread applied to each delay (0.25 = +/-25%), so files registered together don't poll together
+GEMINI_POLL_JITTER = float(os.environ.get("GEMINI_POLL_JITTER", "0.25"))
+# Files due within this many seconds of one that is due are checked together
+GEMINI_POLL_BATCH_WINDOW = float(os.environ.get("GEMINI_POLL_BATCH_WINDOW", "1"))
+# With at least this many files due, one list_files() sweep replaces the per-file get_file() calls
+GEMINI_POLL_LIST_THRESHOLD = int(os.environ.get("GEMINI_POLL_LIST_THRESHOLD", 4))
+# Seconds a file may stay in PROCESSING before its waiters fail
+GEMINI_INGEST_TIMEOUT = int(os.environ.get("GEMINI_INGEST_TIMEOUT", 1800))
+
+
+class IngestTimeout(Exception):
+    pass
+
+
+class _Watch:
+    def __init__(self, name, timeout):
+        now = time.monotonic()
+        self.name = name
+        self.future = Future()
+        self.deadline = now + timeout
+        self.delay = GEMINI_POLL_INITIAL_DELAY
+        self.next_check = now + self._jittered(self.delay)
+
+    @staticmethod
+    def _jittered(delay):
+        return delay * random.uniform(1 - GEMINI_POLL_JITTER, 1 + GEMINI_POLL_JITTER)
+
+    def back_off(self):
+        self.delay = min(GEMINI_POLL_MAX_DELAY, self.delay * 2)
+        self.next_check = time.monotonic() + self._jittered(self.delay)
+
+
+class FileStatePoller:
+    """Watches Gemini files until they leave PROCESSING, from one background thread.
+
+    Callers register a file and get a Future that resolves to the refreshed
+    file once its state is no longer PROCESSING (or fails with
+    IngestTimeout). Every waiting file is checked by the same thread, with
+    exponential backoff and jitter per file, so waiting costs no thread per
+    job and no fixed-interval polling.
+    """
+
+    def __init__(self):
+        self._watches = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def watch(self, remote_file, timeout=None, callback=None):
+        """Return a Future for remote_file leaving PROCESSING; callback(future) runs when it does."""
+        if remote_file.state.name != "PROCESSING":
+            future = Future()
+            future.set_result(remote_file)
+        else:
+            with self._condition:
+                watch = self._watches.get(remote_file.name)
+                if watch is None:
+                    watch = _Watch(remote_file.name, timeout or GEMINI_INGEST_TIMEOUT)
+                    self._watches[remote_file.name] = watch
+                    self._ensure_thread()
+                    self._condition.notify()
+                future = watch.future
+
+        if callback:
+            future.add_done_callback(callback)
+        return future
+
+    def pending(self):
+        with self._condition:
+            return len(self._watches)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="gemini-file-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    if any(watch.next_check <= now for watch in self._watches.values()):
+                        # Files due shortly anyway are checked in the same sweep
+                        horizon = now + GEMINI_POLL_BATCH_WINDOW
+                        due = [watch for watch in self._watches.values() if watch.next_check <= horizon]
+                        break
+                    if self._watches:
+                        next_check = min(watch.next_check for watch in self._watches.values())
+                        self._condition.wait(next_check - now)
+                    else:
+                        self._condition.wait()
+
+            states = self._check(due)
+
+            finished = []
+            with self._condition:
+                now = time.monotonic()
+                for watch in due:
+                    remote_file = states.get(watch.name)
+                    if remote_file is not None and remote_file.state.name != "PROCESSING":
+                        del self._watches[watch.name]
+                        finished.append((watch, remote_file))
+                    elif now >= watch.deadline:
+                        del self._watches[watch.name]
+                        finished.append((watch, None))
+                    else:
+                        watch.back_off()
+
+            # Resolve outside the lock, since done callbacks run on this thread
+            for watch, remote_file in finished:
+                if remote_file is not None:
+                    watch.future.set_result(remote_file)
+                else:
+                    watch.future.set_exception(
+                        IngestTimeout(f"{watch.name} still processing after the ingestion timeout")
+                    )
+
+    def _check(self, due):
+        """Return {name: file} for the due files whose state could be fetched."""
+        states = {}
+        if len(due) >= GEMINI_POLL_LIST_THRESHOLD:
+            try:
+                wanted = {watch.name for watch in due}
+                # The poller backs off on its own, so failed checks aren't retried by the governor
+                remote_files = governed_call(lambda: list(genai.list_files()), priority="low", max_retries=0)
+                for remote_file in remote_files:
+                    if remote_file.name in wanted:
+                        states[remote_file.name] = remote_file
+                return states
+            except Exception as e:
+                print(f"Listing Gemini files failed, checking them one by one: {e}")
+
+        for watch in due:
+            try:
+                states[watch.name] = governed_call(lambda: genai.get_file(watch.name), priority="low", max_retries=0)
+            except Exception as e:
+                # Transient errors are retried at the next (backed off) check
+                print(f"Checking Gemini file {watch.name} failed: {e}")
+        return states
+
+
+_poller = FileStatePoller()
+
+
+def wait_until_processed(remote_file, timeout=None, callback=None):
+    """Register remote_file with the shared poller and return its Future."""
+    return _poller.watch(remote_file, timeout, callback)
+
+
+def pending_files():
+    return _poller.pending()
@@ -164,17 +164,25 @@ def calculate_safe_memory_limit(gpu_info, safety_factor=None):
     logger.info(f"Safe GPU memory limit calculated: {safe_limit}MB (factor: {safety_factor})")
     return safe_limit
 
-def get_ffmpeg_gpu_args(gpu_info, input_file, output_file, memory_limit=None):
-    """Generate FFmpeg arguments optimized for the detected GPU"""
+def get_cpu_encoder_args(profile=None):
+    """libx264 encoder arguments, using a calibrated encoder profile if given"""
+    if not profile:
+        return ["-c:v", "libx264", "-preset", "medium", "-c:a", "aac"]
+    
+    args = ["-c:v", "libx264", "-preset", profile["preset"], "-crf", str(profile["crf"])]
+    if profile.get("threads"):
+        args.extend(["-threads", str(profile["threads"])])
+    args.extend(["-c:a", "aac"])
+    return args
+
+def get_ffmpeg_gpu_args(gpu_info, input_file, output_file, memory_limit=None, profile=None):
+    """Generate FFmpeg arguments optimized for the detected GPU.
+    
+    profile is an optional encoder profile (see encoder_profiles) used for CPU encoding."""
     # If GPU use is disabled via environment variable, fallback to CPU
     if not USE_GPU or not gpu_info.available:
         # Fallback to CPU
-        return [
-            "ffmpeg", "-i", input_file,
-            "-c:v", "libx264", "-preset", "medium",
-            "-c:a", "aac", 
-            output_file
-        ]
+        return ["ffmpeg", "-i", input_file] + get_cpu_encoder_args(profile) + [output_file]
     
     # If no memory limit provided, calculate a safe one
     if memory_limit is None:
@@ -237,17 +245,41 @@ def get_ffmpeg_gpu_args(gpu_info, input_file, output_file, memory_limit=None):
     if input_file:
         base_args.extend(["-i", input_file])
     
-    base_args.extend([
-        "-c:v", "libx264", 
-        "-preset", "medium",
-        "-c:a", "aac"
-    ])
+    base_args.extend(get_cpu_encoder_args(profile))
     
     if output_file:
         base_args.append(output_file)
     
     return base_args
 
+# Encoder options used by the ffmpeg-native renderers on each GPU vendor. Those
+# renderers decode in software (their trim/concat filters need frames in system
+# memory), so no -hwaccel input options, and ffmpeg has no GPU memory cap option
+NVENC_ENCODER_ARGS = [
+    "-c:v", "h264_nvenc",
+    "-preset", "p4",
+    "-tune", "hq",
+    "-b:v", "5M",
+    "-maxrate", "8M",
+    "-bufsize", "10M",
+    "-c:a", "aac",
+]
+AMF_ENCODER_ARGS = ["-c:v", "h264_amf", "-quality", "quality", "-c:a", "aac"]
+
+def get_ffmpeg_encoder_args(gpu_info, profile=None):
+    """Return (input_args, output_args) for renderers that build their own ffmpeg command lines.
+
+    input_args go before "-i" and are always empty (decoding stays in software);
+    output_args are the encoder options for the detected GPU, or libx264 with
+    the encoder profile.
+    """
+    if USE_GPU and gpu_info.available:
+        if gpu_info.vendor == "NVIDIA":
+            return [], list(NVENC_ENCODER_ARGS)
+        if gpu_info.vendor == "AMD":
+            return [], list(AMF_ENCODER_ARGS)
+    return [], get_cpu_encoder_args(profile)
+
 if __name__ == "__main__":
     # Test the GPU detection
     gpu_info = detect_gpu_info()
@@ -0,0 +1,267 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+from gemini_governor import DEFAULT_PRIORITY, PRIORITIES
+from renderers import probe_media, probe_video_stream
+
+
+def _physical_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+# Jobs processed at the same time
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", max(1, min(4, (os.cpu_count() or 1) // 2))))
+# Memory (MB) all running jobs together may use; defaults to 3/4 of physical memory
+JOB_MEMORY_BUDGET_MB = int(os.environ.get("JOB_MEMORY_BUDGET_MB", _physical_memory_mb() * 3 // 4 or 4096))
+# CPU cores all running jobs together may use
+JOB_CPU_BUDGET = float(os.environ.get("JOB_CPU_BUDGET", os.cpu_count() or 1))
+# Jobs that may sit in slot_released() at once; every job keeps its thread while
+# it waits, so no new job starts once JOB_WORKERS + JOB_MAX_SUSPENDED are alive
+JOB_MAX_SUSPENDED = int(os.environ.get("JOB_MAX_SUSPENDED", JOB_WORKERS))
+# Memory model: a fixed part, a part per megapixel of frame (decoder and encoder
+# frame buffers) and a part per minute of video (decoded audio)
+JOB_MEMORY_BASE_MB = int(os.environ.get("JOB_MEMORY_BASE_MB", 300))
+JOB_MEMORY_PER_MEGAPIXEL_MB = int(os.environ.get("JOB_MEMORY_PER_MEGAPIXEL_MB", 400))
+JOB_MEMORY_PER_MINUTE_MB = int(os.environ.get("JOB_MEMORY_PER_MINUTE_MB", 20))
+# CPU cores a job keeps busy per megapixel of frame (at least one)
+JOB_CPU_PER_MEGAPIXEL = float(os.environ.get("JOB_CPU_PER_MEGAPIXEL", "1.5"))
+
+# Assumed when a video can't be probed
+FALLBACK_DURATION = 120.0
+FALLBACK_WIDTH = 1920
+FALLBACK_HEIGHT = 1080
+# Processing factors are measured on 1080p; other sizes scale with their pixel count
+REFERENCE_MEGAPIXELS = 1920 * 1080 / 1e6
+
+# The scheduler and entry of the job running on the current thread
+_current = threading.local()
+
+
+def estimate_job_resources(video_path, processing_factor=1.5):
+    """Estimate the memory, CPU and run time a job on video_path needs.
+
+    Probes the duration and frame size: memory and cores grow with the
+    frame size, run time with duration x resolution.
+    """
+    try:
+        duration = probe_media(video_path)["duration"] or FALLBACK_DURATION
+        stream = probe_video_stream(video_path)
+        width = int(stream.get("width") or FALLBACK_WIDTH)
+        height = int(stream.get("height") or FALLBACK_HEIGHT)
+    except Exception as e:
+        print(f"Error probing {video_path} for the job estimate: {e}")
+        duration, width, height = FALLBACK_DURATION, FALLBACK_WIDTH, FALLBACK_HEIGHT
+
+    megapixels = width * height / 1e6
+    return {
+        "duration": round(duration, 3),
+        "width": width,
+        "height": height,
+        "memory_mb": int(
+            JOB_MEMORY_BASE_MB + JOB_MEMORY_PER_MEGAPIXEL_MB * megapixels + JOB_MEMORY_PER_MINUTE_MB * duration / 60
+        ),
+        "cpu": round(max(1.0, JOB_CPU_PER_MEGAPIXEL * megapixels), 2),
+        "expected_seconds": round(
+            max(30.0, duration * processing_factor * max(0.25, megapixels / REFERENCE_MEGAPIXELS)), 1
+        ),
+    }
+
+
+class _QueuedJob:
+    def __init__(self, job_id, priority, resources, sequence):
+        self.job_id = job_id
+        self.priority = priority
+        self.memory_mb = resources.get("memory_mb", JOB_MEMORY_BASE_MB)
+        self.cpu = resources.get("cpu", 1.0)
+        self.expected_seconds = resources.get("expected_seconds", 0)
+        self.sort_key = (PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY]), sequence)
+        self.started_at = None
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+
+class JobScheduler:
+    """Runs at most `workers` jobs at a time with admission control.
+
+    Queued jobs are ordered by priority, then submission order. The head of
+    the queue starts once a worker slot is free and its memory and CPU
+    estimate fit in what running jobs leave of the budgets; it is never
+    overtaken, so large jobs aren't starved by small ones. A job waiting on
+    a remote service can give its slot back (see slot_released) and is
+    re-admitted ahead of the queue; its thread stays alive, so new jobs
+    only start while fewer than workers + max_suspended jobs (one thread
+    each) are alive. The queue itself is not written
+    anywhere: queued jobs are persisted with the job data and resubmitted
+    in order on startup.
+    """
+
+    def __init__(self, run_job, workers=None, memory_budget_mb=None, cpu_budget=None, max_suspended=None):
+        self.run_job = run_job
+        self.workers = workers or JOB_WORKERS
+        self.max_suspended = JOB_MAX_SUSPENDED if max_suspended is None else max_suspended
+        self.memory_budget_mb = memory_budget_mb or JOB_MEMORY_BUDGET_MB
+        self.cpu_budget = cpu_budget or JOB_CPU_BUDGET
+        self._condition = threading.Condition()
+        self._queue = []
+        self._queued = {}
+        self._running = {}
+        # Jobs that gave their slot back, and those of them waiting to be re-admitted
+        self._suspended = {}
+        self._resuming = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+
+    def start(self):
+        with self._condition:
+            if self._dispatcher:
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+            self._dispatcher.start()
+        print(
+            f"Started job scheduler: {self.workers} workers, "
+            f"{self.memory_budget_mb} MB memory and {self.cpu_budget:g} CPU budget"
+        )
+
+    def submit(self, job_id, priority=DEFAULT_PRIORITY, resources=None):
+        """Queue a job; run_job(job_id) is called once it is admitted."""
+        with self._condition:
+            if job_id in self._queued or job_id in self._running:
+                return
+            entry = _QueuedJob(job_id, priority, resources or {}, next(self._sequence))
+            # A job larger than a whole budget may still run on its own
+            entry.memory_mb = min(entry.memory_mb, self.memory_budget_mb)
+            entry.cpu = min(entry.cpu, self.cpu_budget)
+            heapq.heappush(self._queue, entry)
+            self._queued[job_id] = entry
+            self._condition.notify()
+
+    def _fits(self, entry):
+        if not self._running:
+            return True
+        if len(self._running) >= self.workers:
+            return False
+        memory = sum(running.memory_mb for running in self._running.values())
+        cpu = sum(running.cpu for running in self._running.values())
+        return memory + entry.memory_mb <= self.memory_budget_mb and cpu + entry.cpu <= self.cpu_budget
+
+    def _can_start(self, entry):
+        # Suspended jobs still have their threads: cap the threads alive
+        if len(self._running) + len(self._suspended) >= self.workers + self.max_suspended:
+            return False
+        return self._fits(entry)
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                # Resuming jobs go first; they are admitted by their own threads
+                while self._resuming or not self._queue or not self._can_start(self._queue[0]):
+                    self._condition.wait()
+                entry = heapq.heappop(self._queue)
+                del self._queued[entry.job_id]
+                entry.started_at = time.time()
+                self._running[entry.job_id] = entry
+            threading.Thread(target=self._run, args=(entry,), name=f"job-{entry.job_id}", daemon=True).start()
+
+    def _run(self, entry):
+        _current.scheduler, _current.entry = self, entry
+        try:
+            self.run_job(entry.job_id)
+        except Exception as e:
+            print(f"Error running job {entry.job_id}: {e}")
+        finally:
+            _current.scheduler = _current.entry = None
+            with self._condition:
+                self._running.pop(entry.job_id, None)
+                self._suspended.pop(entry.job_id, None)
+                self._condition.notify_all()
+
+    def _release(self, entry):
+        with self._condition:
+            del self._running[entry.job_id]
+            self._suspended[entry.job_id] = entry
+            self._condition.notify_all()
+
+    def _readmit(self, entry):
+        with self._condition:
+            heapq.heappush(self._resuming, entry)
+            while self._resuming[0] is not entry or not self._fits(entry):
+                self._condition.wait()
+            heapq.heappop(self._resuming)
+            del self._suspended[entry.job_id]
+            self._running[entry.job_id] = entry
+            self._condition.notify_all()
+
+    def queue_info(self, job_id):
+        """Queue position (1-based) and expected start of a queued job, or None.
+
+        The start is simulated from the run time estimates: running jobs end
+        when expected, and queued jobs start in order as workers and budgets
+        free up.
+        """
+        with self._condition:
+            if job_id not in self._queued:
+                return None
+            now = time.time()
+            running = [
+                (max(now, entry.started_at + entry.expected_seconds), entry.memory_mb, entry.cpu)
+                for entry in self._running.values()
+            ]
+            heapq.heapify(running)
+            clock = now
+            for position, entry in enumerate(sorted(self._queue), start=1):
+                while running and (
+                    len(running) >= self.workers
+                    or sum(memory for _, memory, _ in running) + entry.memory_mb > self.memory_budget_mb
+                    or sum(cpu for _, _, cpu in running) + entry.cpu > self.cpu_budget
+                ):
+                    clock = max(clock, heapq.heappop(running)[0])
+                if entry.job_id == job_id:
+                    return {
+                        "position": position,
+                        "queued_jobs": len(self._queue),
+                        "expected_start_seconds": round(clock - now),
+                        "expected_start_at": round(clock, 1),
+                    }
+                heapq.heappush(running, (clock + entry.expected_seconds, entry.memory_mb, entry.cpu))
+
+    def get_stats(self):
+        """Workers, budgets and what running jobs use of them."""
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "running_jobs": sorted(self._running),
+                "suspended_jobs": sorted(self._suspended),
+                "max_suspended": self.max_suspended,
+                "queued_jobs": len(self._queue),
+                "memory_budget_mb": self.memory_budget_mb,
+                "memory_reserved_mb": sum(entry.memory_mb for entry in self._running.values()),
+                "cpu_budget": self.cpu_budget,
+                "cpu_reserved": round(sum(entry.cpu for entry in self._running.values()), 2),
+            }
+
+
+@contextmanager
+def slot_released():
+    """Give the current job's worker slot and budgets back for the duration of the block.
+
+    For waits on remote work (e.g. Gemini ingesting an upload) that use no
+    local resources; afterwards the job waits to be re-admitted. Does
+    nothing outside a scheduled job's thread.
+    """
+    scheduler, entry = getattr(_current, "scheduler", None), getattr(_current, "entry", None)
+    if scheduler is None:
+        yield
+        return
+    scheduler._release(entry)
+    try:
+        yield
+    finally:
+        scheduler._readmit(entry)
@@ -0,0 +1,159 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+# Job fields kept out of the job row: large, written once, only read with the whole job
+BLOB_FIELDS = ("script_text", "segments", "analysis")
+# Seconds a write waits for another connection's transaction before failing
+BUSY_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    video_hash TEXT,
+    data TEXT NOT NULL,
+    progress TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_video_hash ON jobs (video_hash);
+CREATE TABLE IF NOT EXISTS job_blobs (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+"""
+
+
+class JobStore:
+    """Jobs persisted in SQLite (WAL mode), one row per job.
+
+    The row holds the indexed status, created_at and video_hash columns, the
+    small job fields as JSON, and the progress as its own column so progress
+    ticks are small updates. BLOB_FIELDS live in job_blobs and are only
+    rewritten when their content changes. One connection is shared by all
+    threads behind a lock; WAL keeps commits cheap and readers off writers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Digest of each blob as last written, so unchanged blobs aren't rewritten
+        self._blob_digests = {}
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def save(self, job_id, job):
+        """Write a job's row, and any of its blobs that changed."""
+        job = dict(job)
+        progress = job.pop("progress", None)
+        blobs = {}
+        for name in BLOB_FIELDS:
+            if name in job:
+                value = json.dumps(job.pop(name))
+                digest = hashlib.sha1(value.encode("utf-8")).hexdigest()
+                if self._blob_digests.get((job_id, name)) != digest:
+                    blobs[name] = (value, digest)
+
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, status, created_at, video_hash, data, progress) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        job.get("status", "queued"),
+                        job.get("created_at", 0),
+                        job.get("video_hash"),
+                        json.dumps(job),
+                        json.dumps(dict(progress)) if progress is not None else None,
+                    ),
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO job_blobs (job_id, name, value) VALUES (?, ?, ?)",
+                    [(job_id, name, value) for name, (value, _) in blobs.items()],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            for name, (_, digest) in blobs.items():
+                self._blob_digests[(job_id, name)] = digest
+
+    def save_progress(self, job_id, progress):
+        """Write only a job's progress."""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET progress = ? WHERE job_id = ?", (json.dumps(dict(progress)), job_id))
+
+    def _job(self, job_id, data, progress, blobs):
+        job = json.loads(data)
+        if progress is not None:
+            job["progress"] = json.loads(progress)
+        if blobs:
+            rows = self._db.execute("SELECT name, value FROM job_blobs WHERE job_id = ?", (job_id,)).fetchall()
+            for name, value in rows:
+                job[name] = json.loads(value)
+                self._blob_digests[(job_id, name)] = hashlib.sha1(value.encode("utf-8")).hexdigest()
+        return job
+
+    def load(self, job_id, blobs=True):
+        """Return one job, or None; blobs=False skips the large fields."""
+        with self._lock:
+            row = self._db.execute("SELECT data, progress FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return self._job(job_id, *row, blobs) if row else None
+
+    def load_by_status(self, statuses, blobs=True):
+        """Return {job_id: job} for jobs in any of statuses, oldest first."""
+        placeholders = ", ".join("?" * len(statuses))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT job_id, data, progress FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at",
+                tuple(statuses),
+            ).fetchall()
+            return {job_id: self._job(job_id, data, progress, blobs) for job_id, data, progress in rows}
+
+    def created_before(self, cutoff):
+        """Return {job_id: job} (without blobs) for jobs created before cutoff."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT job_id, data, progress FROM jobs WHERE created_at < ?", (cutoff,)
+            ).fetchall()
+            return {job_id: self._job(job_id, data, progress, False) for job_id, data, progress in rows}
+
+    def delete(self, job_ids):
+        job_ids = list(job_ids)
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+            self._db.executemany("DELETE FROM job_blobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+            self._db.execute("COMMIT")
+            for key in [key for key in self._blob_digests if key[0] in job_ids]:
+                del self._blob_digests[key]
+
+    def referenced_hashes(self):
+        """Content hashes of every stored job's video."""
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT video_hash FROM jobs WHERE video_hash IS NOT NULL").fetchall()
+            return {video_hash for (video_hash,) in rows}
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def import_json(self, json_path):
+        """Move jobs from a legacy jobs_data.json file into the store; returns how many."""
+        with open(json_path, "r") as f:
+            legacy_jobs = json.load(f)
+        for job_id, job in legacy_jobs.items():
+            job.setdefault("created_at", job.get("timestamp", 0))
+            self.save(job_id, job)
+        os.replace(json_path, json_path + ".imported")
+        return len(legacy_jobs)
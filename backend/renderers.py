@@ -0,0 +1,977 @@
+import os
+import json
+import bisect
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from segment_pool import ENCODER_THREAD_BUDGET
+
+# Render modes selectable per job
+RENDER_MODES = ("reencode", "copy", "smart", "filter", "chunked", "hls")
+# Modes handled by the ffmpeg renderers below ("reencode" uses MoviePy)
+FFMPEG_RENDER_MODES = ("copy", "smart", "filter", "chunked", "hls")
+DEFAULT_RENDER_MODE = os.environ.get("RENDER_MODE", "reencode").lower()
+
+# Largest distance (seconds) a cut may be moved back to reach a keyframe
+STREAM_COPY_MAX_DRIFT = float(os.environ.get("STREAM_COPY_MAX_DRIFT", "2.0"))
+# Cuts closer than this to a keyframe are treated as already aligned
+KEYFRAME_TOLERANCE = 0.05
+
+FFMPEG_TIMEOUT = int(os.environ.get("FFMPEG_TIMEOUT", 600))
+
+# Default encoder options when no GPU encoder settings are supplied
+DEFAULT_ENCODER_ARGS = ["-c:v", "libx264", "-preset", "medium", "-c:a", "aac"]
+# Filter graphs longer than this are passed through a script file
+MAX_INLINE_FILTER_LENGTH = 8000
+
+# Preview renders: small, low frame rate and fast to encode
+PREVIEW_HEIGHT = int(os.environ.get("PREVIEW_HEIGHT", 360))
+PREVIEW_FPS = int(os.environ.get("PREVIEW_FPS", 15))
+PREVIEW_ENCODER_ARGS = [
+    "-c:v", "libx264", "-preset", "ultrafast", "-crf", "30",
+    "-c:a", "aac", "-b:a", "64k",
+]
+
+# HLS output: fragmented MP4 segments of about this many seconds, playable while rendering
+HLS_SEGMENT_DURATION = float(os.environ.get("HLS_SEGMENT_DURATION", "6"))
+HLS_PLAYLIST_NAME = "index.m3u8"
+HLS_INIT_NAME = "init.mp4"
+
+# Time-chunked encoding: seconds of output per chunk and chunks encoded at once
+CHUNK_DURATION = float(os.environ.get("CHUNK_DURATION", "120"))
+CHUNK_ENCODE_WORKERS = int(os.environ.get("CHUNK_ENCODE_WORKERS", 4))
+
+# GOP index persisted next to each source file
+GOP_INDEX_SUFFIX = ".gop.json"
+GOP_INDEX_VERSION = 1
+
+# Encoder settings for the boundary GOPs re-encoded by smart rendering
+SMART_RENDER_PRESET = os.environ.get("SMART_RENDER_PRESET", "medium")
+SMART_RENDER_CRF = int(os.environ.get("SMART_RENDER_CRF", 18))
+SMART_RENDER_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+
+# Codecs that can be stream-copied into each output container
+STREAM_COPY_CODECS = {
+    ".mp4": {
+        "video": {"h264", "hevc", "mpeg4", "av1"},
+        "audio": {"aac", "mp3", "alac", "ac3", "opus"},
+    },
+    ".mov": {
+        "video": {"h264", "hevc", "mpeg4", "prores", "mjpeg"},
+        "audio": {"aac", "mp3", "alac", "ac3", "pcm_s16le", "pcm_s24le"},
+    },
+    ".mkv": {
+        "video": {"h264", "hevc", "mpeg4", "av1", "vp8", "vp9"},
+        "audio": {"aac", "mp3", "ac3", "opus", "vorbis", "flac", "pcm_s16le"},
+    },
+}
+
+
+class StreamCopyUnavailable(Exception):
+    """Raised when a source cannot be cut with stream copy and must be re-encoded."""
+
+
+def get_ffprobe_path(ffmpeg_path=None):
+    """Locate ffprobe, preferring the one installed next to ffmpeg."""
+    if ffmpeg_path:
+        directory, name = os.path.split(ffmpeg_path)
+        candidate = os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+        if directory and os.path.exists(candidate):
+            return candidate
+    return shutil.which("ffprobe") or "ffprobe"
+
+
+def run_ffmpeg(args, timeout=None):
+    """Run an ffmpeg/ffprobe command and return its stdout, raising on failure."""
+    if timeout is None:
+        timeout = FFMPEG_TIMEOUT
+
+    process = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise Exception(f"FFmpeg process timed out after {timeout} seconds")
+
+    if process.returncode != 0:
+        raise Exception(f"FFmpeg error: {stderr}")
+
+    return stdout
+
+
+def probe_media(video_path, ffprobe_path=None):
+    """Return the container format and stream codecs of a media file."""
+    ffprobe_path = ffprobe_path or get_ffprobe_path()
+    output = run_ffmpeg(
+        [
+            ffprobe_path,
+            "-v", "error",
+            "-show_entries", "format=format_name,duration:stream=codec_type,codec_name",
+            "-of", "json",
+            video_path,
+        ]
+    )
+    data = json.loads(output or "{}")
+
+    info = {
+        "format_name": data.get("format", {}).get("format_name", ""),
+        "duration": float(data.get("format", {}).get("duration", 0) or 0),
+        "video_codecs": [],
+        "audio_codecs": [],
+    }
+    for stream in data.get("streams", []):
+        if stream.get("codec_type") == "video":
+            info["video_codecs"].append(stream.get("codec_name"))
+        elif stream.get("codec_type") == "audio":
+            info["audio_codecs"].append(stream.get("codec_name"))
+
+    return info
+
+
+def check_stream_copy_support(media_info, output_path):
+    """Raise StreamCopyUnavailable unless the streams fit the output container."""
+    output_ext = os.path.splitext(output_path)[1].lower()
+    supported = STREAM_COPY_CODECS.get(output_ext)
+    if supported is None:
+        raise StreamCopyUnavailable(f"Container {output_ext or '(none)'} is not supported for stream copy")
+
+    if not media_info["video_codecs"]:
+        raise StreamCopyUnavailable("Source has no video stream")
+
+    # Only the first video stream is mapped; all audio streams are copied
+    video_codec = media_info["video_codecs"][0]
+    if video_codec not in supported["video"]:
+        raise StreamCopyUnavailable(f"Video codec {video_codec} cannot be stream-copied into {output_ext}")
+
+    for audio_codec in media_info["audio_codecs"]:
+        if audio_codec not in supported["audio"]:
+            raise StreamCopyUnavailable(f"Audio codec {audio_codec} cannot be stream-copied into {output_ext}")
+
+
+def get_keyframe_times(video_path, ffprobe_path=None):
+    """Return the sorted presentation times of keyframes in the first video stream.
+
+    Reads packet flags only, so nothing is decoded.
+    """
+    ffprobe_path = ffprobe_path or get_ffprobe_path()
+    output = run_ffmpeg(
+        [
+            ffprobe_path,
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            video_path,
+        ]
+    )
+
+    keyframes = []
+    for line in output.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            keyframes.append(float(parts[0]))
+        except ValueError:
+            continue
+
+    keyframes.sort()
+    return keyframes
+
+
+def probe_video_stream(video_path, ffprobe_path=None):
+    """Return the codec parameters of the first video stream."""
+    ffprobe_path = ffprobe_path or get_ffprobe_path()
+    output = run_ffmpeg(
+        [
+            ffprobe_path,
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries",
+            "stream=codec_name,profile,level,pix_fmt,width,height,avg_frame_rate,time_base",
+            "-of", "json",
+            video_path,
+        ]
+    )
+    streams = json.loads(output or "{}").get("streams", [])
+    return streams[0] if streams else {}
+
+
+def gop_index_path(video_path):
+    """Path of the persisted GOP index for a source file."""
+    return video_path + GOP_INDEX_SUFFIX
+
+
+def get_gop_index(video_path, ffprobe_path=None):
+    """Return the keyframe/GOP index of a source, building it on first use.
+
+    The index is saved next to the source and reused for as long as the
+    file's size and modification time are unchanged, so repeated renders of
+    the same upload don't re-scan its packets.
+    """
+    stat = os.stat(video_path)
+    index_path = gop_index_path(video_path)
+
+    try:
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        if (
+            index.get("version") == GOP_INDEX_VERSION
+            and index.get("size") == stat.st_size
+            and index.get("mtime") == stat.st_mtime
+        ):
+            return index
+    except (OSError, ValueError):
+        pass
+
+    ffprobe_path = ffprobe_path or get_ffprobe_path()
+    index = {
+        "version": GOP_INDEX_VERSION,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "media": probe_media(video_path, ffprobe_path),
+        "video": probe_video_stream(video_path, ffprobe_path),
+        "keyframes": get_keyframe_times(video_path, ffprobe_path),
+    }
+
+    # Write to a temporary file first, then rename (atomic operation)
+    try:
+        temp_file = index_path + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_file, index_path)
+        print(f"Saved GOP index with {len(index['keyframes'])} keyframes to {index_path}")
+    except OSError as e:
+        print(f"Error saving GOP index: {e}")
+
+    return index
+
+
+def plan_stream_copy_cuts(ranges, keyframes, allow_keyframe_snap=True, max_drift=None):
+    """Map requested (start, end) ranges onto keyframe-aligned cuts.
+
+    Each start is moved back to the nearest keyframe at or before it, since a
+    stream copy can only begin on a keyframe. Returns one dict per cut with
+    the requested and actual start and the drift in seconds. A start snapped
+    back before the previous cut's end would play that footage twice: the
+    range is merged into the previous cut when the two touch (nothing the
+    edit removed comes back), otherwise StreamCopyUnavailable is raised.
+    """
+    if max_drift is None:
+        max_drift = STREAM_COPY_MAX_DRIFT
+
+    if not keyframes:
+        raise StreamCopyUnavailable("No keyframes found in source")
+
+    cuts = []
+    for start, end in ranges:
+        index = bisect.bisect_right(keyframes, start + KEYFRAME_TOLERANCE) - 1
+        keyframe = keyframes[index] if index >= 0 else keyframes[0]
+        drift = max(0.0, start - keyframe)
+
+        if drift > KEYFRAME_TOLERANCE:
+            if not allow_keyframe_snap:
+                raise StreamCopyUnavailable(
+                    f"Cut at {start:.3f}s is not on a keyframe and snapping is disabled"
+                )
+            if drift > max_drift:
+                raise StreamCopyUnavailable(
+                    f"Cut at {start:.3f}s would drift {drift:.3f}s to reach a keyframe (limit {max_drift}s)"
+                )
+        else:
+            drift = 0.0
+
+        cut_start = keyframe if drift else start
+        if cuts and cut_start < cuts[-1]["end"]:
+            removed = start - cuts[-1]["end"]
+            if removed > KEYFRAME_TOLERANCE:
+                raise StreamCopyUnavailable(
+                    f"Cut at {start:.3f}s would snap back into the previous cut and "
+                    f"restore {removed:.3f}s the edit removed"
+                )
+            cuts[-1]["end"] = max(cuts[-1]["end"], end)
+            cuts[-1]["merged"] = cuts[-1].get("merged", 0) + 1
+            continue
+
+        cuts.append(
+            {
+                "requested_start": start,
+                "start": cut_start,
+                "end": end,
+                "drift": round(drift, 3),
+            }
+        )
+
+    return cuts
+
+
+def _escape_concat_path(path):
+    return os.path.abspath(path).replace("'", "'\\''")
+
+
+def render_stream_copy(
+    video_path,
+    ranges,
+    output_path,
+    ffmpeg_path=None,
+    allow_keyframe_snap=True,
+    max_drift=None,
+    workdir=None,
+):
+    """Cut and join ranges of a video with ffmpeg stream copy (no re-encoding).
+
+    Uses the concat demuxer with inpoint/outpoint directives so the whole edit
+    is one ffmpeg run without intermediate files. Raises StreamCopyUnavailable
+    when the source cannot be copied; callers should then re-encode.
+
+    Returns a report with the cuts made and how far each one drifted.
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    ffprobe_path = get_ffprobe_path(ffmpeg_path)
+
+    index = get_gop_index(video_path, ffprobe_path)
+    check_stream_copy_support(index["media"], output_path)
+
+    cuts = plan_stream_copy_cuts(ranges, index["keyframes"], allow_keyframe_snap, max_drift)
+
+    workdir = workdir or os.path.dirname(output_path) or "."
+    list_fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="concat_", dir=workdir)
+
+    try:
+        source = _escape_concat_path(video_path)
+        with os.fdopen(list_fd, "w") as f:
+            for cut in cuts:
+                f.write(f"file '{source}'\n")
+                f.write(f"inpoint {cut['start']:.6f}\n")
+                f.write(f"outpoint {cut['end']:.6f}\n")
+
+        args = [
+            ffmpeg_path, "-y",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-map", "0:v:0", "-map", "0:a?",
+            "-c", "copy",
+            "-avoid_negative_ts", "make_zero",
+        ]
+        if os.path.splitext(output_path)[1].lower() in (".mp4", ".mov"):
+            args.extend(["-movflags", "+faststart"])
+        args.append(output_path)
+
+        print(f"Running FFmpeg stream copy: {' '.join(args)}")
+        run_ffmpeg(args)
+    finally:
+        try:
+            os.remove(list_path)
+        except OSError:
+            pass
+
+    drifts = [cut["drift"] for cut in cuts]
+    return {
+        "mode": "copy",
+        "cuts": cuts,
+        "max_drift": max(drifts) if drifts else 0.0,
+        "total_drift": round(sum(drifts), 3),
+        "duration": sum(cut["end"] - cut["start"] for cut in cuts),
+    }
+
+
+def plan_smart_render_pieces(ranges, keyframes):
+    """Split each (start, end) range into re-encoded and stream-copied pieces.
+
+    The partial GOP before the first keyframe inside a range (head) and the
+    partial GOP after the last one (tail) are re-encoded; everything between
+    them is copied. Ranges that contain fewer than two keyframes are
+    re-encoded whole. Copy pieces always start on a keyframe: a head within
+    KEYFRAME_TOLERANCE of it is dropped (or a keyframe just before the start
+    included) rather than encoded, since it's shorter than about a frame.
+    """
+    pieces = []
+    for start, end in ranges:
+        first = bisect.bisect_left(keyframes, start - KEYFRAME_TOLERANCE)
+        last = bisect.bisect_right(keyframes, end + KEYFRAME_TOLERANCE) - 1
+
+        if first >= len(keyframes) or last < 0 or keyframes[last] - keyframes[first] <= KEYFRAME_TOLERANCE:
+            pieces.append({"kind": "encode", "start": start, "end": end})
+            continue
+
+        copy_start = keyframes[first]
+        copy_end = keyframes[last]
+
+        if copy_start - start > KEYFRAME_TOLERANCE:
+            pieces.append({"kind": "encode", "start": start, "end": copy_start})
+
+        if end - copy_end > KEYFRAME_TOLERANCE:
+            pieces.append({"kind": "copy", "start": copy_start, "end": copy_end})
+            pieces.append({"kind": "encode", "start": copy_end, "end": end})
+        else:
+            pieces.append({"kind": "copy", "start": copy_start, "end": end})
+
+    return pieces
+
+
+def covered_ranges(pieces):
+    """The (start, end) source ranges the pieces cover, joining contiguous pieces."""
+    covered = []
+    for piece in pieces:
+        if covered and abs(piece["start"] - covered[-1][1]) < 1e-6:
+            covered[-1] = (covered[-1][0], piece["end"])
+        else:
+            covered.append((piece["start"], piece["end"]))
+    return covered
+
+
+def _smart_encoder_args(video_info):
+    """Encoder arguments that reproduce the source's codec parameters."""
+    codec_name = video_info.get("codec_name")
+    encoder = SMART_RENDER_ENCODERS[codec_name]
+    args = [
+        "-c:v", encoder,
+        "-preset", SMART_RENDER_PRESET,
+        "-crf", str(SMART_RENDER_CRF),
+    ]
+
+    if video_info.get("pix_fmt"):
+        args.extend(["-pix_fmt", video_info["pix_fmt"]])
+    if video_info.get("avg_frame_rate") and video_info["avg_frame_rate"] != "0/0":
+        args.extend(["-r", video_info["avg_frame_rate"]])
+
+    # Map ffprobe profile names ("High", "Constrained Baseline", "Main 10") to encoder names
+    profile = (video_info.get("profile") or "").lower()
+    profile = profile.replace("constrained ", "").replace("4:2:2", "422").replace("4:4:4", "444")
+    profile = profile.split(" predictive")[0].replace(" ", "")
+    if profile:
+        args.extend(["-profile:v", profile])
+
+    if codec_name == "h264":
+        if video_info.get("level"):
+            args.extend(["-level", f"{int(video_info['level']) / 10:.1f}"])
+        # Repeat SPS/PPS in-band so the decoder picks up the re-encoded parameters
+        args.extend(["-x264-params", "repeat-headers=1"])
+    else:
+        args.extend(["-x265-params", "repeat-headers=1"])
+
+    return args
+
+
+def join_video_pieces(ffmpeg_path, list_path, video_path, ranges, output_path, has_audio=True):
+    """Join video-only pieces listed in a concat file and add the edit's audio.
+
+    The list file must live in a scratch directory owned by the caller.
+    Video is stream-copied from the pieces. Audio is trimmed from the source
+    for all ranges and encoded once in this step, so there are no AAC
+    priming gaps at the piece boundaries.
+    """
+    args = [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+    if has_audio:
+        filters = [
+            f"[1:a:0]atrim=start={start:.6f}:end={end:.6f},asetpts=PTS-STARTPTS[a{i}]"
+            for i, (start, end) in enumerate(ranges)
+        ]
+        labels = "".join(f"[a{i}]" for i in range(len(ranges)))
+        filters.append(f"{labels}concat=n={len(ranges)}:v=0:a=1[aout]")
+        filter_graph = ";".join(filters)
+
+        args.extend(["-i", video_path])
+        if len(filter_graph) > MAX_INLINE_FILTER_LENGTH:
+            script_path = os.path.join(os.path.dirname(list_path), "audio_filter.txt")
+            with open(script_path, "w") as f:
+                f.write(filter_graph)
+            args.extend(["-filter_complex_script", script_path])
+        else:
+            args.extend(["-filter_complex", filter_graph])
+        args.extend(["-map", "0:v:0", "-map", "[aout]", "-c:a", "aac"])
+    else:
+        args.extend(["-map", "0:v:0"])
+    args.extend(["-c:v", "copy"])
+    if os.path.splitext(output_path)[1].lower() in (".mp4", ".mov"):
+        args.extend(["-movflags", "+faststart"])
+    args.append(output_path)
+
+    run_ffmpeg(args)
+
+
+def render_smart(video_path, ranges, output_path, ffmpeg_path=None, workdir=None):
+    """Frame-accurate render that only re-encodes the GOPs at segment boundaries.
+
+    Head and tail partial GOPs are encoded with parameters matching the
+    source, interiors are stream-copied, and the pieces are joined through
+    MPEG-TS intermediates. Audio is trimmed and re-encoded in the final mux,
+    which is cheap compared to video. Raises StreamCopyUnavailable for
+    sources whose codec can't be matched; callers should then re-encode.
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    ffprobe_path = get_ffprobe_path(ffmpeg_path)
+
+    index = get_gop_index(video_path, ffprobe_path)
+    video_info = index["video"]
+    if video_info.get("codec_name") not in SMART_RENDER_ENCODERS:
+        raise StreamCopyUnavailable(
+            f"Smart rendering does not support video codec {video_info.get('codec_name')}"
+        )
+    check_stream_copy_support(index["media"], output_path)
+
+    pieces = plan_smart_render_pieces(ranges, index["keyframes"])
+    encoder_args = _smart_encoder_args(video_info)
+
+    workdir = workdir or os.path.dirname(output_path) or "."
+    temp_dir = tempfile.mkdtemp(prefix="smart_", dir=workdir)
+
+    try:
+        list_path = os.path.join(temp_dir, "file_list.txt")
+        with open(list_path, "w") as list_file:
+            for i, piece in enumerate(pieces):
+                piece_path = os.path.join(temp_dir, f"piece_{i:04d}.ts")
+                args = [
+                    ffmpeg_path, "-y",
+                    "-ss", f"{piece['start']:.6f}",
+                    "-i", video_path,
+                    "-t", f"{piece['end'] - piece['start']:.6f}",
+                    "-map", "0:v:0", "-an",
+                ]
+                if piece["kind"] == "copy":
+                    args.extend(["-c:v", "copy"])
+                else:
+                    args.extend(encoder_args)
+                args.extend(["-f", "mpegts", piece_path])
+
+                run_ffmpeg(args)
+                list_file.write(f"file '{_escape_concat_path(piece_path)}'\n")
+
+        print(f"Joining {len(pieces)} smart render pieces into {output_path}")
+        join_video_pieces(
+            ffmpeg_path,
+            list_path,
+            video_path,
+            # Audio follows the video pieces, which may start a frame off the requested ranges
+            covered_ranges(pieces),
+            output_path,
+            has_audio=bool(index["media"]["audio_codecs"]),
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    encoded = sum(p["end"] - p["start"] for p in pieces if p["kind"] == "encode")
+    copied = sum(p["end"] - p["start"] for p in pieces if p["kind"] == "copy")
+    return {
+        "mode": "smart",
+        "pieces": len(pieces),
+        "encoded_seconds": round(encoded, 3),
+        "copied_seconds": round(copied, 3),
+        "duration": encoded + copied,
+    }
+
+
+def build_trim_concat_filter(ranges, has_audio=True):
+    """Build a filter graph that trims each range and concatenates the results."""
+    filters = []
+    labels = []
+    for i, (start, end) in enumerate(ranges):
+        filters.append(f"[0:v:0]trim=start={start:.6f}:end={end:.6f},setpts=PTS-STARTPTS[v{i}]")
+        labels.append(f"[v{i}]")
+        if has_audio:
+            filters.append(f"[0:a:0]atrim=start={start:.6f}:end={end:.6f},asetpts=PTS-STARTPTS[a{i}]")
+            labels.append(f"[a{i}]")
+
+    outputs = "[outv][outa]" if has_audio else "[outv]"
+    filters.append(f"{''.join(labels)}concat=n={len(ranges)}:v=1:a={1 if has_audio else 0}{outputs}")
+    return ";".join(filters)
+
+
+def _filter_encoder_args(encoder_args):
+    """Return (input_args, output_args) usable with software filters."""
+    input_args, output_args = encoder_args or ([], DEFAULT_ENCODER_ARGS)
+    # Filters run on system memory frames, so drop any hardware decoding options
+    filtered_input_args = []
+    args = iter(input_args)
+    for arg in args:
+        if arg.startswith("-hwaccel"):
+            next(args, None)
+            continue
+        filtered_input_args.append(arg)
+    return filtered_input_args, list(output_args)
+
+
+def render_filter_complex(
+    video_path,
+    ranges,
+    output_path,
+    ffmpeg_path=None,
+    encoder_args=None,
+    workdir=None,
+    video_filter=None,
+    muxer_args=None,
+):
+    """Decode, cut and encode the whole edit in a single ffmpeg process.
+
+    The ranges become trim/atrim + concat filters, so no frames pass through
+    Python. encoder_args is an (input_args, output_args) pair as returned by
+    gpu_utils.get_ffmpeg_encoder_args; libx264 is used when it is omitted.
+    video_filter is an optional filter chain applied to the joined video and
+    muxer_args replace the default container options.
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    ffprobe_path = get_ffprobe_path(ffmpeg_path)
+
+    input_args, output_args = _filter_encoder_args(encoder_args)
+
+    has_audio = bool(probe_media(video_path, ffprobe_path)["audio_codecs"])
+    filter_graph = build_trim_concat_filter(ranges, has_audio)
+    video_output = "[outv]"
+    if video_filter:
+        filter_graph += f";[outv]{video_filter}[outvf]"
+        video_output = "[outvf]"
+
+    script_path = None
+    args = [ffmpeg_path, "-y"] + input_args + ["-i", video_path]
+    try:
+        if len(filter_graph) > MAX_INLINE_FILTER_LENGTH:
+            workdir = workdir or os.path.dirname(output_path) or "."
+            script_fd, script_path = tempfile.mkstemp(suffix=".txt", prefix="filter_", dir=workdir)
+            with os.fdopen(script_fd, "w") as f:
+                f.write(filter_graph)
+            args.extend(["-filter_complex_script", script_path])
+        else:
+            args.extend(["-filter_complex", filter_graph])
+
+        args.extend(["-map", video_output])
+        if has_audio:
+            args.extend(["-map", "[outa]"])
+        args.extend(output_args)
+        if muxer_args is not None:
+            args.extend(muxer_args)
+        elif os.path.splitext(output_path)[1].lower() in (".mp4", ".mov"):
+            args.extend(["-movflags", "+faststart"])
+        args.append(output_path)
+
+        print(f"Running FFmpeg filter_complex render with {len(ranges)} segments")
+        run_ffmpeg(args)
+    finally:
+        if script_path:
+            try:
+                os.remove(script_path)
+            except OSError:
+                pass
+
+    return {
+        "mode": "filter",
+        "segments": len(ranges),
+        "encoder": output_args[output_args.index("-c:v") + 1] if "-c:v" in output_args else None,
+        "duration": sum(end - start for start, end in ranges),
+    }
+
+
+def render_preview(video_path, ranges, output_path, ffmpeg_path=None, workdir=None):
+    """Render a cheap low-resolution preview of the edit.
+
+    Same edit list as the full render, scaled to PREVIEW_HEIGHT at
+    PREVIEW_FPS with the ultrafast preset, in a single ffmpeg pass.
+    """
+    report = render_filter_complex(
+        video_path,
+        ranges,
+        output_path,
+        ffmpeg_path=ffmpeg_path,
+        encoder_args=([], PREVIEW_ENCODER_ARGS),
+        workdir=workdir,
+        video_filter=f"scale=-2:{PREVIEW_HEIGHT},fps={PREVIEW_FPS}",
+    )
+    report["mode"] = "preview"
+    return report
+
+
+def hls_stream_dir(output_path):
+    """Default directory for the HLS rendition of output_path."""
+    return os.path.splitext(output_path)[0] + "_hls"
+
+
+def render_hls(
+    video_path,
+    ranges,
+    output_path,
+    ffmpeg_path=None,
+    encoder_args=None,
+    workdir=None,
+    stream_dir=None,
+):
+    """Render the edit as an HLS event playlist of fragmented MP4 segments.
+
+    ffmpeg updates the playlist after every segment, so the part already
+    encoded can be played from stream_dir while the tail is still rendering.
+    Keyframes are forced on segment boundaries. Once done, the segments are
+    remuxed (stream copy) into a faststart MP4 at output_path for download.
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    stream_dir = stream_dir or hls_stream_dir(output_path)
+
+    # Never mix segments from an earlier render into the new playlist
+    shutil.rmtree(stream_dir, ignore_errors=True)
+    os.makedirs(stream_dir)
+    playlist_path = os.path.join(stream_dir, HLS_PLAYLIST_NAME)
+
+    input_args, output_args = _filter_encoder_args(encoder_args)
+    output_args += ["-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_DURATION})"]
+    muxer_args = [
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_DURATION),
+        "-hls_list_size", "0",
+        "-hls_playlist_type", "event",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", HLS_INIT_NAME,
+        "-hls_segment_filename", os.path.join(stream_dir, "segment_%05d.m4s"),
+        # Write the playlist to a temp file and rename it, so readers never see a partial one
+        "-hls_flags", "independent_segments+temp_file",
+    ]
+
+    report = render_filter_complex(
+        video_path,
+        ranges,
+        playlist_path,
+        ffmpeg_path=ffmpeg_path,
+        encoder_args=(input_args, output_args),
+        workdir=workdir,
+        muxer_args=muxer_args,
+    )
+
+    run_ffmpeg([
+        ffmpeg_path, "-y",
+        "-i", playlist_path,
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path,
+    ])
+
+    report.update({
+        "mode": "hls",
+        "stream_segments": len([name for name in os.listdir(stream_dir) if name.endswith(".m4s")]),
+    })
+    return report
+
+
+def plan_timeline_chunks(ranges, chunk_duration, keyframes=None):
+    """Group the edit's (start, end) ranges into chunks of about chunk_duration output seconds.
+
+    Chunks end on segment boundaries where possible. A segment is only split
+    when the chunk would otherwise be less than half full, and then at the
+    first keyframe past the target (when keyframes are given) so each chunk's
+    input seek lands on a keyframe. Returns a list of range lists.
+    """
+    chunks = []
+    current = []
+    current_length = 0.0
+
+    for start, end in ranges:
+        while True:
+            room = chunk_duration - current_length
+            if end - start <= room + KEYFRAME_TOLERANCE:
+                current.append((start, end))
+                current_length += end - start
+                break
+
+            # Prefer closing the chunk at this segment boundary
+            if current_length >= chunk_duration / 2:
+                chunks.append(current)
+                current, current_length = [], 0.0
+                continue
+
+            split = start + room
+            if keyframes:
+                index = bisect.bisect_left(keyframes, split)
+                split = keyframes[index] if index < len(keyframes) else end
+
+            if split >= end - KEYFRAME_TOLERANCE:
+                current.append((start, end))
+                current_length += end - start
+                break
+
+            current.append((start, split))
+            chunks.append(current)
+            current, current_length = [], 0.0
+            start = split
+
+        if current_length >= chunk_duration - KEYFRAME_TOLERANCE:
+            chunks.append(current)
+            current, current_length = [], 0.0
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def _encode_chunk(ffmpeg_path, video_path, chunk_ranges, chunk_path, input_args, output_args, threads):
+    """Encode the video of one chunk, seeking straight to its first frame."""
+    base = chunk_ranges[0][0]
+    span = chunk_ranges[-1][1] - base
+    relative = [(start - base, end - base) for start, end in chunk_ranges]
+
+    args = [ffmpeg_path, "-y"] + input_args + [
+        "-ss", f"{base:.6f}",
+        "-t", f"{span:.6f}",
+        "-i", video_path,
+        "-filter_complex", build_trim_concat_filter(relative, has_audio=False),
+        "-map", "[outv]", "-an",
+    ]
+    args.extend(output_args)
+    args.extend(["-threads", str(threads), "-f", "mpegts", chunk_path])
+
+    run_ffmpeg(args)
+    return chunk_path
+
+
+def render_chunked(
+    video_path,
+    ranges,
+    output_path,
+    ffmpeg_path=None,
+    encoder_args=None,
+    chunk_duration=None,
+    workers=None,
+    workdir=None,
+):
+    """Encode the edit as fixed-duration chunks in parallel ffmpeg processes.
+
+    Each chunk's video is encoded by its own ffmpeg process with the same
+    encoder settings, then the chunks are joined with the concat demuxer
+    and the audio for the whole edit is encoded once, so there are no seams
+    at chunk boundaries. Short edits that fit in one chunk are rendered in a
+    single filter_complex pass.
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    ffprobe_path = get_ffprobe_path(ffmpeg_path)
+    chunk_duration = chunk_duration or CHUNK_DURATION
+    workers = max(1, workers or CHUNK_ENCODE_WORKERS)
+
+    index = get_gop_index(video_path, ffprobe_path)
+    chunks = plan_timeline_chunks(ranges, chunk_duration, index["keyframes"])
+    if len(chunks) <= 1:
+        return render_filter_complex(
+            video_path,
+            ranges,
+            output_path,
+            ffmpeg_path=ffmpeg_path,
+            encoder_args=encoder_args,
+            workdir=workdir,
+        )
+
+    input_args, output_args = _filter_encoder_args(encoder_args)
+    workers = min(workers, len(chunks))
+    threads = max(1, ENCODER_THREAD_BUDGET // workers)
+
+    workdir = workdir or os.path.dirname(output_path) or "."
+    temp_dir = tempfile.mkdtemp(prefix="chunks_", dir=workdir)
+
+    try:
+        print(f"Encoding {len(chunks)} chunks of ~{chunk_duration}s with {workers} parallel encoders")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _encode_chunk,
+                    ffmpeg_path,
+                    video_path,
+                    chunk_ranges,
+                    os.path.join(temp_dir, f"chunk_{i:04d}.ts"),
+                    input_args,
+                    output_args,
+                    threads,
+                )
+                for i, chunk_ranges in enumerate(chunks)
+            ]
+            # Collect in submission order so the chunks stay in timeline order
+            chunk_files = [future.result() for future in futures]
+
+        list_path = os.path.join(temp_dir, "file_list.txt")
+        with open(list_path, "w") as f:
+            for chunk_path in chunk_files:
+                f.write(f"file '{_escape_concat_path(chunk_path)}'\n")
+
+        # The audio trims must follow the same ranges, including any splits
+        chunk_ranges = [r for chunk in chunks for r in chunk]
+        join_video_pieces(
+            ffmpeg_path,
+            list_path,
+            video_path,
+            chunk_ranges,
+            output_path,
+            has_audio=bool(index["media"]["audio_codecs"]),
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {
+        "mode": "chunked",
+        "chunks": len(chunks),
+        "workers": workers,
+        "encoder": output_args[output_args.index("-c:v") + 1] if "-c:v" in output_args else None,
+        "duration": sum(end - start for start, end in ranges),
+    }
+
+
+def render_edit(
+    render_mode,
+    video_path,
+    ranges,
+    output_path,
+    ffmpeg_path=None,
+    allow_keyframe_snap=True,
+    encoder_args=None,
+    workdir=None,
+    stream_dir=None,
+):
+    """Common entry point for the ffmpeg renderers.
+
+    Renders the (start, end) ranges of video_path into output_path with the
+    given mode and returns the renderer's report, which always includes
+    "mode" and "duration". Intermediate files go under workdir (the output
+    directory by default); "hls" writes its playlist and segments to
+    stream_dir. Raises StreamCopyUnavailable when the mode can't handle
+    this source.
+    """
+    if render_mode == "copy":
+        return render_stream_copy(
+            video_path,
+            ranges,
+            output_path,
+            ffmpeg_path=ffmpeg_path,
+            allow_keyframe_snap=allow_keyframe_snap,
+            workdir=workdir,
+        )
+    if render_mode == "smart":
+        return render_smart(video_path, ranges, output_path, ffmpeg_path=ffmpeg_path, workdir=workdir)
+    if render_mode == "filter":
+        return render_filter_complex(
+            video_path,
+            ranges,
+            output_path,
+            ffmpeg_path=ffmpeg_path,
+            encoder_args=encoder_args,
+            workdir=workdir,
+        )
+    if render_mode == "chunked":
+        return render_chunked(
+            video_path,
+            ranges,
+            output_path,
+            ffmpeg_path=ffmpeg_path,
+            encoder_args=encoder_args,
+            workdir=workdir,
+        )
+    if render_mode == "hls":
+        return render_hls(
+            video_path,
+            ranges,
+            output_path,
+            ffmpeg_path=ffmpeg_path,
+            encoder_args=encoder_args,
+            workdir=workdir,
+            stream_dir=stream_dir,
+        )
+    raise ValueError(f"Unknown render mode: {render_mode}")
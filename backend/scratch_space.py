@@ -0,0 +1,150 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# RAM-backed directory preferred for intermediates when they fit
+SCRATCH_RAM_DIR = os.environ.get("SCRATCH_RAM_DIR", "/dev/shm")
+# Disk directory used when intermediates don't fit in RAM
+SCRATCH_DISK_DIR = os.environ.get("SCRATCH_DISK_DIR", os.path.join(BASE_DIR, "scratch"))
+# Bytes of RAM-backed scratch space all jobs together may reserve
+SCRATCH_RAM_BUDGET = int(os.environ.get("SCRATCH_RAM_BUDGET", 2 * 1024 * 1024 * 1024))
+# Bytes of scratch space (RAM + disk) all jobs together may reserve
+SCRATCH_TOTAL_BUDGET = int(os.environ.get("SCRATCH_TOTAL_BUDGET", 20 * 1024 * 1024 * 1024))
+# Seconds a job waits for scratch space before failing
+SCRATCH_WAIT_TIMEOUT = int(os.environ.get("SCRATCH_WAIT_TIMEOUT", 1800))
+# Never fill more than this fraction of the free space on the RAM-backed filesystem
+SCRATCH_RAM_FREE_FRACTION = 0.5
+
+_condition = threading.Condition()
+_reserved_bytes = 0
+_ram_reserved_bytes = 0
+_active_workspaces = {}
+
+
+def estimate_scratch_bytes(video_path, kept_fraction=1.0):
+    """Estimate the intermediate bytes a render of video_path will need.
+
+    Intermediates (segment files, chunks, temp audio) are about the size of
+    the kept part of the source; a margin covers container overhead.
+    """
+    try:
+        source_bytes = os.path.getsize(video_path)
+    except OSError:
+        return 0
+    return int(source_bytes * max(0.0, min(1.0, kept_fraction)) * 1.2) + 16 * 1024 * 1024
+
+
+def _ram_available(estimated_bytes):
+    if not SCRATCH_RAM_DIR or not os.path.isdir(SCRATCH_RAM_DIR):
+        return False
+    if _ram_reserved_bytes + estimated_bytes > SCRATCH_RAM_BUDGET:
+        return False
+    try:
+        free_bytes = shutil.disk_usage(SCRATCH_RAM_DIR).free
+    except OSError:
+        return False
+    return estimated_bytes <= free_bytes * SCRATCH_RAM_FREE_FRACTION
+
+
+def get_scratch_stats():
+    """Current scratch space reservations across all jobs."""
+    with _condition:
+        return {
+            "reserved_bytes": _reserved_bytes,
+            "ram_reserved_bytes": _ram_reserved_bytes,
+            "total_budget": SCRATCH_TOTAL_BUDGET,
+            "ram_budget": SCRATCH_RAM_BUDGET,
+            "active_workspaces": len(_active_workspaces),
+        }
+
+
+class JobWorkspace:
+    """A private scratch directory for one job's intermediate files.
+
+    Reserves estimated_bytes from the global budget (waiting while other jobs
+    hold it), places the directory on SCRATCH_RAM_DIR when the estimate fits
+    and on SCRATCH_DISK_DIR otherwise, and removes everything on close.
+    Use as a context manager.
+    """
+
+    def __init__(self, job_id=None, estimated_bytes=0):
+        self.job_id = job_id or "adhoc"
+        # A job larger than the whole budget may still run on its own
+        self.reserved_bytes = min(max(0, int(estimated_bytes)), SCRATCH_TOTAL_BUDGET)
+        self.path = None
+        self.on_ram = False
+
+    def open(self):
+        global _reserved_bytes, _ram_reserved_bytes
+
+        deadline = time.time() + SCRATCH_WAIT_TIMEOUT
+        with _condition:
+            while _reserved_bytes + self.reserved_bytes > SCRATCH_TOTAL_BUDGET:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception(
+                        f"Timed out waiting for {self.reserved_bytes} bytes of scratch space"
+                    )
+                _condition.wait(remaining)
+
+            self.on_ram = _ram_available(self.reserved_bytes)
+            _reserved_bytes += self.reserved_bytes
+            if self.on_ram:
+                _ram_reserved_bytes += self.reserved_bytes
+
+        root = SCRATCH_RAM_DIR if self.on_ram else SCRATCH_DISK_DIR
+        try:
+            os.makedirs(root, exist_ok=True)
+            self.path = tempfile.mkdtemp(prefix=f"job_{self.job_id}_", dir=root)
+        except OSError:
+            self._release()
+            raise
+
+        with _condition:
+            _active_workspaces[self.path] = self
+
+        print(
+            f"Scratch workspace for job {self.job_id}: {self.path} "
+            f"({'RAM' if self.on_ram else 'disk'}, {self.reserved_bytes} bytes reserved)"
+        )
+        return self
+
+    def file(self, name):
+        """Path of a file inside the workspace."""
+        return os.path.join(self.path, name)
+
+    def report(self):
+        return {
+            "location": "ram" if self.on_ram else "disk",
+            "reserved_bytes": self.reserved_bytes,
+        }
+
+    def _release(self):
+        global _reserved_bytes, _ram_reserved_bytes
+        with _condition:
+            _reserved_bytes -= self.reserved_bytes
+            if self.on_ram:
+                _ram_reserved_bytes -= self.reserved_bytes
+            _active_workspaces.pop(self.path, None)
+            _condition.notify_all()
+
+    def close(self):
+        if self.path is None:
+            return
+        try:
+            shutil.rmtree(self.path)
+        except Exception as e:
+            print(f"Error cleaning up scratch workspace {self.path}: {e}")
+        self._release()
+        self.path = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
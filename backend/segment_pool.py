@@ -0,0 +1,107 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Number of segments encoded at the same time, shared by all jobs in this process
+SEGMENT_ENCODE_WORKERS = int(
+    os.environ.get("SEGMENT_ENCODE_WORKERS", max(1, min(8, (os.cpu_count() or 1) // 2)))
+)
+# Total encoder threads across all workers, so parallel jobs don't oversubscribe the CPU
+ENCODER_THREAD_BUDGET = int(os.environ.get("ENCODER_THREAD_BUDGET", os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def threads_per_worker():
+    """Encoder threads each worker may use within the global thread budget."""
+    return max(1, ENCODER_THREAD_BUDGET // SEGMENT_ENCODE_WORKERS)
+
+
+def get_segment_pool():
+    """Return the process pool shared by all segment encodes, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the server process runs many threads. Spawned
+            # workers re-import the main script, so app.py keeps its startup work in init_app
+            _pool = ProcessPoolExecutor(
+                max_workers=SEGMENT_ENCODE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            print(
+                f"Started segment encode pool: {SEGMENT_ENCODE_WORKERS} workers, "
+                f"{threads_per_worker()} encoder threads each"
+            )
+        return _pool
+
+
+def reset_segment_pool():
+    """Discard a broken pool so the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def encode_segment(video_path, start, end, segment_path, threads, preset="medium", crf=None):
+    """Encode one range of a source video to its own file (runs in a worker process).
+
+    Each worker opens its own reader, so nothing but paths and times crosses
+    the process boundary.
+    """
+    from moviepy.editor import VideoFileClip
+
+    base_path, _ = os.path.splitext(segment_path)
+    video = VideoFileClip(video_path)
+    try:
+        segment = video.subclip(start, end)
+        segment.write_videofile(
+            segment_path,
+            codec="libx264",
+            audio_codec="aac",
+            temp_audiofile=f"{base_path}_audio.m4a",
+            remove_temp=True,
+            threads=threads,
+            preset=preset,
+            ffmpeg_params=["-crf", str(crf)] if crf is not None else None,
+            logger=None,
+        )
+        segment.close()
+    finally:
+        video.close()
+
+    return segment_path
+
+
+def encode_segments_parallel(source_ranges, temp_dir, encoder_profile=None):
+    """Encode (video_path, start, end) ranges concurrently on the shared pool.
+
+    The encoder profile's preset and CRF are used; threads always come from
+    the pool's budget. Returns the segment file paths in the same order as
+    source_ranges.
+    """
+    pool = get_segment_pool()
+    threads = threads_per_worker()
+    preset = encoder_profile["preset"] if encoder_profile else "medium"
+    crf = encoder_profile["crf"] if encoder_profile else None
+
+    futures = []
+    for i, (video_path, start, end) in enumerate(source_ranges):
+        segment_path = os.path.join(temp_dir, f"segment_{i:04d}.mp4")
+        futures.append(
+            pool.submit(encode_segment, video_path, start, end, segment_path, threads, preset, crf)
+        )
+
+    try:
+        # Collect in submission order so the concat list keeps the edit order
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        reset_segment_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
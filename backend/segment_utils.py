@@ -0,0 +1,144 @@
+import os
+import math
+
+# Gaps between kept segments shorter than this (seconds) are merged away
+SEGMENT_MERGE_GAP = float(os.environ.get("SEGMENT_MERGE_GAP", "0.25"))
+# Segments shorter than this after merging are dropped
+SEGMENT_MIN_LENGTH = float(os.environ.get("SEGMENT_MIN_LENGTH", "0.1"))
+# Segments longer than this are split into consecutive pieces (0 = no limit)
+SEGMENT_MAX_LENGTH = float(os.environ.get("SEGMENT_MAX_LENGTH", "0"))
+
+# Segments shorter than SHORT_SEGMENT_THRESHOLD get SHORT_SEGMENT_PADDING on both sides
+SHORT_SEGMENT_THRESHOLD = 1.0
+SHORT_SEGMENT_PADDING = 0.5
+
+
+def _coerce_time(value, default, name):
+    """Convert a timestamp from the model to float, falling back to a default."""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid {name} format: {value}, using {default}")
+        return default
+
+
+def coerce_segment_times(segment, video_duration):
+    """Return (start, end) of a segment dict, accepting start_time/start and end_time/end keys."""
+    start_time = _coerce_time(segment.get("start_time", segment.get("start")), 0.0, "start_time")
+    end_time = _coerce_time(segment.get("end_time", segment.get("end")), video_duration, "end_time")
+    return start_time, end_time
+
+
+def normalize_segments(
+    segments,
+    video_duration,
+    merge_gap=None,
+    min_length=None,
+    max_length=None,
+):
+    """Turn the raw segments from the model into a compact, render-ready edit list.
+
+    Segments are coerced to floats, clamped to the video, padded when very
+    short, sorted, and merged when they overlap or are separated by less than
+    merge_gap. Merged segments shorter than min_length are dropped and those
+    longer than max_length are split into equal pieces. Runs in O(n log n).
+
+    Returns (edit_list, stats) where edit_list is a list of (start, end)
+    tuples in timeline order and stats describes what was removed.
+    """
+    if merge_gap is None:
+        merge_gap = SEGMENT_MERGE_GAP
+    if min_length is None:
+        min_length = SEGMENT_MIN_LENGTH
+    if max_length is None:
+        max_length = SEGMENT_MAX_LENGTH
+
+    intervals = []
+    invalid = 0
+    for segment in segments:
+        if not isinstance(segment, dict):
+            invalid += 1
+            continue
+
+        start_time, end_time = coerce_segment_times(segment, video_duration)
+
+        # Ensure times are within video bounds
+        start_time = max(0.0, start_time)
+        end_time = min(video_duration, end_time)
+
+        if start_time >= end_time:
+            invalid += 1
+            continue
+
+        # Add a small buffer if the segment is very short
+        if end_time - start_time < SHORT_SEGMENT_THRESHOLD:
+            start_time = max(0.0, start_time - SHORT_SEGMENT_PADDING)
+            end_time = min(video_duration, end_time + SHORT_SEGMENT_PADDING)
+
+        intervals.append((start_time, end_time))
+
+    requested_seconds = sum(end - start for start, end in intervals)
+    intervals.sort()
+
+    # Sweep in start order, tracking the overlap that would have been rendered twice
+    merged = []
+    duplicate_seconds = 0.0
+    bridged_seconds = 0.0
+    for start, end in intervals:
+        if merged and start - merged[-1][1] <= merge_gap:
+            previous_end = merged[-1][1]
+            duplicate_seconds += max(0.0, min(end, previous_end) - start)
+            bridged_seconds += max(0.0, start - previous_end)
+            if end > previous_end:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    edit_list = []
+    dropped = 0
+    for start, end in merged:
+        if end - start < min_length:
+            dropped += 1
+            continue
+        if max_length and end - start > max_length:
+            # Equal pieces, so none is left shorter than half of max_length
+            pieces = math.ceil((end - start) / max_length)
+            length = (end - start) / pieces
+            for i in range(pieces):
+                edit_list.append((start + i * length, end if i == pieces - 1 else start + (i + 1) * length))
+        else:
+            edit_list.append((start, end))
+
+    output_seconds = sum(end - start for start, end in edit_list)
+
+    stats = {
+        "input_segments": len(segments),
+        "invalid_segments": invalid,
+        "merged_segments": len(intervals) - len(merged),
+        "dropped_segments": dropped,
+        "output_segments": len(edit_list),
+        "requested_seconds": round(requested_seconds, 3),
+        "output_seconds": round(output_seconds, 3),
+        "duplicate_seconds_removed": round(duplicate_seconds, 3),
+        "gap_seconds_bridged": round(bridged_seconds, 3),
+    }
+    return edit_list, stats
+
+
+def keep_ranges(cuts, video_duration, min_saving=1.0):
+    """Return the ranges left after removing the cut intervals, or None if less than min_saving seconds would go."""
+    ranges = []
+    position = 0.0
+    for start, end in sorted(cuts):
+        start, end = max(0.0, start), min(video_duration, end)
+        if start > position:
+            ranges.append((position, start))
+        position = max(position, end)
+    if position < video_duration:
+        ranges.append((position, video_duration))
+
+    if not ranges or sum(end - start for start, end in ranges) > video_duration - min_saving:
+        return None
+    return ranges
@@ -0,0 +1,214 @@
+import os
+import json
+import shutil
+import threading
+import subprocess
+
+import numpy as np
+
+from analysis_proxy import ANALYSIS_PROXY_DIR
+from segment_utils import coerce_segment_times
+
+# Shot-boundary detection used to snap segment edges to cuts ("on" or "off").
+# Costs a full decode of each new video at SHOT_DETECTION_FPS before rendering
+SHOT_DETECTION = os.environ.get("SHOT_DETECTION", "off").lower()
+# Frames are decoded at this rate, downscaled to SHOT_FRAME_WIDTH x SHOT_FRAME_HEIGHT grey
+SHOT_DETECTION_FPS = float(os.environ.get("SHOT_DETECTION_FPS", "15"))
+SHOT_FRAME_WIDTH = 64
+SHOT_FRAME_HEIGHT = 36
+# Frame-to-frame distance (0-1) above which a frame starts a new shot, and the shortest shot
+SHOT_THRESHOLD = float(os.environ.get("SHOT_THRESHOLD", "0.3"))
+SHOT_MIN_LENGTH = float(os.environ.get("SHOT_MIN_LENGTH", "0.5"))
+# Segment edges within this many seconds of a shot boundary move onto it
+SHOT_SNAP_TOLERANCE = float(os.environ.get("SHOT_SNAP_TOLERANCE", "0.5"))
+
+# Frames read and compared per batch
+BATCH_FRAMES = 512
+HISTOGRAM_BINS = 16
+
+_index_locks = {}
+_index_locks_lock = threading.Lock()
+
+
+def shot_index_path(video_hash):
+    tag = f"{SHOT_DETECTION_FPS:g}fps-{SHOT_THRESHOLD:g}-{SHOT_MIN_LENGTH:g}s"
+    # Named after the source hash, so remove_proxies() cleans it up with the proxies
+    return os.path.join(ANALYSIS_PROXY_DIR, f"{video_hash}-shots-{tag}.json")
+
+
+def _histograms(frames):
+    """Normalized grey-level histograms of a (n, pixels) uint8 batch."""
+    bins = frames >> (8 - int(np.log2(HISTOGRAM_BINS)))
+    offsets = np.arange(len(frames))[:, None] * HISTOGRAM_BINS
+    counts = np.bincount((bins + offsets).ravel(), minlength=len(frames) * HISTOGRAM_BINS)
+    return counts.reshape(len(frames), HISTOGRAM_BINS) / frames.shape[1]
+
+
+def frame_distances(video_path, ffmpeg_path=None):
+    """Return the distance (0-1) between every decoded frame and the one before it.
+
+    Frames are streamed from ffmpeg as small grey images and compared in
+    batches: the score averages the mean absolute pixel difference and the
+    histogram distance, so both hard cuts and cuts between similar framings
+    stand out. Element i compares frame i with frame i - 1 (element 0 is 0).
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    frame_bytes = SHOT_FRAME_WIDTH * SHOT_FRAME_HEIGHT
+
+    process = subprocess.Popen(
+        [
+            ffmpeg_path, "-v", "error", "-nostdin",
+            "-i", video_path,
+            "-map", "0:v:0", "-an",
+            "-vf", f"fps={SHOT_DETECTION_FPS:g},scale={SHOT_FRAME_WIDTH}:{SHOT_FRAME_HEIGHT},format=gray",
+            "-f", "rawvideo", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    distances = []
+    previous = None
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * BATCH_FRAMES)
+            usable = len(data) - len(data) % frame_bytes
+            if not usable:
+                break
+            frames = np.frombuffer(data[:usable], dtype=np.uint8).reshape(-1, frame_bytes)
+            if previous is not None:
+                frames = np.concatenate((previous, frames))
+
+            pixel_distance = np.mean(
+                np.abs(np.diff(frames.astype(np.int16), axis=0)), axis=1
+            ) / 255.0
+            histograms = _histograms(frames)
+            histogram_distance = np.sum(np.abs(np.diff(histograms, axis=0)), axis=1) / 2
+            scores = (pixel_distance + histogram_distance) / 2
+            if previous is None:
+                scores = np.concatenate(([0.0], scores))
+            distances.append(scores.astype(np.float32))
+            previous = frames[-1:]
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    if not distances:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(distances)
+
+
+def find_boundaries(distances, fps, threshold=None, min_length=None):
+    """Return shot boundary times (seconds): frames whose distance exceeds the threshold.
+
+    Within min_length of a boundary only the strongest candidate is kept, so
+    a fade or flash counts as one cut.
+    """
+    threshold = SHOT_THRESHOLD if threshold is None else threshold
+    min_length = SHOT_MIN_LENGTH if min_length is None else min_length
+    candidates = np.flatnonzero(distances > threshold)
+    if not len(candidates):
+        return []
+
+    # Strongest candidates first; greedily drop those too close to an accepted one
+    order = candidates[np.argsort(-distances[candidates], kind="stable")]
+    min_frames = max(1, int(round(min_length * fps)))
+    accepted = []
+    taken = np.zeros(len(distances), dtype=bool)
+    for frame in order:
+        if taken[frame]:
+            continue
+        accepted.append(frame)
+        taken[max(0, frame - min_frames + 1):frame + min_frames] = True
+    return [round(float(frame / fps), 3) for frame in sorted(accepted)]
+
+
+def _index_lock(video_hash):
+    with _index_locks_lock:
+        return _index_locks.setdefault(video_hash, threading.Lock())
+
+
+def get_shot_index(video_path, video_hash, ffmpeg_path=None):
+    """Return the shot-boundary index of a video, built once per content hash.
+
+    The index is a dict with the "boundaries" as a sorted list of times in
+    seconds. Every later job on the same content reuses the cached index.
+    Returns None when detection is off or fails.
+    """
+    if SHOT_DETECTION != "on":
+        return None
+
+    cached_path = shot_index_path(video_hash)
+    with _index_lock(video_hash):
+        try:
+            with open(cached_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        try:
+            distances = frame_distances(video_path, ffmpeg_path)
+        except Exception as e:
+            print(f"Shot detection failed: {e}")
+            return None
+
+        shot_index = {
+            "frames": len(distances),
+            "boundaries": find_boundaries(distances, SHOT_DETECTION_FPS),
+        }
+        try:
+            os.makedirs(ANALYSIS_PROXY_DIR, exist_ok=True)
+            temp_file = cached_path + ".tmp"
+            with open(temp_file, "w") as f:
+                json.dump(shot_index, f)
+            os.replace(temp_file, cached_path)
+        except OSError as e:
+            print(f"Error saving shot index: {e}")
+
+        print(f"Shot index: {len(shot_index['boundaries'])} boundaries in {shot_index['frames']} frames")
+        return shot_index
+
+
+def snap_to_boundaries(times, boundaries, tolerance=None):
+    """Return (snapped, moved): each time moved to the nearest boundary within tolerance."""
+    tolerance = SHOT_SNAP_TOLERANCE if tolerance is None else tolerance
+    times = np.asarray(times, dtype=np.float64)
+    if not len(boundaries) or not len(times):
+        return times, np.zeros(len(times), dtype=bool)
+
+    boundaries = np.asarray(boundaries, dtype=np.float64)
+    right = np.clip(np.searchsorted(boundaries, times), 0, len(boundaries) - 1)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(
+        np.abs(boundaries[left] - times) <= np.abs(boundaries[right] - times),
+        boundaries[left],
+        boundaries[right],
+    )
+    moved = np.abs(nearest - times) <= tolerance
+    return np.where(moved, nearest, times), moved
+
+
+def snap_segments_to_shots(segments, shot_index, video_duration):
+    """Snap segment dicts' edges to shot boundaries.
+
+    Returns (segments, locked) where locked holds a (start_moved, end_moved)
+    pair per segment, so later snapping passes can leave those edges alone.
+    """
+    segments = [segment for segment in segments if isinstance(segment, dict)]
+    if not segments or not shot_index or not shot_index["boundaries"]:
+        return segments, [(False, False)] * len(segments)
+
+    ranges = np.array([coerce_segment_times(segment, video_duration) for segment in segments])
+    starts, start_moved = snap_to_boundaries(ranges[:, 0], shot_index["boundaries"])
+    ends, end_moved = snap_to_boundaries(ranges[:, 1], shot_index["boundaries"])
+
+    # Never let snapping empty a segment
+    collapsed = ends - starts < np.minimum(0.1, ranges[:, 1] - ranges[:, 0])
+    starts = np.where(collapsed, ranges[:, 0], starts)
+    ends = np.where(collapsed, ranges[:, 1], ends)
+    start_moved &= ~collapsed
+    end_moved &= ~collapsed
+
+    return [
+        dict(segment, start_time=round(float(start), 3), end_time=round(float(end), 3))
+        for segment, start, end in zip(segments, starts, ends)
+    ], list(zip(start_moved.tolist(), end_moved.tolist()))
@@ -0,0 +1,295 @@
+import os
+import json
+import shutil
+import threading
+import subprocess
+
+import numpy as np
+
+from analysis_proxy import ANALYSIS_PROXY_DIR
+from renderers import get_ffprobe_path, probe_media
+from segment_utils import coerce_segment_times
+
+# Local audio pre-analysis that finds silence/dead air ("off" disables it)
+SILENCE_ANALYSIS = os.environ.get("SILENCE_ANALYSIS", "on").lower()
+# Windows quieter than this (dBFS RMS) are silent
+SILENCE_THRESHOLD_DB = float(os.environ.get("SILENCE_THRESHOLD_DB", "-40"))
+# RMS window length (milliseconds) and the shortest silence worth recording (seconds)
+SILENCE_WINDOW_MS = int(os.environ.get("SILENCE_WINDOW_MS", 50))
+SILENCE_MIN_DURATION = float(os.environ.get("SILENCE_MIN_DURATION", "0.5"))
+# Cut silences at least this long (seconds) out of the analysis proxy ("on" or "off"),
+# keeping SILENCE_TRIM_PADDING seconds of each
+SILENCE_TRIM = os.environ.get("SILENCE_TRIM", "off").lower()
+SILENCE_TRIM_MIN_DURATION = float(os.environ.get("SILENCE_TRIM_MIN_DURATION", "2"))
+SILENCE_TRIM_PADDING = float(os.environ.get("SILENCE_TRIM_PADDING", "0.3"))
+# Move segment edges this close (seconds) to a silence into it ("on" or "off"),
+# keeping SILENCE_SNAP_PADDING seconds of the silence next to the speech
+SILENCE_SNAP = os.environ.get("SILENCE_SNAP", "on").lower()
+SILENCE_SNAP_TOLERANCE = float(os.environ.get("SILENCE_SNAP_TOLERANCE", "0.3"))
+SILENCE_SNAP_PADDING = float(os.environ.get("SILENCE_SNAP_PADDING", "0.1"))
+
+# Largest gap (seconds, or fraction of the duration if larger) allowed between the
+# decoded audio and the probed duration before a map is considered truncated
+DURATION_TOLERANCE = 1.0
+DURATION_TOLERANCE_FRACTION = 0.01
+
+# Audio is decoded to 16 kHz mono s16le and read this many windows at a time,
+# so memory stays bounded however long the file is
+SAMPLE_RATE = 16000
+READ_WINDOWS = 4096
+
+_map_locks = {}
+_map_locks_lock = threading.Lock()
+
+
+def silence_map_path(video_hash):
+    tag = f"{SILENCE_THRESHOLD_DB:g}db-{SILENCE_WINDOW_MS}ms-{SILENCE_MIN_DURATION:g}s"
+    # Named after the source hash, so remove_proxies() cleans it up with the proxies
+    return os.path.join(ANALYSIS_PROXY_DIR, f"{video_hash}-silence-{tag}.json")
+
+
+def compute_levels(video_path, ffmpeg_path=None):
+    """Return (levels_db, window_seconds): the RMS level of every window of the first audio stream.
+
+    Audio is streamed from an ffmpeg pipe and reduced window by window, so
+    only the per-window levels (80 bytes per second of audio at 50 ms) are
+    kept in memory. Raises RuntimeError when ffmpeg fails, e.g. on a
+    truncated or corrupt file, so partial levels are never used.
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    window = SAMPLE_RATE * SILENCE_WINDOW_MS // 1000
+    window_bytes = window * 2
+
+    process = subprocess.Popen(
+        [
+            ffmpeg_path, "-v", "error", "-nostdin",
+            "-i", video_path,
+            "-map", "0:a:0", "-vn",
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    levels = []
+    remainder = b""
+    try:
+        while True:
+            chunk = process.stdout.read(window_bytes * READ_WINDOWS)
+            if not chunk:
+                break
+            data = remainder + chunk
+            usable = len(data) - len(data) % window_bytes
+            remainder = data[usable:]
+            if usable:
+                samples = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, window)
+                levels.append(_rms_db(samples))
+        if len(remainder) >= 2:
+            levels.append(_rms_db(np.frombuffer(remainder[: len(remainder) // 2 * 2], dtype="<i2")[None, :]))
+    finally:
+        process.stdout.close()
+        process.wait()
+    if process.returncode:
+        raise RuntimeError(f"ffmpeg exited with status {process.returncode} while decoding audio")
+
+    if not levels:
+        return np.zeros(0, dtype=np.float32), window / SAMPLE_RATE
+    return np.concatenate(levels), window / SAMPLE_RATE
+
+
+def _rms_db(samples):
+    power = np.mean(np.square(samples.astype(np.float32) / 32768.0), axis=1)
+    return (10 * np.log10(np.maximum(power, 1e-12))).astype(np.float32)
+
+
+def find_silences(levels_db, window_seconds, threshold_db=None, min_duration=None):
+    """Return the (start, end) intervals where the level stays below the threshold for min_duration."""
+    threshold_db = SILENCE_THRESHOLD_DB if threshold_db is None else threshold_db
+    min_duration = SILENCE_MIN_DURATION if min_duration is None else min_duration
+    if not len(levels_db):
+        return []
+
+    silent = np.concatenate(([0], (levels_db < threshold_db).astype(np.int8), [0]))
+    edges = np.diff(silent)
+    starts = np.flatnonzero(edges == 1) * window_seconds
+    ends = np.flatnonzero(edges == -1) * window_seconds
+    keep = ends - starts >= min_duration
+    return [(float(start), float(end)) for start, end in zip(starts[keep], ends[keep])]
+
+
+def _map_lock(video_hash):
+    with _map_locks_lock:
+        return _map_locks.setdefault(video_hash, threading.Lock())
+
+
+def get_silence_map(video_path, video_hash, ffmpeg_path=None):
+    """Return the silence map of a video, computed once per content hash.
+
+    The map is a dict with the audio "duration" and the "silences" as a
+    list of [start, end] pairs in seconds. Returns None when silence
+    analysis is off or fails.
+    """
+    if SILENCE_ANALYSIS != "on":
+        return None
+
+    cached_path = silence_map_path(video_hash)
+    with _map_lock(video_hash):
+        try:
+            with open(cached_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        try:
+            media = probe_media(video_path, get_ffprobe_path(ffmpeg_path))
+            if media["audio_codecs"]:
+                levels_db, window_seconds = compute_levels(video_path, ffmpeg_path)
+            else:
+                levels_db, window_seconds = np.zeros(0, dtype=np.float32), SILENCE_WINDOW_MS / 1000
+        except Exception as e:
+            print(f"Silence analysis failed: {e}")
+            return None
+
+        decoded = len(levels_db) * window_seconds
+        if media["audio_codecs"] and media["duration"] and abs(decoded - media["duration"]) > max(
+            DURATION_TOLERANCE, DURATION_TOLERANCE_FRACTION * media["duration"]
+        ):
+            # Don't cache a partial decode: the missing tail would count as silence for good
+            print(f"Silence analysis decoded {decoded:.1f}s of {media['duration']:.1f}s, not using it")
+            return None
+
+        silence_map = {
+            "duration": round(decoded, 3),
+            "silences": find_silences(levels_db, window_seconds),
+        }
+        try:
+            os.makedirs(ANALYSIS_PROXY_DIR, exist_ok=True)
+            temp_file = cached_path + ".tmp"
+            with open(temp_file, "w") as f:
+                json.dump(silence_map, f)
+            os.replace(temp_file, cached_path)
+        except OSError as e:
+            print(f"Error saving silence map: {e}")
+
+        total = sum(end - start for start, end in silence_map["silences"])
+        print(f"Silence map: {len(silence_map['silences'])} silences, {total:.1f}s of {silence_map['duration']:.1f}s")
+        return silence_map
+
+
+def dead_air_cuts(silence_map, video_duration):
+    """Return the (start, end) intervals of long silences to cut out of the analysis upload."""
+    if not silence_map:
+        return []
+
+    cuts = []
+    for start, end in silence_map["silences"]:
+        if end - start < SILENCE_TRIM_MIN_DURATION:
+            continue
+        cut_start = start + SILENCE_TRIM_PADDING if start > 0 else 0.0
+        cut_end = end - SILENCE_TRIM_PADDING if end < video_duration else video_duration
+        cuts.append((cut_start, cut_end))
+    return cuts
+
+
+def build_remap(ranges):
+    """Remap table for a video made of ranges joined back to back: [trimmed_start, source_start, length] rows."""
+    lengths = np.array([end - start for start, end in ranges])
+    trimmed_starts = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+    return np.column_stack((trimmed_starts, [start for start, _ in ranges], lengths)).tolist()
+
+
+def to_source_times(times, remap, side="right"):
+    """Translate times on the trimmed timeline back to the source timeline.
+
+    A time exactly on a join between two ranges maps to the start of the
+    later range with side="right" (for starts) and to the end of the
+    earlier range with side="left" (for ends), so ranges never span a cut.
+    """
+    table = np.asarray(remap, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    rows = np.clip(np.searchsorted(table[:, 0], times, side=side) - 1, 0, len(table) - 1)
+    offsets = np.clip(times - table[rows, 0], 0.0, table[rows, 2])
+    return table[rows, 1] + offsets
+
+
+def remap_segments(segments, remap):
+    """Return segment dicts with start_time/end_time translated to the source timeline."""
+    segments = [segment for segment in segments if isinstance(segment, dict)]
+    if not segments or not remap:
+        return segments
+    trimmed_duration = remap[-1][0] + remap[-1][2]
+    times = np.array([coerce_segment_times(segment, trimmed_duration) for segment in segments])
+    starts = to_source_times(times[:, 0], remap)
+    ends = to_source_times(times[:, 1], remap, side="left")
+    return [
+        dict(segment, start_time=round(float(start), 3), end_time=round(float(end), 3))
+        for segment, start, end in zip(segments, starts, ends)
+    ]
+
+
+def snap_to_silence(ranges, silence_map, tolerance=None, padding=None):
+    """Move cut points into nearby silence so cuts don't clip words.
+
+    A range start inside or up to tolerance before a silence's end moves to
+    padding before that end; a range end inside or up to tolerance after a
+    silence's start moves to padding after that start. Edges without a
+    silence nearby are left alone.
+    """
+    tolerance = SILENCE_SNAP_TOLERANCE if tolerance is None else tolerance
+    padding = SILENCE_SNAP_PADDING if padding is None else padding
+    if not ranges or not silence_map or not silence_map["silences"]:
+        return ranges
+
+    silences = np.asarray(silence_map["silences"], dtype=np.float64)
+    silence_starts, silence_ends = silences[:, 0], silences[:, 1]
+    starts = np.array([start for start, _ in ranges], dtype=np.float64)
+    ends = np.array([end for _, end in ranges], dtype=np.float64)
+
+    # Starts: the first silence ending at or after start - tolerance
+    rows = np.searchsorted(silence_ends, starts - tolerance, side="left")
+    valid = rows < len(silences)
+    rows = np.minimum(rows, len(silences) - 1)
+    near = valid & (silence_starts[rows] <= starts + tolerance)
+    snapped_starts = np.where(
+        near, np.maximum(silence_starts[rows], silence_ends[rows] - padding), starts
+    )
+
+    # Ends: the last silence starting at or before end + tolerance
+    rows = np.searchsorted(silence_starts, ends + tolerance, side="right") - 1
+    valid = rows >= 0
+    rows = np.maximum(rows, 0)
+    near = valid & (silence_ends[rows] >= ends - tolerance)
+    snapped_ends = np.where(
+        near, np.minimum(silence_ends[rows], silence_starts[rows] + padding), ends
+    )
+
+    snapped = []
+    for (start, end), new_start, new_end in zip(ranges, snapped_starts, snapped_ends):
+        # Never let snapping empty a range
+        if new_end - new_start < min(0.1, end - start):
+            new_start, new_end = start, end
+        snapped.append((float(new_start), float(new_end)))
+    return snapped
+
+
+def snap_segments(segments, silence_map, video_duration, locked=None):
+    """Snap the edges of segment dicts to silence; returns (segments, edges_moved).
+
+    locked is an optional (start_locked, end_locked) pair per segment for
+    edges an earlier pass already placed (e.g. on a shot boundary).
+    """
+    segments = [segment for segment in segments if isinstance(segment, dict)]
+    if not segments or not silence_map:
+        return segments, 0
+
+    ranges = [coerce_segment_times(segment, video_duration) for segment in segments]
+    snapped = snap_to_silence(ranges, silence_map)
+    if locked:
+        snapped = [
+            (start if start_locked else new_start, end if end_locked else new_end)
+            for (start, end), (new_start, new_end), (start_locked, end_locked) in zip(ranges, snapped, locked)
+        ]
+    moved = sum((start != new_start) + (end != new_end) for (start, end), (new_start, new_end) in zip(ranges, snapped))
+    return [
+        dict(segment, start_time=round(start, 3), end_time=round(end, 3))
+        for segment, (start, end) in zip(segments, snapped)
+    ], moved
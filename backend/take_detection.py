@@ -0,0 +1,361 @@
+import os
+import json
+import shutil
+import threading
+import subprocess
+
+import numpy as np
+
+from analysis_proxy import ANALYSIS_PROXY_DIR
+from segment_utils import coerce_segment_times
+
+# Local repeated-take detection ("on" or "off"). Detected duplicates are
+# dropped from (or moved onto the best take in) the returned segments
+TAKE_DETECTION = os.environ.get("TAKE_DETECTION", "off").lower()
+# Also cut the rejected takes out of the analysis upload ("on" or "off")
+TAKE_PREFILTER = os.environ.get("TAKE_PREFILTER", "off").lower()
+# Fingerprint window and hop (seconds); takes must repeat for at least TAKE_MIN_DURATION
+TAKE_WINDOW_SECONDS = float(os.environ.get("TAKE_WINDOW_SECONDS", "2"))
+TAKE_HOP_SECONDS = float(os.environ.get("TAKE_HOP_SECONDS", "0.5"))
+TAKE_MIN_DURATION = float(os.environ.get("TAKE_MIN_DURATION", "3"))
+# Cosine similarity of two fingerprints that counts as the same content
+TAKE_SIMILARITY = float(os.environ.get("TAKE_SIMILARITY", "0.9"))
+# LSH index: bands x rows random hyperplanes; buckets larger than TAKE_MAX_BUCKET
+# (music, room tone) are skipped so candidate pairs stay near linear in length
+TAKE_LSH_BANDS = int(os.environ.get("TAKE_LSH_BANDS", 8))
+TAKE_LSH_ROWS = int(os.environ.get("TAKE_LSH_ROWS", 12))
+TAKE_MAX_BUCKET = int(os.environ.get("TAKE_MAX_BUCKET", 32))
+# Windows quieter than this (dBFS) aren't fingerprinted, so silences don't match each other
+TAKE_SILENCE_DB = float(os.environ.get("TAKE_SILENCE_DB", "-45"))
+
+SAMPLE_RATE = 16000
+FRAME_SIZE = 512
+FRAME_HOP = 320  # 20 ms
+# Frames are averaged into 100 ms steps before fingerprinting
+FRAMES_PER_STEP = 5
+BANDS = 16
+# Time slices per fingerprint; a fingerprint has BANDS * SLICES dimensions
+SLICES = 8
+READ_FRAMES = 4096
+LSH_SEED = 1234
+
+_take_locks = {}
+_take_locks_lock = threading.Lock()
+
+
+def take_map_path(video_hash):
+    tag = f"{TAKE_WINDOW_SECONDS:g}w-{TAKE_HOP_SECONDS:g}h-{TAKE_MIN_DURATION:g}s-{TAKE_SIMILARITY:g}"
+    # Named after the source hash, so remove_proxies() cleans it up with the proxies
+    return os.path.join(ANALYSIS_PROXY_DIR, f"{video_hash}-takes-{tag}.json")
+
+
+def _band_edges():
+    # Log-spaced bands over the speech range, as FFT bin indices
+    frequencies = np.geomspace(100, 4000, BANDS + 1)
+    return np.round(frequencies * FRAME_SIZE / SAMPLE_RATE).astype(int)
+
+
+def compute_band_energies(video_path, ffmpeg_path=None):
+    """Return (energies, levels): log band energies (steps x BANDS) and level (dB) per 100 ms step.
+
+    Audio is streamed from an ffmpeg pipe and reduced chunk by chunk with
+    NumPy FFTs, so memory grows only with the 100 ms feature steps.
+    """
+    ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg") or "ffmpeg"
+    process = subprocess.Popen(
+        [
+            ffmpeg_path, "-v", "error", "-nostdin",
+            "-i", video_path,
+            "-map", "0:a:0", "-vn",
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    edges = _band_edges()
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+    step_samples = FRAME_HOP * FRAMES_PER_STEP
+    energies, levels = [], []
+    carry = np.zeros(0, dtype=np.float32)
+    try:
+        while True:
+            data = process.stdout.read(step_samples * 2 * READ_FRAMES // FRAMES_PER_STEP)
+            if not data:
+                break
+            samples = np.frombuffer(data[: len(data) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+            samples = np.concatenate((carry, samples))
+            steps = (len(samples) - (FRAME_SIZE - FRAME_HOP)) // step_samples
+            if steps <= 0:
+                carry = samples
+                continue
+            frame_count = steps * FRAMES_PER_STEP
+            frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::FRAME_HOP][:frame_count]
+            spectrum = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+            cumulative = np.cumsum(spectrum, axis=1)
+            band_energy = cumulative[:, edges[1:]] - cumulative[:, edges[:-1]]
+            band_energy = band_energy.reshape(steps, FRAMES_PER_STEP, BANDS).mean(axis=1)
+            energies.append(np.log10(band_energy + 1e-10).astype(np.float32))
+            power = np.mean(np.square(frames), axis=1).reshape(steps, FRAMES_PER_STEP).mean(axis=1)
+            levels.append((10 * np.log10(power + 1e-12)).astype(np.float32))
+            carry = samples[steps * step_samples:]
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    if not energies:
+        return np.zeros((0, BANDS), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(energies), np.concatenate(levels)
+
+
+def fingerprints(energies, levels):
+    """Return (vectors, window_starts): unit-length fingerprints of the non-silent sliding windows.
+
+    Each fingerprint is the band energy contour of a window pooled into
+    SLICES time slices, with its mean removed so the same line delivered
+    louder or softer still matches.
+    """
+    step_seconds = FRAME_HOP * FRAMES_PER_STEP / SAMPLE_RATE
+    window_steps = max(SLICES, int(round(TAKE_WINDOW_SECONDS / step_seconds)))
+    window_steps -= window_steps % SLICES
+    hop_steps = max(1, int(round(TAKE_HOP_SECONDS / step_seconds)))
+    if len(energies) < window_steps:
+        return np.zeros((0, BANDS * SLICES), dtype=np.float32), np.zeros(0)
+
+    starts = np.arange(0, len(energies) - window_steps + 1, hop_steps)
+    windows = np.lib.stride_tricks.sliding_window_view(energies, window_steps, axis=0)[starts]
+    # windows: (n, BANDS, window_steps) -> (n, BANDS, SLICES)
+    pooled = windows.reshape(len(starts), BANDS, SLICES, -1).mean(axis=3)
+    vectors = pooled.reshape(len(starts), -1)
+    vectors = vectors - vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    window_levels = np.lib.stride_tricks.sliding_window_view(levels, window_steps)[starts].mean(axis=1)
+    voiced = (window_levels > TAKE_SILENCE_DB) & (norms[:, 0] > 1e-6)
+    vectors = (vectors[voiced] / norms[voiced]).astype(np.float32)
+    return vectors, starts[voiced] * step_seconds
+
+
+def similar_pairs(vectors, window_starts):
+    """Return (i, j) index pairs of similar fingerprints at least one window apart, via LSH.
+
+    Random-hyperplane signatures are split into bands; only fingerprints
+    sharing a band bucket are compared, so the work grows with the number
+    of candidates rather than quadratically with the video length.
+    """
+    if len(vectors) < 2:
+        return np.zeros((0, 2), dtype=int)
+
+    rng = np.random.default_rng(LSH_SEED)
+    planes = rng.standard_normal((vectors.shape[1], TAKE_LSH_BANDS * TAKE_LSH_ROWS)).astype(np.float32)
+    bits = (vectors @ planes > 0).reshape(len(vectors), TAKE_LSH_BANDS, TAKE_LSH_ROWS)
+    keys = np.packbits(bits, axis=2, bitorder="little")
+    keys = keys.view(np.uint8).reshape(len(vectors), TAKE_LSH_BANDS, -1)
+
+    candidates = set()
+    for band in range(TAKE_LSH_BANDS):
+        band_keys = np.ascontiguousarray(keys[:, band]).view(np.dtype((np.void, keys.shape[2]))).ravel()
+        order = np.argsort(band_keys, kind="stable")
+        sorted_keys = band_keys[order]
+        boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2 or len(bucket) > TAKE_MAX_BUCKET:
+                continue
+            for a in range(len(bucket)):
+                for b in range(a + 1, len(bucket)):
+                    i, j = sorted((int(bucket[a]), int(bucket[b])))
+                    candidates.add((i, j))
+
+    if not candidates:
+        return np.zeros((0, 2), dtype=int)
+    pairs = np.array(sorted(candidates))
+    similarity = np.sum(vectors[pairs[:, 0]] * vectors[pairs[:, 1]], axis=1)
+    apart = window_starts[pairs[:, 1]] - window_starts[pairs[:, 0]] >= TAKE_WINDOW_SECONDS
+    return pairs[(similarity >= TAKE_SIMILARITY) & apart]
+
+
+def repeated_spans(pairs, window_starts):
+    """Chain matching windows with a constant time offset into pairs of repeated spans."""
+    if not len(pairs):
+        return []
+
+    first = window_starts[pairs[:, 0]]
+    second = window_starts[pairs[:, 1]]
+    offsets = np.round((second - first) / TAKE_HOP_SECONDS).astype(int)
+    order = np.lexsort((first, offsets))
+    spans = []
+    run_start = 0
+    for k in range(1, len(order) + 1):
+        end_of_run = (
+            k == len(order)
+            or offsets[order[k]] != offsets[order[k - 1]]
+            or first[order[k]] - first[order[k - 1]] > 2 * TAKE_HOP_SECONDS
+        )
+        if not end_of_run:
+            continue
+        run = order[run_start:k]
+        run_start = k
+        start, end = first[run].min(), first[run].max() + TAKE_WINDOW_SECONDS
+        if end - start < TAKE_MIN_DURATION:
+            continue
+        shift = offsets[run[0]] * TAKE_HOP_SECONDS
+        spans.append(((float(start), float(end)), (float(start + shift), float(end + shift))))
+    return spans
+
+
+def cluster_takes(span_pairs):
+    """Group repeated spans into clusters of takes; overlapping spans are the same take."""
+    spans = sorted({span for pair in span_pairs for span in pair})
+    parent = list(range(len(spans)))
+    index = {span: i for i, span in enumerate(spans)}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        parent[find(i)] = find(j)
+
+    for a, b in span_pairs:
+        union(index[a], index[b])
+
+    # Spans overlapping by more than half the shorter one describe the same take
+    takes_of = {}
+    for i, (start, end) in enumerate(spans):
+        for j in range(i + 1, len(spans)):
+            other_start, other_end = spans[j]
+            if other_start >= end:
+                break
+            overlap = min(end, other_end) - other_start
+            if overlap > 0.5 * min(end - start, other_end - other_start):
+                union(i, j)
+
+    clusters = {}
+    for i, span in enumerate(spans):
+        clusters.setdefault(find(i), []).append(span)
+
+    result = []
+    for members in clusters.values():
+        # Merge overlapping members into takes
+        takes = []
+        for start, end in sorted(members):
+            if takes and start < takes[-1][1]:
+                takes[-1][1] = max(takes[-1][1], end)
+            else:
+                takes.append([start, end])
+        if len(takes) > 1:
+            result.append(takes)
+    return result
+
+
+def score_take(levels, start, end):
+    """Loudness/clarity score of a take: voiced level plus a bonus for few dropouts."""
+    step_seconds = FRAME_HOP * FRAMES_PER_STEP / SAMPLE_RATE
+    take_levels = levels[int(start / step_seconds):max(int(start / step_seconds) + 1, int(end / step_seconds))]
+    if not len(take_levels):
+        return float("-inf")
+    voiced = take_levels > TAKE_SILENCE_DB
+    voiced_level = float(np.mean(take_levels[voiced])) if voiced.any() else TAKE_SILENCE_DB
+    return voiced_level + 10 * float(np.mean(voiced))
+
+
+def _take_lock(video_hash):
+    with _take_locks_lock:
+        return _take_locks.setdefault(video_hash, threading.Lock())
+
+
+def get_take_map(video_path, video_hash, ffmpeg_path=None):
+    """Return the repeated-take map of a video, computed once per content hash.
+
+    The map has "clusters", each a dict with its "takes" ([start, end]
+    pairs) and the index of the "best" one, and "rejected": every other
+    take. Returns None when detection is off or fails.
+    """
+    if TAKE_DETECTION != "on":
+        return None
+
+    cached_path = take_map_path(video_hash)
+    with _take_lock(video_hash):
+        try:
+            with open(cached_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        try:
+            energies, levels = compute_band_energies(video_path, ffmpeg_path)
+        except Exception as e:
+            print(f"Repeated-take detection failed: {e}")
+            return None
+
+        vectors, window_starts = fingerprints(energies, levels)
+        span_pairs = repeated_spans(similar_pairs(vectors, window_starts), window_starts)
+        clusters = []
+        rejected = []
+        for takes in cluster_takes(span_pairs):
+            scores = [score_take(levels, start, end) for start, end in takes]
+            # Ties go to the later take, which is usually the corrected one
+            best = max(range(len(takes)), key=lambda i: (scores[i], i))
+            clusters.append({"takes": takes, "best": best, "scores": [round(score, 2) for score in scores]})
+            rejected.extend(take for i, take in enumerate(takes) if i != best)
+
+        take_map = {"clusters": clusters, "rejected": sorted(rejected)}
+        try:
+            os.makedirs(ANALYSIS_PROXY_DIR, exist_ok=True)
+            temp_file = cached_path + ".tmp"
+            with open(temp_file, "w") as f:
+                json.dump(take_map, f)
+            os.replace(temp_file, cached_path)
+        except OSError as e:
+            print(f"Error saving take map: {e}")
+
+        print(f"Take map: {len(clusters)} repeated takes, {len(rejected)} rejected")
+        return take_map
+
+
+def filter_repeated_takes(segments, take_map, video_duration):
+    """Post-filter segments against the take map; returns (segments, removed).
+
+    A segment lying mostly inside a rejected take is moved onto the same
+    position in its cluster's best take, unless another segment already
+    covers the best take, in which case it is dropped.
+    """
+    segments = [segment for segment in segments if isinstance(segment, dict)]
+    if not segments or not take_map or not take_map["clusters"]:
+        return segments, 0
+
+    ranges = np.array([coerce_segment_times(segment, video_duration) for segment in segments])
+    lengths = np.maximum(ranges[:, 1] - ranges[:, 0], 1e-9)
+
+    def overlaps(start, end):
+        return np.clip(np.minimum(ranges[:, 1], end) - np.maximum(ranges[:, 0], start), 0, None) / lengths
+
+    drop = np.zeros(len(segments), dtype=bool)
+    moved = {}
+    for cluster in take_map["clusters"]:
+        best_start, best_end = cluster["takes"][cluster["best"]]
+        best_covered = bool(np.any(overlaps(best_start, best_end) > 0.5))
+        for i, (start, end) in enumerate(cluster["takes"]):
+            if i == cluster["best"]:
+                continue
+            for k in np.flatnonzero((overlaps(start, end) > 0.5) & ~drop):
+                if best_covered:
+                    drop[k] = True
+                    continue
+                shift = best_start - start
+                moved[k] = (
+                    max(best_start, ranges[k, 0] + shift),
+                    min(best_end, ranges[k, 1] + shift),
+                )
+                best_covered = True
+
+    result = []
+    for k, segment in enumerate(segments):
+        if drop[k]:
+            continue
+        if k in moved:
+            start, end = moved[k]
+            segment = dict(segment, start_time=round(float(start), 3), end_time=round(float(end), 3))
+        result.append(segment)
+    return result, int(drop.sum()) + len(moved)
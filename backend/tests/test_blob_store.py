@@ -0,0 +1,82 @@
+import hashlib
+import io
+import os
+import threading
+
+import pytest
+
+import blob_store
+from blob_store import blob_exists, blob_path, link_blob, release_blobs, store_stream
+
+DATA = b"video data" * 1000
+DATA_HASH = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_STORE_DIR", str(tmp_path / "blobs"))
+    (tmp_path / "jobs").mkdir()
+    return tmp_path
+
+
+def test_identical_uploads_share_one_blob(store_dir):
+    first, second = str(store_dir / "jobs" / "a.mp4"), str(store_dir / "jobs" / "b.mp4")
+    assert store_stream(io.BytesIO(DATA), first) == DATA_HASH
+    assert store_stream(io.BytesIO(DATA), second) == DATA_HASH
+
+    assert os.stat(blob_path(DATA_HASH)).st_nlink == 3
+    assert os.listdir(os.path.dirname(blob_path(DATA_HASH))) == [DATA_HASH]
+
+
+def test_release_keeps_referenced_and_linked_blobs(store_dir):
+    target = str(store_dir / "jobs" / "a.mp4")
+    store_stream(io.BytesIO(DATA), target)
+
+    assert release_blobs([DATA_HASH], [DATA_HASH]) == []
+    # Still hard-linked from a job directory
+    assert release_blobs([DATA_HASH], []) == []
+    os.remove(target)
+    assert release_blobs([DATA_HASH], []) == [DATA_HASH]
+    assert not blob_exists(DATA_HASH)
+
+
+def test_link_checks_size_and_existence(store_dir):
+    target = str(store_dir / "jobs" / "a.mp4")
+    assert not link_blob(DATA_HASH, target)
+    store_stream(io.BytesIO(DATA), str(store_dir / "jobs" / "stored.mp4"))
+    assert not link_blob(DATA_HASH, target, size=len(DATA) + 1)
+    assert link_blob(DATA_HASH, target, size=len(DATA))
+    with open(target, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_link_racing_a_release_never_loses_the_content(store_dir):
+    for i in range(100):
+        stored = str(store_dir / "jobs" / "stored.mp4")
+        store_stream(io.BytesIO(DATA), stored)
+        os.remove(stored)
+        target = str(store_dir / "jobs" / f"job_{i}.mp4")
+        results = {}
+        start = threading.Barrier(2)
+
+        def release():
+            start.wait()
+            results["released"] = release_blobs([DATA_HASH], [])
+
+        def link():
+            start.wait()
+            results["linked"] = link_blob(DATA_HASH, target, len(DATA))
+
+        threads = [threading.Thread(target=release), threading.Thread(target=link)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Exactly one side wins; a successful link always has the data
+        assert results["linked"] != bool(results["released"])
+        if results["linked"]:
+            with open(target, "rb") as f:
+                assert f.read() == DATA
+            os.remove(target)
+            assert release_blobs([DATA_HASH], []) == [DATA_HASH]
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+import gemini_governor
+from gemini_governor import CircuitBreaker, GeminiGovernor, GeminiUnavailable
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    monkeypatch.setattr(gemini_governor, "GEMINI_RETRY_BASE_DELAY", 0)
+    governor = GeminiGovernor()
+    governor.breaker = CircuitBreaker(threshold=3, cooldown=60)
+    return governor
+
+
+def fail_with(*codes):
+    codes = list(codes)
+
+    def fn():
+        code = codes.pop(0)
+        if code:
+            raise ApiError(code)
+        return "ok"
+
+    return fn
+
+
+def test_bad_requests_dont_reset_the_failure_count(governor):
+    for codes in [(503,), (400,), (503,), (400,), (503,)]:
+        with pytest.raises(ApiError):
+            governor.call(fail_with(*codes), max_retries=0)
+    assert governor.breaker.state == "open"
+
+
+def test_bad_request_ends_a_trial_without_closing_the_circuit(governor):
+    governor.breaker.opened_at = time.monotonic() - 61
+    with pytest.raises(ApiError):
+        governor.call(fail_with(400), max_retries=0)
+    assert governor.breaker.state == "half-open"
+    assert not governor.breaker.trial_running
+    assert governor.call(fail_with(0)) == "ok"
+    assert governor.breaker.state == "closed"
+
+
+def test_rate_limited_call_waits_before_taking_a_slot(governor):
+    governor.inference_slots.limit = 1
+    governor.requests.reserve(governor.requests.capacity)
+    governor.requests.rate = 10.0
+    held = []
+
+    def call():
+        governor.call(lambda: held.append(governor.inference_slots.active), kind="inference")
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    time.sleep(0.02)
+    # Still waiting out the rate limit, without holding the only slot
+    assert governor.inference_slots.active == 0
+    thread.join()
+    assert held == [1]
+
+
+def test_breaker_opens_after_the_threshold_and_rejects_calls(governor):
+    for _ in range(3):
+        with pytest.raises(ApiError):
+            governor.call(fail_with(503), max_retries=0)
+    assert governor.breaker.state == "open"
+
+    called = []
+    with pytest.raises(GeminiUnavailable):
+        governor.call(lambda: called.append(1))
+    assert not called
+    assert governor.get_stats()["rejected"] == 1
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    breaker.opened_at -= 61
+    assert breaker.allow() == "trial"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    breaker.opened_at -= 61
+    assert breaker.allow() == "trial"
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow() is True
+
+
+def test_retryable_failures_are_retried(governor):
+    assert governor.call(fail_with(503, 429, 0)) == "ok"
+    stats = governor.get_stats()
+    assert (stats["calls"], stats["retries"], stats["failures"]) == (3, 2, 2)
+    assert governor.breaker.state == "closed"
+
+
+def test_bad_requests_and_exhausted_retries_raise(governor):
+    with pytest.raises(ApiError):
+        governor.call(fail_with(400, 0))
+    assert governor.get_stats()["retries"] == 0
+
+    with pytest.raises(ApiError):
+        governor.call(fail_with(500, 500, 0), max_retries=1)
+    assert governor.get_stats()["retries"] == 1
+
+
+def test_inference_slots_go_by_priority():
+    governor = GeminiGovernor()
+    governor.inference_slots.limit = 1
+    governor.inference_slots.acquire(0)
+    order = []
+    threads = [
+        threading.Thread(
+            target=governor.call,
+            args=(lambda priority=priority: order.append(priority),),
+            kwargs={"kind": "inference", "priority": priority},
+        )
+        for priority in ("low", "normal", "high")
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    governor.inference_slots.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["high", "normal", "low"]
@@ -0,0 +1,131 @@
+import threading
+import time
+
+from job_scheduler import JobScheduler, slot_released
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+class Jobs:
+    """run_job for a scheduler whose jobs block until released by the test."""
+
+    def __init__(self, suspend=()):
+        self.suspend = set(suspend)
+        self.started = []
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def event(self, job_id):
+        with self.lock:
+            return self.events.setdefault(job_id, threading.Event())
+
+    def __call__(self, job_id):
+        with self.lock:
+            self.started.append(job_id)
+        if job_id in self.suspend:
+            with slot_released():
+                self.event(job_id).wait(5)
+        else:
+            self.event(job_id).wait(5)
+
+    def finish(self, job_id):
+        self.event(job_id).set()
+
+
+def test_suspended_jobs_are_capped():
+    jobs = Jobs(suspend={"a", "b", "c"})
+    scheduler = JobScheduler(jobs, workers=1, max_suspended=2)
+    scheduler.start()
+    for job_id in "abcd":
+        scheduler.submit(job_id)
+
+    # a, b and c give their slot back, but no fourth job thread may start
+    wait_for(lambda: jobs.started == ["a", "b", "c"])
+    time.sleep(0.05)
+    assert jobs.started == ["a", "b", "c"]
+    assert scheduler.get_stats()["suspended_jobs"] == ["a", "b", "c"]
+
+    jobs.finish("a")
+    wait_for(lambda: jobs.started == ["a", "b", "c", "d"])
+    for job_id in "bcd":
+        jobs.finish(job_id)
+    wait_for(lambda: not scheduler.get_stats()["running_jobs"])
+
+
+def test_queued_jobs_start_by_priority_then_submission_order():
+    jobs = Jobs()
+    scheduler = JobScheduler(jobs, workers=1)
+    scheduler.start()
+    scheduler.submit("running")
+    wait_for(lambda: jobs.started == ["running"])
+    scheduler.submit("low", "low")
+    scheduler.submit("normal-1")
+    scheduler.submit("high", "high")
+    scheduler.submit("normal-2")
+    scheduler.submit("normal-1")  # already queued
+
+    assert scheduler.queue_info("high")["position"] == 1
+    assert scheduler.queue_info("low")["position"] == 4
+    assert scheduler.queue_info("running") is None
+
+    for job_id in ["running", "high", "normal-1", "normal-2", "low"]:
+        wait_for(lambda: jobs.started[-1] == job_id)
+        jobs.finish(job_id)
+    assert jobs.started == ["running", "high", "normal-1", "normal-2", "low"]
+
+
+def test_head_of_queue_waits_for_budget_and_is_not_overtaken():
+    jobs = Jobs()
+    scheduler = JobScheduler(jobs, workers=3, memory_budget_mb=1000, cpu_budget=8)
+    scheduler.start()
+    scheduler.submit("a", resources={"memory_mb": 600, "cpu": 1})
+    wait_for(lambda: jobs.started == ["a"])
+    scheduler.submit("big", resources={"memory_mb": 600, "cpu": 1})
+    scheduler.submit("small", resources={"memory_mb": 100, "cpu": 1})
+
+    time.sleep(0.05)
+    # small would fit next to a, but big is ahead of it
+    assert jobs.started == ["a"]
+    assert scheduler.get_stats()["memory_reserved_mb"] == 600
+
+    jobs.finish("a")
+    wait_for(lambda: jobs.started == ["a", "big", "small"])
+    assert scheduler.get_stats()["memory_reserved_mb"] == 700
+    jobs.finish("big")
+    jobs.finish("small")
+
+
+def test_job_larger_than_the_budget_runs_alone():
+    jobs = Jobs()
+    scheduler = JobScheduler(jobs, workers=2, memory_budget_mb=1000, cpu_budget=8)
+    scheduler.start()
+    scheduler.submit("huge", resources={"memory_mb": 5000, "cpu": 1})
+    scheduler.submit("next", resources={"memory_mb": 100, "cpu": 1})
+
+    wait_for(lambda: jobs.started == ["huge"])
+    time.sleep(0.05)
+    assert jobs.started == ["huge"]
+    jobs.finish("huge")
+    wait_for(lambda: jobs.started == ["huge", "next"])
+    jobs.finish("next")
+
+
+def test_expected_start_follows_the_running_jobs_estimates():
+    jobs = Jobs()
+    scheduler = JobScheduler(jobs, workers=1)
+    scheduler.start()
+    scheduler.submit("a", resources={"expected_seconds": 100})
+    wait_for(lambda: jobs.started == ["a"])
+    scheduler.submit("b", resources={"expected_seconds": 50})
+    scheduler.submit("c", resources={"expected_seconds": 50})
+
+    assert scheduler.queue_info("b")["expected_start_seconds"] == 100
+    assert scheduler.queue_info("c")["expected_start_seconds"] == 150
+    for job_id in "abc":
+        wait_for(lambda: jobs.started[-1] == job_id)
+        jobs.finish(job_id)
@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def test_legacy_json_jobs_are_imported_once(tmp_path, store):
+    legacy_path = str(tmp_path / "jobs_data.json")
+    legacy_jobs = {
+        "done": {"status": "completed", "timestamp": 100, "video_hash": "a" * 64, "segments": [[0, 1]]},
+        "waiting": {"status": "queued", "created_at": 200, "script_text": "script"},
+        "running": {"status": "processing", "created_at": 150, "progress": {"percent": 40}},
+    }
+    with open(legacy_path, "w") as f:
+        json.dump(legacy_jobs, f)
+
+    assert store.import_json(legacy_path) == 3
+    assert not os.path.exists(legacy_path)
+    assert os.path.exists(legacy_path + ".imported")
+
+    assert store.count() == 3
+    done = store.load("done")
+    assert done["created_at"] == 100 and done["segments"] == [[0, 1]]
+    assert "segments" not in store.load("done", blobs=False)
+    assert list(store.load_by_status(("queued", "processing"))) == ["running", "waiting"]
+    assert store.load("running")["progress"] == {"percent": 40}
+    assert store.referenced_hashes() == {"a" * 64}
+
+
+def test_jobs_survive_reopening_the_store(tmp_path, store):
+    store.save("job", {"status": "queued", "created_at": 1, "analysis": "long text"})
+    store.save_progress("job", {"percent": 10})
+    store.save("job", {"status": "completed", "created_at": 1, "analysis": "long text"})
+
+    reopened = JobStore(str(tmp_path / "jobs.db"))
+    job = reopened.load("job")
+    assert job["status"] == "completed"
+    assert job["analysis"] == "long text"
+    assert reopened.load("missing") is None
+
+
+def test_cleanup_queries_and_delete(store):
+    store.save("old", {"status": "completed", "created_at": 10, "video_hash": "a" * 64, "segments": []})
+    store.save("new", {"status": "completed", "created_at": 20, "video_hash": "b" * 64})
+
+    assert list(store.created_before(15)) == ["old"]
+    store.delete(["old"])
+    assert store.load("old") is None
+    assert store.referenced_hashes() == {"b" * 64}
+    assert store.count() == 1
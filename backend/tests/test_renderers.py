@@ -0,0 +1,32 @@
+import pytest
+
+from renderers import StreamCopyUnavailable, covered_ranges, plan_smart_render_pieces, plan_stream_copy_cuts
+
+
+def test_stream_copy_cut_starts_snap_back_to_keyframes():
+    cuts = plan_stream_copy_cuts([(10, 20)], [0, 8, 16])
+    assert [(cut["start"], cut["end"], cut["drift"]) for cut in cuts] == [(8, 20, 2.0)]
+
+
+def test_touching_cut_snapped_into_previous_cut_is_merged():
+    cuts = plan_stream_copy_cuts([(10, 20), (20, 30)], [0, 8, 19.5, 28])
+    assert [(cut["start"], cut["end"]) for cut in cuts] == [(8, 30)]
+    assert cuts[0]["drift"] == 2.0
+    assert cuts[0]["merged"] == 1
+
+
+def test_cut_snapped_back_over_removed_footage_is_refused():
+    with pytest.raises(StreamCopyUnavailable):
+        plan_stream_copy_cuts([(10, 20), (20.5, 30)], [0, 8, 19.5, 28])
+
+
+def test_smart_render_copy_pieces_start_on_keyframes():
+    pieces = plan_smart_render_pieces([(7.98, 20), (3, 17)], [0, 8, 16])
+    assert [(p["kind"], p["start"], p["end"]) for p in pieces] == [
+        ("copy", 8, 16),
+        ("encode", 16, 20),
+        ("encode", 3, 8),
+        ("copy", 8, 16),
+        ("encode", 16, 17),
+    ]
+    assert covered_ranges(pieces) == [(8, 20), (3, 17)]
@@ -0,0 +1,38 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import segment_pool
+
+
+def test_segments_come_back_in_edit_order(monkeypatch, tmp_path):
+    def fake_encode(video_path, start, end, segment_path, threads, preset="medium", crf=None):
+        # Later segments finish first
+        time.sleep(0.05 * (3 - start))
+        return segment_path
+
+    pool = ThreadPoolExecutor(max_workers=3)
+    monkeypatch.setattr(segment_pool, "get_segment_pool", lambda: pool)
+    monkeypatch.setattr(segment_pool, "encode_segment", fake_encode)
+    try:
+        paths = segment_pool.encode_segments_parallel(
+            [("a.mp4", 0, 1), ("a.mp4", 1, 2), ("b.mp4", 2, 3)], str(tmp_path)
+        )
+    finally:
+        pool.shutdown()
+
+    assert paths == [str(tmp_path / f"segment_{i:04d}.mp4") for i in range(3)]
+
+
+def test_encoder_profile_preset_and_crf_are_passed(monkeypatch, tmp_path):
+    calls = []
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(segment_pool, "get_segment_pool", lambda: pool)
+    monkeypatch.setattr(segment_pool, "encode_segment", lambda *args: calls.append(args) or args[3])
+    try:
+        segment_pool.encode_segments_parallel(
+            [("a.mp4", 0, 1)], str(tmp_path), {"preset": "veryfast", "crf": 20}
+        )
+    finally:
+        pool.shutdown()
+
+    assert calls[0][5:] == ("veryfast", 20)
@@ -0,0 +1,19 @@
+from segment_utils import normalize_segments
+
+
+def test_long_segment_splits_into_equal_pieces():
+    edit_list, _ = normalize_segments([{"start_time": 0, "end_time": 10.5}], 20, max_length=5)
+    assert edit_list == [(0.0, 3.5), (3.5, 7.0), (7.0, 10.5)]
+
+
+def test_split_leaves_no_piece_shorter_than_min_length():
+    edit_list, stats = normalize_segments([{"start_time": 0, "end_time": 10.05}], 20, min_length=1, max_length=5)
+    assert len(edit_list) == 3
+    assert min(end - start for start, end in edit_list) >= 1
+    assert edit_list[-1][1] == 10.05
+    assert stats["output_seconds"] == 10.05
+
+
+def test_segment_at_max_length_is_not_split():
+    edit_list, _ = normalize_segments([{"start_time": 2, "end_time": 7}], 20, max_length=5)
+    assert edit_list == [(2.0, 7.0)]
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import silence_map
+from silence_map import build_remap, compute_levels, get_silence_map, remap_segments, to_source_times
+
+
+def test_build_remap_joins_ranges_back_to_back():
+    assert build_remap([(0, 10), (20, 30)]) == [[0.0, 0.0, 10.0], [10.0, 20.0, 10.0]]
+
+
+def test_times_inside_ranges_map_to_the_source():
+    remap = build_remap([(0, 10), (20, 30)])
+    assert to_source_times([5, 15], remap).tolist() == [5.0, 25.0]
+
+
+def test_segment_ending_on_a_join_stays_before_the_cut():
+    remap = build_remap([(0, 10), (20, 30)])
+    segments = remap_segments(
+        [{"start_time": 5, "end_time": 10}, {"start_time": 10, "end_time": 12}], remap
+    )
+    assert [(s["start_time"], s["end_time"]) for s in segments] == [(5.0, 10.0), (20.0, 22.0)]
+
+
+def fake_ffmpeg(tmp_path, seconds, status):
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!/bin/sh\nhead -c {int(seconds * 32000)} /dev/zero\nexit {status}\n")
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_failed_decode_raises_instead_of_returning_partial_levels(tmp_path):
+    with pytest.raises(RuntimeError):
+        compute_levels("video.mp4", fake_ffmpeg(tmp_path, 1, 1))
+
+
+def test_decode_levels_cover_the_audio(tmp_path):
+    levels, window_seconds = compute_levels("video.mp4", fake_ffmpeg(tmp_path, 1, 0))
+    assert len(levels) * window_seconds == pytest.approx(1.0)
+
+
+def test_truncated_decode_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(silence_map, "ANALYSIS_PROXY_DIR", str(tmp_path))
+    monkeypatch.setattr(silence_map, "probe_media", lambda *args: {"duration": 60.0, "audio_codecs": ["aac"]})
+    ffmpeg = fake_ffmpeg(tmp_path, 10, 0)
+
+    assert get_silence_map("video.mp4", "a" * 64, ffmpeg) is None
+    assert not os.path.exists(silence_map.silence_map_path("a" * 64))
+
+    monkeypatch.setattr(silence_map, "probe_media", lambda *args: {"duration": 10.0, "audio_codecs": ["aac"]})
+    result = get_silence_map("video.mp4", "a" * 64, ffmpeg)
+    assert result["duration"] == 10.0
+    assert result["silences"] == [(0.0, 10.0)]
+    assert os.path.exists(silence_map.silence_map_path("a" * 64))
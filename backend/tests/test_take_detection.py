@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from take_detection import BANDS, cluster_takes, filter_repeated_takes, fingerprints, repeated_spans, similar_pairs
+
+# Two takes of the same line: 10-15s was repeated at 30-35s, and 30-35s is better
+TAKE_MAP = {"clusters": [{"takes": [[10.0, 15.0], [30.0, 35.0]], "best": 1}], "rejected": [[10.0, 15.0]]}
+
+
+def test_detects_a_repeated_span():
+    # 60s of distinct 100 ms feature steps, with 10-15s repeated at 30-35s
+    energies = np.random.default_rng(0).standard_normal((600, BANDS)).astype(np.float32)
+    energies[300:350] = energies[100:150]
+    levels = np.full(600, -20, dtype=np.float32)
+
+    vectors, window_starts = fingerprints(energies, levels)
+    takes = cluster_takes(repeated_spans(similar_pairs(vectors, window_starts), window_starts))
+
+    assert len(takes) == 1
+    (first_start, first_end), (second_start, second_end) = takes[0]
+    assert (first_start, second_start) == (10.0, 30.0)
+    assert first_end == pytest.approx(15.0, abs=0.5) and second_end == pytest.approx(35.0, abs=0.5)
+
+
+def test_silent_repeats_are_not_takes():
+    energies = np.random.default_rng(0).standard_normal((600, BANDS)).astype(np.float32)
+    energies[300:350] = energies[100:150]
+    levels = np.full(600, -60, dtype=np.float32)
+
+    vectors, window_starts = fingerprints(energies, levels)
+    assert cluster_takes(repeated_spans(similar_pairs(vectors, window_starts), window_starts)) == []
+
+
+def test_segment_in_rejected_take_moves_onto_the_best_take():
+    segments = [{"start_time": 0, "end_time": 5}, {"start_time": 11, "end_time": 14}]
+    filtered, removed = filter_repeated_takes(segments, TAKE_MAP, 60)
+    assert [(s["start_time"], s["end_time"]) for s in filtered] == [(0, 5), (31.0, 34.0)]
+    assert removed == 1
+
+
+def test_segment_in_rejected_take_is_dropped_when_the_best_take_is_kept():
+    segments = [{"start_time": 11, "end_time": 14}, {"start_time": 30, "end_time": 35}]
+    filtered, removed = filter_repeated_takes(segments, TAKE_MAP, 60)
+    assert [(s["start_time"], s["end_time"]) for s in filtered] == [(30, 35)]
+    assert removed == 1
+
+
+def test_segment_mostly_outside_the_rejected_take_is_kept():
+    segments = [{"start_time": 5, "end_time": 12}]
+    filtered, removed = filter_repeated_takes(segments, TAKE_MAP, 60)
+    assert filtered == segments
+    assert removed == 0
@@ -0,0 +1,68 @@
+import hashlib
+import io
+
+import pytest
+
+import upload_sessions
+from upload_sessions import UploadError, create_session, finish_session, get_session, merge_ranges
+
+DATA = bytes(range(256)) * 40
+
+
+def put(session, offset, length):
+    return session.write_chunk(offset, length, io.BytesIO(DATA[offset:offset + length]))
+
+
+def test_merge_ranges_joins_touching_and_overlapping_ranges():
+    assert merge_ranges([[20, 30], [0, 10], [10, 15], [25, 40]]) == [[0, 15], [20, 40]]
+
+
+def test_upload_resumes_after_a_restart_and_finalizes(tmp_path):
+    session = create_session(str(tmp_path), "video.mp4", len(DATA))
+    put(session, 4096, len(DATA) - 4096)
+    assert session.to_dict()["received"] == [[4096, len(DATA)]]
+
+    # A restart loses the in-memory session; it is reloaded from its directory
+    upload_sessions._sessions.clear()
+    resumed = get_session(str(tmp_path), session.upload_id)
+    assert resumed is not session
+    assert resumed.received == [[4096, len(DATA)]]
+    with pytest.raises(UploadError) as error:
+        finish_session(resumed)
+    assert error.value.status_code == 409
+
+    state = put(resumed, 0, 4096)
+    assert state["complete"] and state["received_bytes"] == len(DATA)
+    assert resumed.content_hash() == hashlib.sha256(DATA).hexdigest()
+
+    path = finish_session(resumed)
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    with pytest.raises(UploadError) as error:
+        get_session(str(tmp_path), session.upload_id)
+    assert error.value.status_code == 404
+
+
+def test_chunks_outside_the_upload_or_after_completion_are_refused(tmp_path):
+    session = create_session(str(tmp_path), "video.mp4", len(DATA))
+    with pytest.raises(UploadError) as error:
+        put(session, len(DATA) - 10, 20)
+    assert error.value.status_code == 416
+
+    put(session, 0, len(DATA))
+    with pytest.raises(UploadError) as error:
+        put(session, 0, 10)
+    assert error.value.status_code == 409
+
+
+def test_stored_content_completes_the_session_without_any_chunks(tmp_path):
+    def link_existing(path):
+        with open(path, "wb") as f:
+            f.write(DATA)
+        return True
+
+    session = create_session(str(tmp_path), "video.mp4", len(DATA), link_existing=link_existing)
+    assert session.deduplicated and session.is_complete()
+    with pytest.raises(UploadError) as error:
+        put(session, 0, 10)
+    assert error.value.status_code == 409
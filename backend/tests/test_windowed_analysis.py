@@ -0,0 +1,47 @@
+import pytest
+
+import windowed_analysis
+from windowed_analysis import plan_analysis_windows, reconcile_window_segments, window_cores
+
+
+@pytest.fixture(autouse=True)
+def small_windows(monkeypatch):
+    monkeypatch.setattr(windowed_analysis, "ANALYSIS_WINDOWING", "auto")
+    monkeypatch.setattr(windowed_analysis, "ANALYSIS_WINDOW_SECONDS", 100.0)
+    monkeypatch.setattr(windowed_analysis, "ANALYSIS_WINDOW_OVERLAP", 10.0)
+
+
+def test_short_video_is_one_window():
+    assert plan_analysis_windows(100) == [(0.0, 100)]
+
+
+def test_long_video_gets_even_overlapping_windows():
+    windows = plan_analysis_windows(250)
+    assert windows == [(0.0, 90.0), (80.0, 170.0), (160.0, 250)]
+    assert window_cores(windows) == [(0.0, 85.0), (85.0, 165.0), (165.0, 250)]
+
+
+def test_windowing_off_keeps_one_window(monkeypatch):
+    monkeypatch.setattr(windowed_analysis, "ANALYSIS_WINDOWING", "off")
+    assert plan_analysis_windows(250) == [(0.0, 250)]
+
+
+def test_window_results_merge_onto_the_global_timeline():
+    windows = plan_analysis_windows(250)
+    results = [
+        {"segments_to_keep": [{"start_time": 10, "end_time": 20}, {"start_time": 82, "end_time": 88}],
+         "analysis": "first"},
+        # The same moment seen from the second window, which owns its midpoint (85s)
+        {"segments_to_keep": [{"start_time": 2, "end_time": 8}, {"start_time": 50, "end_time": 60}]},
+        {"segments_to_keep": [{"start_time": 80, "end_time": 95}, "not a segment"], "analysis": "third"},
+    ]
+
+    merged = reconcile_window_segments(windows, results, 250)
+
+    assert [(s["start_time"], s["end_time"]) for s in merged["segments_to_keep"]] == [
+        (10.0, 20.0),
+        (82.0, 88.0),
+        (130.0, 140.0),
+        (240.0, 250),
+    ]
+    assert merged["analysis"] == "[0s-90s] first\n[160s-250s] third"
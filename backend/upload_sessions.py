@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+# Largest chunk accepted by a single PUT
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get("UPLOAD_MAX_CHUNK_SIZE", 64 * 1024 * 1024))
+# Seconds an unfinished upload session is kept after its last chunk
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 86400))
+
+SESSION_FILE_NAME = "upload.json"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """Raised for invalid upload session requests; carries an HTTP status code."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or touching [start, end) byte ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class UploadSession:
+    """A resumable upload written in place into its job directory.
+
+    The target file is created at its final size up front, so chunks can be
+    written at their offsets in any order and in parallel. Received byte
+    ranges are persisted next to the file so uploads survive a restart.
+    The SHA-256 is computed over the contiguous prefix as it fills in, so
+    little is left to hash when the upload finishes.
+    """
+
+    def __init__(
+        self,
+        upload_id,
+        upload_dir,
+        filename,
+        size,
+        received=None,
+        updated_at=None,
+        expected_hash=None,
+        deduplicated=False,
+    ):
+        self.upload_id = upload_id
+        self.upload_dir = upload_dir
+        self.filename = filename
+        self.size = size
+        self.received = received or []
+        self.updated_at = updated_at or time.time()
+        # Hash the client announced; verified when the upload finishes
+        self.expected_hash = expected_hash
+        # True when the content was already stored and no bytes need to be sent
+        self.deduplicated = deduplicated
+        self.lock = threading.Lock()
+        self._hasher = hashlib.sha256()
+        self._hashed_offset = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.upload_dir, self.filename)
+
+    @property
+    def session_path(self):
+        return os.path.join(self.upload_dir, SESSION_FILE_NAME)
+
+    def received_bytes(self):
+        return sum(end - start for start, end in self.received)
+
+    def is_complete(self):
+        return self.received == [[0, self.size]] or self.size == 0
+
+    def to_dict(self):
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "received": self.received,
+            "received_bytes": self.received_bytes(),
+            "complete": self.is_complete(),
+            "deduplicated": self.deduplicated,
+            "chunk_size": UPLOAD_CHUNK_SIZE,
+        }
+
+    def save(self):
+        data = {
+            "filename": self.filename,
+            "size": self.size,
+            "received": self.received,
+            "updated_at": self.updated_at,
+            "expected_hash": self.expected_hash,
+            "deduplicated": self.deduplicated,
+        }
+        temp_file = self.session_path + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_file, self.session_path)
+
+    def write_chunk(self, offset, length, stream):
+        """Copy length bytes from stream into the file at offset, without buffering the chunk."""
+        # A deduplicated or complete upload's file is (or is about to become) a
+        # link to the shared blob, which every job with that content reads
+        if self.deduplicated or self.is_complete():
+            raise UploadError("Upload is already complete", 409)
+        if offset < 0 or length <= 0 or offset + length > self.size:
+            raise UploadError(f"Chunk {offset}+{length} is outside the {self.size} byte upload", 416)
+        if length > UPLOAD_MAX_CHUNK_SIZE:
+            raise UploadError(f"Chunks may be at most {UPLOAD_MAX_CHUNK_SIZE} bytes", 413)
+
+        written = 0
+        # Each request has its own handle, so parallel chunks don't share a file position
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            while written < length:
+                block = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+
+        if written != length:
+            raise UploadError(f"Chunk ended after {written} of {length} bytes", 400)
+
+        with self.lock:
+            self.received = merge_ranges(self.received + [[offset, offset + length]])
+            self.updated_at = time.time()
+            self.save()
+            self._advance_hash()
+        return self.to_dict()
+
+    def _advance_hash(self):
+        # Hash newly contiguous bytes; they were just written, so this reads from the page cache
+        if not self.received or self.received[0][0] != 0:
+            return
+        contiguous_end = self.received[0][1]
+        if contiguous_end <= self._hashed_offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._hashed_offset)
+            remaining = contiguous_end - self._hashed_offset
+            while remaining > 0:
+                block = f.read(min(COPY_BUFFER_SIZE, remaining))
+                if not block:
+                    break
+                self._hasher.update(block)
+                remaining -= len(block)
+        self._hashed_offset = contiguous_end - remaining
+
+    def content_hash(self):
+        """SHA-256 hex digest of the complete upload."""
+        with self.lock:
+            self._advance_hash()
+            return self._hasher.hexdigest()
+
+
+def create_session(upload_root, filename, size, expected_hash=None, link_existing=None):
+    """Start an upload session in a new directory under upload_root.
+
+    link_existing(path) may place already stored content at the upload's
+    path and return True, in which case the session is complete immediately.
+    """
+    if size < 0:
+        raise UploadError("Upload size must not be negative")
+
+    upload_id = str(uuid.uuid4())
+    upload_dir = os.path.join(upload_root, upload_id)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    session = UploadSession(upload_id, upload_dir, filename, size, expected_hash=expected_hash)
+    if link_existing and link_existing(session.path):
+        session.received = [[0, size]]
+        session.deduplicated = True
+    else:
+        # Allocate the full (sparse) file so chunks can land anywhere
+        with open(session.path, "wb") as f:
+            f.truncate(size)
+    session.save()
+
+    with _sessions_lock:
+        _sessions[upload_id] = session
+    return session
+
+
+def get_session(upload_root, upload_id):
+    """Return an upload session, reloading it from disk after a restart."""
+    with _sessions_lock:
+        session = _sessions.get(upload_id)
+        if session:
+            return session
+
+        upload_dir = os.path.join(upload_root, os.path.basename(upload_id))
+        try:
+            with open(os.path.join(upload_dir, SESSION_FILE_NAME), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Upload not found", 404)
+
+        session = UploadSession(
+            upload_id,
+            upload_dir,
+            data["filename"],
+            data["size"],
+            received=data.get("received"),
+            updated_at=data.get("updated_at"),
+            expected_hash=data.get("expected_hash"),
+            deduplicated=data.get("deduplicated", False),
+        )
+        _sessions[upload_id] = session
+        return session
+
+
+def finish_session(session):
+    """Close a complete upload session and return the path of the uploaded file."""
+    if not session.is_complete():
+        raise UploadError(
+            f"Upload incomplete: {session.received_bytes()} of {session.size} bytes received", 409
+        )
+    with _sessions_lock:
+        _sessions.pop(session.upload_id, None)
+    try:
+        os.remove(session.session_path)
+    except OSError:
+        pass
+    return session.path
+
+
+def expired_sessions(upload_root):
+    """Yield upload ids of unfinished sessions idle for longer than UPLOAD_SESSION_TTL."""
+    now = time.time()
+    try:
+        entries = os.listdir(upload_root)
+    except OSError:
+        return
+    for upload_id in entries:
+        session_path = os.path.join(upload_root, upload_id, SESSION_FILE_NAME)
+        try:
+            if now - os.path.getmtime(session_path) > UPLOAD_SESSION_TTL:
+                yield upload_id
+        except OSError:
+            continue
+
+
+def discard_session(upload_id):
+    with _sessions_lock:
+        _sessions.pop(upload_id, None)
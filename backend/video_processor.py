@@ -1,17 +1,36 @@
 import os
-import json
+import shutil
 import tempfile
-import time
-import re
-from typing import Dict, List
+from typing import Dict
 from moviepy.editor import VideoFileClip, concatenate_videoclips
-import google.generativeai as genai  # Import Gemini API
+from renderers import (
+    DEFAULT_RENDER_MODE,
+    FFMPEG_RENDER_MODES,
+    StreamCopyUnavailable,
+    get_ffprobe_path,
+    probe_video_stream,
+    render_edit,
+    render_preview,
+)
+from encoder_profiles import get_encoder_profile, moviepy_encoder_kwargs
+from segment_pool import encode_segments_parallel
+from segment_utils import normalize_segments
+from scratch_space import JobWorkspace, estimate_scratch_bytes
+from blob_store import file_sha256
+from gemini_governor import DEFAULT_PRIORITY
+from analysis_cache import analysis_cache_key, get_or_compute_analysis
+from analyzers import Analyzer, get_analyzer
+from silence_map import SILENCE_SNAP, get_silence_map, snap_segments
+from shot_index import get_shot_index, snap_segments_to_shots
+from take_detection import filter_repeated_takes, get_take_map
 
 # Import GPU utilities for video processing
 try:
     from gpu_utils import (
         detect_gpu_info,
         get_ffmpeg_gpu_args,
+        get_ffmpeg_encoder_args,
+        get_cpu_encoder_args,
         calculate_safe_memory_limit,
     )
 
@@ -54,20 +73,6 @@ except ImportError as e:
     GPU_INFO = None
     FFMPEG_PATH = None
 
-# Initialize Gemini API
-try:
-    print("Initializing Gemini API:")
-    gemini_api_key = os.environ.get("GEMINI_API_KEY", "")
-    print(f"  API Key: {'<set>' if gemini_api_key else '<not set>'}")
-
-    if gemini_api_key:
-        genai.configure(api_key=gemini_api_key)
-        print("Successfully initialized Gemini API")
-    else:
-        print("WARNING: Gemini API key not set, video processing with Gemini will not work")
-except Exception as e:
-    print(f"Error initializing Gemini API: {e}")
-
 FFMPEG_TIMEOUT = 600  # Timeout for FFmpeg in seconds (10 minutes)
 
 
@@ -108,13 +113,27 @@ def get_script_content(script_path):
         return None
 
 
-def concatenate_segments(segments, output_path, progress_callback=None):
+def concatenate_segments(
+    segments,
+    output_path,
+    progress_callback=None,
+    source_ranges=None,
+    encoder_profile=None,
+    workdir=None,
+):
     """Concatenate video segments into a final video. 
-    Uses GPU acceleration if available, otherwise falls back to CPU."""
+    Uses GPU acceleration if available, otherwise falls back to CPU.
+
+    source_ranges optionally lists (video_path, start, end) for each segment;
+    when given, segments are encoded in parallel on the shared process pool.
+    encoder_profile optionally sets the libx264 preset/CRF/threads.
+    Intermediate files go in a temporary directory under workdir (normally
+    the job's scratch workspace)."""
     
     # Temporary directory for segment files
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(dir=workdir)
     segment_files = []
+    encoder_kwargs = moviepy_encoder_kwargs(encoder_profile) if encoder_profile else {}
     
     try:
         # Check if we can use GPU acceleration
@@ -136,17 +155,23 @@ def concatenate_segments(segments, output_path, progress_callback=None):
             
             try:
                 # First, save individual segments
-                for i, segment in enumerate(segments):
-                    segment_path = os.path.join(temp_dir, f"segment_{i:04d}.mp4")
-                    segment.write_videofile(
-                        segment_path,
-                        codec="libx264",
-                        audio_codec="aac",
-                        temp_audiofile=os.path.join(temp_dir, f"temp_audio_{i}.m4a"),
-                        remove_temp=True,
-                        logger=None,
+                if source_ranges:
+                    segment_files = encode_segments_parallel(
+                        source_ranges, temp_dir, encoder_profile
                     )
-                    segment_files.append(segment_path)
+                else:
+                    for i, segment in enumerate(segments):
+                        segment_path = os.path.join(temp_dir, f"segment_{i:04d}.mp4")
+                        segment.write_videofile(
+                            segment_path,
+                            codec="libx264",
+                            audio_codec="aac",
+                            temp_audiofile=os.path.join(temp_dir, f"temp_audio_{i}.m4a"),
+                            remove_temp=True,
+                            logger=None,
+                            **encoder_kwargs,
+                        )
+                        segment_files.append(segment_path)
                 
                 # Create a file list for FFmpeg
                 file_list_path = os.path.join(temp_dir, "file_list.txt")
@@ -225,6 +250,7 @@ def concatenate_segments(segments, output_path, progress_callback=None):
                 temp_audiofile=os.path.join(temp_dir, "temp_audio.m4a"),
                 remove_temp=True,
                 logger=None,
+                **encoder_kwargs,
             )
             final_clip.close()
         
@@ -249,7 +275,135 @@ def concatenate_segments(segments, output_path, progress_callback=None):
             print(f"Error cleaning up temp directory: {e}")
 
 
-def create_final_video(video_path, segments, output_path=None, progress_callback=None):
+def get_encoder_args(encoder_profile=None):
+    """Return (input_args, output_args) for ffmpeg encodes, using the GPU when available."""
+    if not GPU_SUPPORT:
+        return None
+    if GPU_INFO and GPU_INFO.available:
+        return get_ffmpeg_encoder_args(GPU_INFO, encoder_profile)
+    return [], get_cpu_encoder_args(encoder_profile)
+
+
+def select_encoder_profile(video_path, size=None):
+    """Pick the calibrated encoder profile for a video's resolution."""
+    try:
+        if size is None:
+            stream = probe_video_stream(video_path, get_ffprobe_path(FFMPEG_PATH))
+            size = (stream.get("width"), stream.get("height"))
+        return get_encoder_profile(*size)
+    except Exception as e:
+        print(f"Error selecting encoder profile, using defaults: {e}")
+        return None
+
+
+def render_with_ffmpeg(
+    video_path,
+    ranges,
+    output_path,
+    render_mode,
+    allow_keyframe_snap=True,
+    encoder_profile=None,
+    workdir=None,
+    stream_dir=None,
+):
+    """Render with one of the ffmpeg-based modes ("copy", "smart", "filter", ...).
+
+    Returns the render report, or None if the mode doesn't apply to this
+    source (or failed) and the caller should re-encode with MoviePy.
+    """
+    if render_mode not in FFMPEG_RENDER_MODES:
+        return None
+
+    try:
+        print(f"Writing final video with '{render_mode}' renderer to {output_path}")
+        return render_edit(
+            render_mode,
+            video_path,
+            ranges,
+            output_path,
+            ffmpeg_path=FFMPEG_PATH,
+            allow_keyframe_snap=allow_keyframe_snap,
+            encoder_args=get_encoder_args(encoder_profile),
+            workdir=workdir,
+            stream_dir=stream_dir,
+        )
+    except StreamCopyUnavailable as e:
+        print(f"Render mode '{render_mode}' not possible ({e}), re-encoding with MoviePy")
+    except Exception as e:
+        print(f"Render mode '{render_mode}' failed ({e}), re-encoding with MoviePy")
+
+    return None
+
+
+def render_ranges(
+    video,
+    video_path,
+    ranges,
+    output_path,
+    render_mode,
+    allow_keyframe_snap=True,
+    encoder_profile=None,
+    workdir=None,
+    stream_dir=None,
+):
+    """Render the kept ranges of an open VideoFileClip to output_path.
+
+    Tries the ffmpeg renderer for render_mode first and falls back to
+    MoviePy re-encoding. Intermediate files are written under workdir and
+    HLS segments under stream_dir. Returns the render report.
+    """
+    render_report = render_with_ffmpeg(
+        video_path,
+        ranges,
+        output_path,
+        render_mode,
+        allow_keyframe_snap=allow_keyframe_snap,
+        encoder_profile=encoder_profile,
+        workdir=workdir,
+        stream_dir=stream_dir,
+    )
+    if render_report is not None:
+        return render_report
+
+    if stream_dir:
+        # The HLS render failed part-way; don't leave its segments to be streamed
+        shutil.rmtree(stream_dir, ignore_errors=True)
+
+    # Extract the video clips to keep and concatenate them
+    clips_to_keep = [video.subclip(start_time, end_time) for start_time, end_time in ranges]
+    final_clip = concatenate_videoclips(clips_to_keep)
+
+    # Write the final video
+    print(f"Writing final video to {output_path}")
+    final_clip.write_videofile(
+        output_path,
+        codec="libx264",
+        audio_codec="aac",
+        temp_audiofile=os.path.join(workdir or tempfile.gettempdir(), "temp-audio.m4a"),
+        remove_temp=True,
+        logger=None,
+        **(moviepy_encoder_kwargs(encoder_profile) if encoder_profile else {}),
+    )
+
+    # Close all clips
+    final_clip.close()
+    for clip in clips_to_keep:
+        clip.close()
+
+    return {
+        "mode": "reencode",
+        "requested_mode": render_mode,
+        "duration": sum(end_time - start_time for start_time, end_time in ranges),
+    }
+
+
+def create_final_video(
+    video_path,
+    segments,
+    output_path=None,
+    progress_callback=None,
+    render_mode=DEFAULT_RENDER_MODE,
+):
     """Create the final edited video from the segments."""
     if not output_path:
         filename = os.path.basename(video_path)
@@ -261,33 +415,73 @@ def create_final_video(video_path, segments, output_path=None, progress_callback
     
     print(f"Creating final video with {len(segments)} segments")
     
-    # Process and combine the segments
-    video_segments = []
-    
-    video = VideoFileClip(video_path)
-    for seg in segments:
-        start_time = seg["start"]
-        end_time = seg["end"]
-        video_segments.append(video.subclip(start_time, end_time))
-    
-    # Use the concatenate_segments function that handles GPU acceleration
-    concatenate_segments(video_segments, output_path, progress_callback)
-    
-    video.close()
+    ranges = [(seg["start"], seg["end"]) for seg in segments]
+    encoder_profile = select_encoder_profile(video_path)
+
+    with JobWorkspace(estimated_bytes=estimate_scratch_bytes(video_path)) as workspace:
+        if render_with_ffmpeg(
+            video_path,
+            ranges,
+            output_path,
+            render_mode,
+            encoder_profile=encoder_profile,
+            workdir=workspace.path,
+        ) is not None:
+            return output_path
+
+        # Process and combine the segments
+        video_segments = []
+
+        video = VideoFileClip(video_path)
+        for start_time, end_time in ranges:
+            video_segments.append(video.subclip(start_time, end_time))
+
+        # Use the concatenate_segments function that handles GPU acceleration
+        source_ranges = [(video_path, start, end) for start, end in ranges]
+        concatenate_segments(
+            video_segments,
+            output_path,
+            progress_callback,
+            source_ranges=source_ranges,
+            encoder_profile=encoder_profile,
+            workdir=workspace.path,
+        )
+
+        video.close()
+
     return output_path
 
 
 def process_video_with_gemini(
-    video_path: str, script_text: str, update_progress_callback=None, job_id=None
+    video_path: str,
+    script_text: str,
+    update_progress_callback=None,
+    job_id=None,
+    render_mode: str = DEFAULT_RENDER_MODE,
+    allow_keyframe_snap: bool = True,
+    preview_callback=None,
+    stream_dir=None,
+    video_hash=None,
+    priority: str = DEFAULT_PRIORITY,
+    analyzer=None,
 ) -> Dict:
     """
-    Process a video using Gemini to identify segments that match a script.
+    Process a video using an analyzer (Gemini by default) to identify segments that match a script.
 
     Args:
         video_path: Path to the video file
         script_text: The script text to use for editing
         update_progress_callback: Optional callback for progress updates
         job_id: Optional job ID for tracking
+        render_mode: "reencode" (MoviePy), or an ffmpeg renderer: "copy",
+            "smart", "filter", "chunked" or "hls"
+        allow_keyframe_snap: Whether "copy" may move cuts back to keyframes
+        preview_callback: Optional callback(job_id, preview_path) called once a
+            low-resolution preview is rendered; returning False skips the full render
+        stream_dir: Directory for the playlist and segments of the "hls" mode
+        video_hash: SHA-256 of the video, if already known
+        priority: Priority of the job's Gemini calls: "high", "normal" or "low"
+        analyzer: Analyzer instance or name ("gemini" or "local"); defaults to ANALYZER
 
     Returns:
         Dict containing the processing results
@@ -308,136 +502,38 @@ def process_video_with_gemini(
             f"Video properties: duration={video_duration}s, fps={fps}, resolution={width}x{height}"
         )
 
-        if update_progress_callback:
-            update_progress_callback(job_id, 2, 5, "Uploading video to Gemini")
-
-        # Extract a unique identifier based on the video path and content
-        video_basename = os.path.basename(video_path)
-        display_name = f"{video_basename}-{int(time.time())}"
-
-        # Check if the video is already uploaded
-        video_file = None
-        try:
-            fileList = genai.list_files(page_size=100)
-            video_file = next(
-                (
-                    f
-                    for f in fileList
-                    if f.display_name and video_basename in f.display_name
-                ),
-                None,
-            )
-            if video_file:
-                print(f"Found previously uploaded video: {video_file.display_name}")
-                print(f"File URI: {video_file.uri}")
-        except Exception as e:
-            print(f"Error checking for existing file: {e}")
-            video_file = None
-
-        # Upload video file if not already uploaded
-        if video_file is None:
-            print(f"Uploading video: {video_path}")
-            video_file = genai.upload_file(
-                path=video_path, display_name=display_name, resumable=True
+        # Ask the analyzer for the segments, unless this video, script, model and prompt were analysed before
+        video_hash = video_hash or file_sha256(video_path)
+        if not isinstance(analyzer, Analyzer):
+            analyzer = get_analyzer(analyzer, FFMPEG_PATH)
+        video_info = {"duration": video_duration, "width": width, "height": height, "fps": fps}
+        analysis_reports = {}
+        # Planned once, so the cache key describes the analysis that is run
+        analysis_plan = analyzer.plan(video_path, video_hash, video_info)
+        cache_identity = analyzer.cache_identity(video_info, analysis_plan)
+        executed_plans = []
+
+        def run_analysis():
+            segments_data, reports = analyzer.analyze(
+                video_path, video_hash, video_info, script_text,
+                update_progress_callback, job_id, priority, analysis_plan,
             )
-            print(f"Completed upload: {video_file.uri}")
-
-        # Check the state of the uploaded file
-        print("Waiting for video processing to complete...")
-        while video_file.state.name == "PROCESSING":
-            print(".", end="", flush=True)
-            time.sleep(5)
-            video_file = genai.get_file(video_file.name)
-
-        if video_file.state.name == "FAILED":
-            raise ValueError(f"Video processing failed: {video_file.state.name}")
-
-        print(f"\nVideo processing complete. State: {video_file.state.name}")
-
-        if update_progress_callback:
-            update_progress_callback(job_id, 3, 5, "Analyzing video with Gemini AI")
-
-        # Prepare the prompt for Gemini
-        prompt = f"""
-        You are an expert video editor AI. I have a video that needs to be edited according to a script.
-
-        # VIDEO INFORMATION
-        Duration: {video_duration} seconds
-        Resolution: {width}x{height}
-        FPS: {fps}
-
-        # SCRIPT TO FOLLOW
-        {script_text or "No specific script provided. Please identify the most interesting, informative, or engaging segments of this video."}
-
-        # YOUR TASK
-        1. Analyze the video I'm providing
-        2. Find the parts of the video that match my script
-        3. Return PRECISE timestamps for the segments to keep
-        
-        # IMPORTANT INSTRUCTIONS
-        - Be VERY precise with timestamps
-        - I need exact start and end times in seconds
-        - Only include segments that clearly match the script
-        - Segments should have logical start/end points
-        - If uncertain, provide more context by extending segments
-        - STRICT REPETITION RULE: If two segments contain similar or identical content (like someone saying the same thing twice), you MUST select only one of them - preferably the clearest, best-performed version
-        - CRITICAL: Never include multiple segments where the same information is repeated, even if phrased slightly differently
-        - DO NOT include both "Hello, I'm John" and "My name is John" - these express the same information
-        - Choose quality over quantity: One good segment is better than multiple repetitive ones
-
-        # RESPONSE FORMAT
-        Return ONLY a valid JSON object with this structure:
-        {{
-            "segments_to_keep": [
-                {{
-                    "start_time": start_time_in_seconds,
-                    "end_time": end_time_in_seconds,
-                    "description": "Explanation of why this segment matches the script"
-                }}
-            ],
-            "analysis": "Your analysis of how well the video matches the script"
-        }}
-        """
-
-        # Call Gemini API with the whole video file
-        print("Making LLM inference request...")
-        model = genai.GenerativeModel(model_name="models/gemini-1.5-pro-latest")
-        response = model.generate_content(
-            [video_file, prompt], request_options={"timeout": 600}
-        )
-
-        if update_progress_callback:
-            update_progress_callback(job_id, 4, 5, "Processing Gemini's analysis")
-
-        # Parse the response to get the segments to keep
-        response_text = response.text
-        print(f"Response from Gemini (first 200 chars): {response_text[:200]}...")
-
-        # Extract JSON from the response (in case there's any text before or after)
-        json_match = re.search(r"({[\s\S]*})", response_text)
-        if json_match:
-            json_str = json_match.group(1)
-            try:
-                segments_data = json.loads(json_str)
-                print(
-                    f"Successfully parsed JSON with keys: {list(segments_data.keys())}"
-                )
-            except json.JSONDecodeError as e:
-                print(f"JSON parse error: {e}")
-                # Try to fix common JSON formatting issues
-                json_str = json_str.replace(
-                    "'", '"'
-                )  # Replace single quotes with double quotes
-                try:
-                    segments_data = json.loads(json_str)
-                    print("Successfully parsed JSON after fixing quotes")
-                except:
-                    raise ValueError(
-                        f"Could not parse JSON from Gemini response: {json_str[:200]}..."
-                    )
+            executed_plans.append(reports.pop("analysis_plan", analysis_plan))
+            analysis_reports.update(reports)
+            return {
+                "segments_to_keep": segments_data.get("segments_to_keep", []),
+                "analysis": segments_data.get("analysis", ""),
+            }
+
+        def ran_as_planned(value):
+            # e.g. the trim failed and the whole video was analysed: don't file it under the trimmed key
+            return analyzer.cache_identity(video_info, executed_plans[-1]) == cache_identity
+
+        if cache_identity:
+            cache_key = analysis_cache_key(video_hash, script_text, *cache_identity)
+            segments_data, cache_report = get_or_compute_analysis(cache_key, run_analysis, ran_as_planned)
         else:
-            # Fallback if no valid JSON found
-            raise ValueError("Could not extract valid JSON from Gemini response")
+            segments_data, cache_report = run_analysis(), None
 
         if update_progress_callback:
             update_progress_callback(job_id, 5, 5, "Creating edited video")
@@ -452,63 +548,51 @@ def process_video_with_gemini(
                 f"Segment {i+1}: {segment.get('start_time', 'N/A')}-{segment.get('end_time', 'N/A')}: {segment.get('description', 'No description')}"
             )
 
-        # Extract the video clips to keep
-        clips_to_keep = []
-        for segment in segments_to_keep:
-            # Handle different possible key names
-            start_time = segment.get("start_time", segment.get("start", 0))
-            end_time = segment.get("end_time", segment.get("end", 0))
-
-            # Convert to float if they're strings
-            if isinstance(start_time, str):
-                try:
-                    start_time = float(start_time)
-                except ValueError:
-                    print(f"Warning: Invalid start_time format: {start_time}, using 0")
-                    start_time = 0
-
-            if isinstance(end_time, str):
-                try:
-                    end_time = float(end_time)
-                except ValueError:
-                    print(
-                        f"Warning: Invalid end_time format: {end_time}, using video duration"
-                    )
-                    end_time = video_duration
-
-            # Ensure times are within video bounds
-            start_time = max(0, float(start_time))
-            end_time = min(video_duration, float(end_time))
-
-            # Make sure end time is greater than start time
-            if start_time >= end_time:
-                print(
-                    f"Warning: Invalid segment times {start_time}-{end_time}, skipping"
-                )
-                continue
-
-            # Add a small buffer if the segment is very short
-            if end_time - start_time < 1.0:
-                buffer = 0.5
-                start_time = max(0, start_time - buffer)
-                end_time = min(video_duration, end_time + buffer)
-                print(f"Extended short segment to {start_time}-{end_time}")
+        # Drop segments that repeat a better take, or move them onto it
+        edit_segments = segments_to_keep
+        repeated_takes_removed = 0
+        take_map = get_take_map(video_path, video_hash, FFMPEG_PATH)
+        if take_map:
+            edit_segments, repeated_takes_removed = filter_repeated_takes(
+                edit_segments, take_map, video_duration
+            )
+            print(f"Replaced or removed {repeated_takes_removed} segments repeating another take")
+
+        # Move cut points onto nearby shot boundaries (built once per video and reused)
+        locked_edges = None
+        shot_snapped_edges = 0
+        shot_index = get_shot_index(video_path, video_hash, FFMPEG_PATH)
+        if shot_index:
+            edit_segments, locked_edges = snap_segments_to_shots(edit_segments, shot_index, video_duration)
+            shot_snapped_edges = sum(start + end for start, end in locked_edges)
+            print(f"Snapped {shot_snapped_edges} segment edges to shot boundaries")
+
+        # Move the remaining cut points into nearby silence so they don't clip words
+        silence_snapped_edges = 0
+        if SILENCE_SNAP == "on":
+            silence_map = get_silence_map(video_path, video_hash, FFMPEG_PATH)
+            edit_segments, silence_snapped_edges = snap_segments(
+                edit_segments, silence_map, video_duration, locked_edges
+            )
+            print(f"Snapped {silence_snapped_edges} segment edges to silence")
 
-            print(f"Extracting clip from {start_time:.2f}s to {end_time:.2f}s")
-            clip = video.subclip(start_time, end_time)
-            clips_to_keep.append(clip)
+        # Sort, merge and clamp the segments into a compact edit list
+        ranges_to_keep, edit_stats = normalize_segments(edit_segments, video_duration)
+        edit_stats["repeated_takes_removed"] = repeated_takes_removed
+        edit_stats["shot_snapped_edges"] = shot_snapped_edges
+        edit_stats["silence_snapped_edges"] = silence_snapped_edges
+        print(
+            f"Normalized {edit_stats['input_segments']} segments into {edit_stats['output_segments']} ranges "
+            f"({edit_stats['merged_segments']} merged, {edit_stats['invalid_segments']} invalid, "
+            f"{edit_stats['duplicate_seconds_removed']}s of duplicate render time removed)"
+        )
+        for start_time, end_time in ranges_to_keep:
+            print(f"Keeping range {start_time:.2f}s to {end_time:.2f}s")
 
-        # If no segments to keep, return an error
-        if not clips_to_keep:
+        # If no segments to keep, fall back to the entire video
+        if not ranges_to_keep:
             print("No valid segments identified, using entire video")
-            # Fallback to keeping the entire video
-            clip = video.subclip(0, video_duration)
-            clips_to_keep = [clip]
-
-        # Concatenate the clips
-        from moviepy.editor import concatenate_videoclips
-
-        final_clip = concatenate_videoclips(clips_to_keep)
+            ranges_to_keep = [(0, video_duration)]
 
         # Generate output path
         output_filename = f"processed_{os.path.basename(video_path)}"
@@ -517,21 +601,59 @@ def process_video_with_gemini(
         os.makedirs(processed_dir, exist_ok=True)
         output_path = os.path.join(processed_dir, output_filename)
 
-        # Write the final video
-        print(f"Writing final video to {output_path}")
-        final_clip.write_videofile(
-            output_path,
-            codec="libx264",
-            audio_codec="aac",
-            temp_audiofile="temp-audio.m4a",
-            remove_temp=True,
-            logger=None,
+        # Pick the fastest calibrated encoder settings for this resolution
+        encoder_profile = select_encoder_profile(video_path, (width, height))
+        if encoder_profile:
+            print(f"Using encoder profile {encoder_profile['name']} ({encoder_profile['resolution_class']})")
+
+        # Render a quick preview first so the edit can be checked (and rejected) early
+        if preview_callback:
+            preview_path = os.path.join(processed_dir, f"preview_{job_id or 'video'}.mp4")
+            try:
+                with JobWorkspace(job_id) as workspace:
+                    render_preview(
+                        video_path,
+                        ranges_to_keep,
+                        preview_path,
+                        ffmpeg_path=FFMPEG_PATH,
+                        workdir=workspace.path,
+                    )
+                print(f"Preview saved to {preview_path}")
+            except Exception as e:
+                print(f"Error rendering preview, continuing with full render: {e}")
+                preview_path = None
+
+            if preview_path and preview_callback(job_id, preview_path) is False:
+                print("Preview rejected, skipping full render")
+                video.close()
+                return {
+                    "status": "rejected",
+                    "message": "Full render skipped because the preview was rejected",
+                    "segments": segments_to_keep,
+                    "analysis": segments_data.get("analysis", ""),
+                    "edit_stats": edit_stats,
+                }
+
+        # Render in a private scratch workspace sized to the kept footage
+        kept_fraction = (
+            sum(end - start for start, end in ranges_to_keep) / video_duration
+            if video_duration
+            else 1.0
         )
+        with JobWorkspace(job_id, estimate_scratch_bytes(video_path, kept_fraction)) as workspace:
+            render_report = render_ranges(
+                video,
+                video_path,
+                ranges_to_keep,
+                output_path,
+                render_mode,
+                allow_keyframe_snap=allow_keyframe_snap,
+                encoder_profile=encoder_profile,
+                workdir=workspace.path,
+                stream_dir=stream_dir,
+            )
+            render_report["scratch"] = workspace.report()
 
-        # Close all clips
-        final_clip.close()
-        for clip in clips_to_keep:
-            clip.close()
         video.close()
 
         # Return success with the processing results
@@ -540,9 +662,15 @@ def process_video_with_gemini(
             "output_path": output_path,
             "segments": segments_to_keep,
             "analysis": segments_data.get("analysis", ""),
+            "render": render_report,
+            "edit_stats": edit_stats,
+            "encoder_profile": encoder_profile,
+            "analyzer": analyzer.name,
+            "analysis_cache": cache_report,
+            **analysis_reports,
             "duration": {
                 "original": video_duration,
-                "processed": sum(clip.duration for clip in clips_to_keep),
+                "processed": render_report["duration"],
             },
         }
 
@@ -557,17 +685,31 @@ def process_video_with_script(
     script_path=None,
     job_id=None,
     update_progress_callback=None,
+    render_mode=DEFAULT_RENDER_MODE,
+    allow_keyframe_snap=True,
+    preview_callback=None,
+    stream_dir=None,
+    video_hash=None,
+    priority=DEFAULT_PRIORITY,
+    analyzer=None,
 ):
-    """Process a video according to a script using Gemini."""
+    """Process a video according to a script using the configured analyzer."""
 
     # Get script content from file if provided
     if script_path and not script_text:
         script_text = get_script_content(script_path)
 
-    # Use the Gemini processing function
+    # Use the analyzer-driven processing function
     return process_video_with_gemini(
         video_path=video_path,
         script_text=script_text,
         update_progress_callback=update_progress_callback,
         job_id=job_id,
+        render_mode=render_mode,
+        allow_keyframe_snap=allow_keyframe_snap,
+        preview_callback=preview_callback,
+        stream_dir=stream_dir,
+        video_hash=video_hash,
+        priority=priority,
+        analyzer=analyzer,
     )
@@ -0,0 +1,84 @@
+import os
+
+from segment_utils import coerce_segment_times
+
+# "auto" analyses videos longer than one window in overlapping windows, "off" never does
+ANALYSIS_WINDOWING = os.environ.get("ANALYSIS_WINDOWING", "auto").lower()
+# Longest window (seconds) sent in one request
+ANALYSIS_WINDOW_SECONDS = float(os.environ.get("ANALYSIS_WINDOW_SECONDS", "600"))
+# Seconds shared by neighbouring windows, so content at a boundary is seen whole
+ANALYSIS_WINDOW_OVERLAP = float(os.environ.get("ANALYSIS_WINDOW_OVERLAP", "30"))
+# Input tokens a window may use, and what a second of video (frames + audio) costs
+ANALYSIS_WINDOW_TOKEN_BUDGET = int(os.environ.get("ANALYSIS_WINDOW_TOKEN_BUDGET", 200000))
+GEMINI_TOKENS_PER_SECOND = int(os.environ.get("GEMINI_TOKENS_PER_SECOND", 300))
+# Windows analysed at the same time and retries per failed window
+ANALYSIS_WINDOW_WORKERS = int(os.environ.get("ANALYSIS_WINDOW_WORKERS", 4))
+ANALYSIS_WINDOW_RETRIES = int(os.environ.get("ANALYSIS_WINDOW_RETRIES", 2))
+
+# Tokens reserved for the prompt (including the script) and the response
+PROMPT_TOKEN_RESERVE = 8000
+
+
+def window_seconds():
+    """Window length allowed by both ANALYSIS_WINDOW_SECONDS and the token budget."""
+    budget_seconds = (ANALYSIS_WINDOW_TOKEN_BUDGET - PROMPT_TOKEN_RESERVE) / GEMINI_TOKENS_PER_SECOND
+    return max(2 * ANALYSIS_WINDOW_OVERLAP + 1, min(ANALYSIS_WINDOW_SECONDS, budget_seconds))
+
+
+def plan_analysis_windows(duration):
+    """Split [0, duration] into overlapping (start, end) windows.
+
+    Returns a single window covering the whole video when windowing is off
+    or the video fits in one window. Windows are evenly sized so the last
+    one isn't a short remainder.
+    """
+    length = window_seconds()
+    if ANALYSIS_WINDOWING == "off" or duration <= length:
+        return [(0.0, duration)]
+
+    step = length - ANALYSIS_WINDOW_OVERLAP
+    count = int(-(-(duration - ANALYSIS_WINDOW_OVERLAP) // step))
+    step = (duration - ANALYSIS_WINDOW_OVERLAP) / count
+    length = step + ANALYSIS_WINDOW_OVERLAP
+    return [(i * step, min(duration, i * step + length)) for i in range(count)]
+
+
+def window_cores(windows):
+    """The part of each window it is authoritative for: overlaps are split at their midpoint."""
+    cores = []
+    for i, (start, end) in enumerate(windows):
+        core_start = (start + windows[i - 1][1]) / 2 if i > 0 else start
+        core_end = (end + windows[i + 1][0]) / 2 if i + 1 < len(windows) else end
+        cores.append((core_start, core_end))
+    return cores
+
+
+def reconcile_window_segments(windows, window_results, video_duration):
+    """Merge per-window analyses into one analysis on the global timeline.
+
+    Window timestamps are offset by the window start. A segment reported
+    from an overlap is kept only from the window whose core contains the
+    segment's midpoint, so the same moment isn't selected twice; segments
+    that continue across a boundary are joined later by normalize_segments.
+    """
+    segments = []
+    analyses = []
+    for (start, end), (core_start, core_end), result in zip(
+        windows, window_cores(windows), window_results
+    ):
+        for segment in result.get("segments_to_keep", []):
+            if not isinstance(segment, dict):
+                continue
+            local_start, local_end = coerce_segment_times(segment, end - start)
+            global_start = min(video_duration, start + max(0.0, local_start))
+            global_end = min(end, start + local_end)
+            midpoint = (global_start + global_end) / 2
+            if not core_start <= midpoint < core_end and not (midpoint == core_end == video_duration):
+                continue
+            segments.append(dict(segment, start_time=global_start, end_time=global_end))
+
+        if result.get("analysis"):
+            analyses.append(f"[{start:.0f}s-{end:.0f}s] {result['analysis']}")
+
+    segments.sort(key=lambda segment: segment["start_time"])
+    return {"segments_to_keep": segments, "analysis": "\n".join(analyses)}
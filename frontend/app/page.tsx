@@ -8,6 +8,7 @@ import { Card, Spinner, Button } from 'react-bootstrap';
 import axios from 'axios';
 import UploadForm from '../components/UploadForm';
 import ProcessingStatus, { JobStatus } from '../components/ProcessingStatus';
+import { uploadInChunks, clearUploadSession } from '../utils/chunkedUpload';
 import FeaturesSection from '../components/FeaturesSection';
 import HowItWorks from '../components/HowItWorks';
 import { useAuth } from '../context/AuthContext';
@@ -33,6 +34,7 @@ export default function Home(): React.ReactElement {
   const [jobStatus, setJobStatus] = useState<JobStatus>('queued');
   const [errorMessage, setErrorMessage] = useState<string | null>(null);
   const [downloadUrl, setDownloadUrl] = useState<string | null>(null);
+  const [previewUrl, setPreviewUrl] = useState<string | null>(null);
   const [showForm, setShowForm] = useState(true);
   const [debugInfo, setDebugInfo] = useState<string | null>(null);
   const [progressInfo, setProgressInfo] = useState<ProgressInfo | null>(null);
@@ -121,7 +123,10 @@ export default function Home(): React.ReactElement {
     localStorage.setItem(STORAGE_KEY_DOWNLOAD_URL, '/api/download/test-job-id');
   };
 
-  const handleUploadStart = async (formData: FormData): Promise<void> => {
+  const handleUploadStart = async (
+    formData: FormData,
+    onUploadProgress?: (percent: number) => void
+  ): Promise<void> => {
     try {
       // Cancel any existing polling
       if (pollingCancelRef.current) {
@@ -129,11 +134,11 @@ export default function Home(): React.ReactElement {
         pollingCancelRef.current = null;
       }
       
-      setShowForm(false);
       setJobStatus('queued');
       setDebugInfo(null);
       setProgressInfo(null);
       setDownloadUrl(null);
+      setPreviewUrl(null);
       
       // Clear any previous job from localStorage
       localStorage.removeItem(STORAGE_KEY_JOB_ID);
@@ -143,8 +148,16 @@ export default function Home(): React.ReactElement {
       // Log the form data for debugging
       console.log('Form data keys:', Array.from(formData.keys()));
       
-      const response = await axios.post('/api/upload', formData);
+      // Send the video in resumable chunks, then turn the upload into a job
+      const videoFile = formData.get('video') as File;
+      formData.delete('video');
+      const uploadId = await uploadInChunks(videoFile, onUploadProgress);
+      // Ask for a preview that can be rejected before the full-quality render
+      formData.append('preview', 'true');
+      const response = await axios.post(`/api/uploads/${uploadId}/finalize`, formData);
       const data = response.data;
+      clearUploadSession(videoFile);
+      setShowForm(false);
       
       console.log('Upload response:', data);
       setDebugInfo(`Job ID: ${data.job_id}, Status: ${data.status}`);
@@ -193,6 +206,17 @@ export default function Home(): React.ReactElement {
     }
   };
 
+  // Reject the preview so the backend skips the full-quality render
+  const handleRejectPreview = async () => {
+    if (!currentJobId) return;
+    try {
+      await axios.post(`/api/preview/${currentJobId}`, { decision: 'reject' });
+      setPreviewUrl(null);
+    } catch (error) {
+      console.error('Error rejecting preview:', error);
+    }
+  };
+
   const startPolling = (jobId: string): (() => void) => {
     let isCancelled = false;
     
@@ -205,17 +229,25 @@ export default function Home(): React.ReactElement {
         
         console.log('Status update:', statusData);
         
+        // A rejected preview ends the job without a full render
+        const status = statusData.status === 'rejected' ? 'failed' : statusData.status;
+        
         // Update state with the latest status
-        setJobStatus(statusData.status as JobStatus);
+        setJobStatus(status as JobStatus);
         
         // Store status in localStorage
-        localStorage.setItem(STORAGE_KEY_JOB_STATUS, statusData.status);
+        localStorage.setItem(STORAGE_KEY_JOB_STATUS, status);
         
         // Update progress information if available
         if (statusData.progress) {
           setProgressInfo(statusData.progress);
         }
         
+        // Show the low-resolution preview as soon as it is rendered
+        if (statusData.preview_url && statusData.preview_decision !== 'rejected') {
+          setPreviewUrl(statusData.preview_url);
+        }
+        
         if (statusData.status === 'completed') {
           const downloadUrl = statusData.download_url || `/api/download/${jobId}`;
           setDownloadUrl(downloadUrl);
@@ -225,7 +257,7 @@ export default function Home(): React.ReactElement {
           
           // We can stop polling now
           return;
-        } else if (statusData.status === 'failed') {
+        } else if (status === 'failed') {
           setErrorMessage(statusData.error || 'Unknown error occurred');
           // We can stop polling now
           return;
@@ -261,6 +293,7 @@ export default function Home(): React.ReactElement {
     setJobStatus('queued');
     setErrorMessage(null);
     setDownloadUrl(null);
+    setPreviewUrl(null);
     setShowForm(true);
     setDebugInfo(null);
     setProgressInfo(null);
@@ -365,6 +398,8 @@ export default function Home(): React.ReactElement {
                           status={jobStatus} 
                           errorMessage={errorMessage || undefined}
                           progress={progressInfo} 
+                          previewUrl={previewUrl || undefined}
+                          onRejectPreview={handleRejectPreview}
                         />
                       )}
                       
@@ -1,5 +1,6 @@
 import React, { useCallback, useState, useEffect } from 'react';
 import { useDropzone } from 'react-dropzone';
+import { ProgressBar } from 'react-bootstrap';
 import { FaCloudUploadAlt, FaFileVideo, FaFileAlt, FaCheckCircle, FaTimes, FaFilePdf, FaFileWord } from 'react-icons/fa';
 
 interface FileDropzoneProps {
@@ -11,6 +12,7 @@ interface FileDropzoneProps {
   label: string;
   file: File | null;
   maxSize?: number; // Optional max size prop with default value set in component
+  uploadProgress?: number | null; // Percent of the file sent so far while uploading
 }
 
 const FileDropzone: React.FC<FileDropzoneProps> = ({ 
@@ -19,7 +21,8 @@ const FileDropzone: React.FC<FileDropzoneProps> = ({
   icon, 
   label, 
   file,
-  maxSize = 500 * 1024 * 1024 // Default to 500MB for video, can be overridden by props
+  maxSize = 500 * 1024 * 1024, // Default to 500MB for video, can be overridden by props
+  uploadProgress = null
 }) => {
   const [isDragActive, setIsDragActive] = useState(false);
   const [uploadTimer, setUploadTimer] = useState<NodeJS.Timeout | null>(null);
@@ -144,6 +147,14 @@ const FileDropzone: React.FC<FileDropzoneProps> = ({
           </button>
         </div>
       )}
+      
+      {file && uploadProgress !== null && (
+        <ProgressBar 
+          now={uploadProgress} 
+          className="mt-2" 
+          label={`${Math.round(uploadProgress)}%`}
+        />
+      )}
     </div>
   );
 };
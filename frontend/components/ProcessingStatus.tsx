@@ -18,6 +18,8 @@ interface ProcessingStatusProps {
   errorMessage?: string;
   progress?: ProgressInfo | null;
   downloadUrl?: string;
+  previewUrl?: string;
+  onRejectPreview?: () => void;
   onStartOver?: () => void;
 }
 
@@ -26,6 +28,8 @@ const ProcessingStatus: React.FC<ProcessingStatusProps> = ({
   errorMessage, 
   progress,
   downloadUrl,
+  previewUrl,
+  onRejectPreview,
   onStartOver
 }) => {
   const [progressValue, setProgressValue] = useState(0);
@@ -306,6 +310,21 @@ const ProcessingStatus: React.FC<ProcessingStatusProps> = ({
           </div>
         )}
         
+        {/* Low-resolution preview of the edit while the full render runs */}
+        {status === 'processing' && previewUrl && (
+          <div className="preview-container text-center mt-4">
+            <video src={previewUrl} controls className="w-100" />
+            {onRejectPreview && (
+              <button 
+                className="btn btn-outline-secondary mt-2"
+                onClick={onRejectPreview}
+              >
+                Reject Edit
+              </button>
+            )}
+          </div>
+        )}
+        
         {/* Processing steps section - Only show during processing */}
         {status === 'processing' && (
           <div className="steps-container">
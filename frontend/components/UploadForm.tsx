@@ -4,7 +4,7 @@ import { FaRocket, FaVideo, FaFileAlt, FaRobot } from 'react-icons/fa';
 import FileDropzone from './FileDropzone';
 
 interface UploadFormProps {
-  onUploadStart: (formData: FormData) => Promise<void>;
+  onUploadStart: (formData: FormData, onUploadProgress?: (percent: number) => void) => Promise<void>;
 }
 
 const UploadForm: React.FC<UploadFormProps> = ({ onUploadStart }) => {
@@ -14,6 +14,7 @@ const UploadForm: React.FC<UploadFormProps> = ({ onUploadStart }) => {
   const [scriptType, setScriptType] = useState('text');
   const [fileError, setFileError] = useState<string | null>(null);
   const [isUploading, setIsUploading] = useState(false);
+  const [uploadProgress, setUploadProgress] = useState<number | null>(null);
   const [scriptTextError, setScriptTextError] = useState<string | null>(null);
   
   const MAX_VIDEO_SIZE = 500 * 1024 * 1024; // 500MB
@@ -73,6 +74,7 @@ const UploadForm: React.FC<UploadFormProps> = ({ onUploadStart }) => {
     }
     
     setIsUploading(true);
+    setUploadProgress(0);
     
     const formData = new FormData();
     formData.append('video', videoFile);
@@ -83,13 +85,14 @@ const UploadForm: React.FC<UploadFormProps> = ({ onUploadStart }) => {
       formData.append('script', scriptFile);
     }
     
-    onUploadStart(formData)
+    onUploadStart(formData, setUploadProgress)
       .catch(error => {
         console.error('Error in upload process:', error);
         setFileError('An error occurred during the upload process. Please try again.');
       })
       .finally(() => {
         setIsUploading(false);
+        setUploadProgress(null);
       });
   };
   
@@ -127,6 +130,7 @@ const UploadForm: React.FC<UploadFormProps> = ({ onUploadStart }) => {
           label="Drag and drop your video file here or click to browse"
           file={videoFile}
           maxSize={MAX_VIDEO_SIZE}
+          uploadProgress={uploadProgress}
         />
       </Form.Group>
 
@@ -210,7 +214,9 @@ const UploadForm: React.FC<UploadFormProps> = ({ onUploadStart }) => {
           {isUploading ? (
             <>
               <span className="spinner-border spinner-border-sm me-2" role="status" aria-hidden="true"></span>
-              Processing...
+              {uploadProgress !== null && uploadProgress < 100
+                ? `Uploading ${Math.round(uploadProgress)}%...`
+                : 'Processing...'}
             </>
           ) : (
             <>
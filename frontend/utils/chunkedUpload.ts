@@ -0,0 +1,113 @@
+import axios from 'axios';
+
+// Chunks sent at the same time; several parallel requests use more of the client's bandwidth
+const UPLOAD_CONCURRENCY = 4;
+const MAX_CHUNK_RETRIES = 3;
+const STORAGE_KEY_UPLOAD_PREFIX = 'auto_editor_upload_';
+// Files up to this size are hashed in the browser so the server can skip videos it already has
+// (crypto.subtle needs the whole file in memory)
+const MAX_PRECHECK_HASH_SIZE = 512 * 1024 * 1024;
+
+interface UploadSession {
+  upload_id: string;
+  size: number;
+  received: [number, number][];
+  received_bytes: number;
+  complete: boolean;
+  deduplicated: boolean;
+  chunk_size: number;
+}
+
+// Same file (name, size, modification time) resumes the same upload session
+const storageKey = (file: File) =>
+  `${STORAGE_KEY_UPLOAD_PREFIX}${file.name}_${file.size}_${file.lastModified}`;
+
+// Hex SHA-256 of the file, or undefined when it is too large to hash in memory
+const hashFile = async (file: File): Promise<string | undefined> => {
+  if (file.size > MAX_PRECHECK_HASH_SIZE || !window.crypto?.subtle) return undefined;
+  const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map(byte => byte.toString(16).padStart(2, '0'))
+    .join('');
+};
+
+const getOrCreateSession = async (file: File): Promise<UploadSession> => {
+  const storedId = localStorage.getItem(storageKey(file));
+  if (storedId) {
+    try {
+      const response = await axios.get(`/api/uploads/${storedId}`);
+      return response.data;
+    } catch (error) {
+      // Session expired or was finalized; start a new one
+      localStorage.removeItem(storageKey(file));
+    }
+  }
+
+  // A known hash completes the session immediately if the server already stores the video
+  const sha256 = await hashFile(file);
+  const response = await axios.post('/api/uploads', { filename: file.name, size: file.size, sha256 });
+  localStorage.setItem(storageKey(file), response.data.upload_id);
+  return response.data;
+};
+
+// Offsets of the chunks the server hasn't received yet
+const missingChunks = (session: UploadSession): [number, number][] => {
+  const chunks: [number, number][] = [];
+  let position = 0;
+  const ranges = [...session.received, [session.size, session.size] as [number, number]];
+  for (const [start, end] of ranges) {
+    for (let offset = position; offset < start; offset += session.chunk_size) {
+      chunks.push([offset, Math.min(offset + session.chunk_size, start)]);
+    }
+    position = Math.max(position, end);
+  }
+  return chunks;
+};
+
+const sendChunk = async (uploadId: string, file: File, start: number, end: number) => {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      await axios.put(`/api/uploads/${uploadId}`, file.slice(start, end), {
+        params: { offset: start },
+        headers: { 'Content-Type': 'application/octet-stream' },
+      });
+      return;
+    } catch (error) {
+      if (attempt >= MAX_CHUNK_RETRIES) throw error;
+      await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+    }
+  }
+};
+
+/**
+ * Upload a video with the resumable upload API, sending several chunks at once.
+ * Chunks already on the server (from an interrupted attempt) are skipped.
+ * Returns the upload id to finalize into a job.
+ */
+export const uploadInChunks = async (
+  file: File,
+  onProgress?: (percent: number) => void
+): Promise<string> => {
+  const session = await getOrCreateSession(file);
+  const chunks = missingChunks(session);
+  let uploadedBytes = session.received_bytes;
+  onProgress?.(file.size ? (100 * uploadedBytes) / file.size : 100);
+
+  let next = 0;
+  const worker = async () => {
+    while (next < chunks.length) {
+      const [start, end] = chunks[next++];
+      await sendChunk(session.upload_id, file, start, end);
+      uploadedBytes += end - start;
+      onProgress?.((100 * uploadedBytes) / file.size);
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(UPLOAD_CONCURRENCY, chunks.length) }, worker));
+
+  return session.upload_id;
+};
+
+// Forget a finished upload so the same file starts a fresh session next time
+export const clearUploadSession = (file: File) => {
+  localStorage.removeItem(storageKey(file));
+};